@@ -3,6 +3,14 @@ from base.models import Room
 
 
 class RoomSerializer(ModelSerializer):
+    """Serializes a room, or only the given fields of it."""
+
     class Meta:
         model = Room
         fields = '__all__'
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
@@ -4,5 +4,5 @@ from . import views
 urlpatterns = [
     path('',  views.getRoutes),
     path('rooms/', views.getRooms),
-    path('rooms/<str:pk>/', views.getRoom),
+    path('rooms/<int:pk>/', views.getRoom),
 ]
@@ -1,29 +1,134 @@
+import hashlib
+
+from django.db.models import Prefetch, prefetch_related_objects
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
-from base.models import Room
+from base.models import Room, User
+from base.versions import get_versions
+from .pagination import RoomCursorPagination
 from .serializers import RoomSerializer
-from base.api import serializers
+
+
+ROOM_FILTERS = {
+    'is_expired': {'true': True, 'false': False},
+    'opponent_type': {choice: choice for choice, label in Room.OPPONENT_TYPE_CHOICES},
+}
 
 
 @api_view(['GET'])
 def getRoutes(request):
     routes = [
         'GET /api',
-        'GET /api/rooms',
-        'GET /api/rooms/:id'
+        'GET /api/rooms?fields=&is_expired=&opponent_type=&page_size=&cursor=',
+        'GET /api/rooms/:id?fields='
     ]
     return Response(routes)
 
 
+def requested_fields(request):
+    """
+    The serializer fields named by ?fields=, all of them when it is absent.
+    Raises ValueError for a name the serializer does not have.
+    """
+    available = list(RoomSerializer().fields)
+    value = request.query_params.get('fields')
+    if not value:
+        return available
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    return fields
+
+
+def room_queryset(fields):
+    # load only the columns the fields need, the pk for the cursor
+    columns = {
+        field.attname for field in Room._meta.concrete_fields
+        if field.name in fields or field.attname in fields
+    }
+    return Room.objects.order_by().only('id', *columns)
+
+
+def prefetch_rooms(rooms, fields):
+    # participants are serialized as their ids
+    if 'participants' in fields:
+        prefetch_related_objects(rooms, Prefetch('participants', queryset=User.objects.only('id')))
+
+
+def conditional(request, rooms, fields):
+    """
+    ETag and Last-Modified of a list of rooms, and the 304 to answer with
+    when the client has it already. Participants do not touch updated, so
+    their version tokens are part of the ETag when they are shown, and there
+    is no Last-Modified then: an If-Modified-Since alone would get a 304
+    for a room whose participants changed.
+    """
+    parts = [request.get_full_path()]
+    parts += [f'{room.id}:{room.updated.timestamp()}' for room in rooms]
+    if 'participants' in fields:
+        parts += get_versions(*(f'room:{room.id}' for room in rooms))
+    etag = '"%s"' % hashlib.md5('|'.join(parts).encode()).hexdigest()
+    last_modified = None
+    if 'participants' not in fields and rooms:
+        # in whole seconds, as If-Modified-Since comes back
+        last_modified = int(max(room.updated.timestamp() for room in rooms))
+    return etag, last_modified, get_conditional_response(request, etag=etag, last_modified=last_modified)
+
+
+def with_validators(response, etag, last_modified):
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
 @api_view(['GET'])
 def getRooms(request):
-    rooms = Room.objects.all()
-    serializer = RoomSerializer(rooms, many=True)
-    return Response(serializer.data)
+    try:
+        fields = requested_fields(request)
+    except ValueError as error:
+        return Response({'detail': str(error)}, status=400)
+
+    filters = {}
+    for name, values in ROOM_FILTERS.items():
+        value = request.query_params.get(name)
+        if value is None:
+            continue
+        if value not in values:
+            return Response({'detail': f"{name} must be one of: {', '.join(values)}"}, status=400)
+        filters[name] = values[value]
+
+    # updated is read for the validators whatever the fields
+    rooms = room_queryset(fields + ['updated']).filter(**filters)
+    paginator = RoomCursorPagination()
+    page = paginator.paginate_queryset(rooms, request)
+
+    etag, last_modified, not_modified = conditional(request, page, fields)
+    if not_modified is not None:
+        return with_validators(not_modified, etag, last_modified)
+
+    prefetch_rooms(page, fields)
+    serializer = RoomSerializer(page, many=True, fields=fields)
+    return with_validators(paginator.get_paginated_response(serializer.data), etag, last_modified)
 
 
 @api_view(['GET'])
 def getRoom(request, pk):
-    room = Room.objects.get(id=pk)
-    serializer = RoomSerializer(room, many=False)
-    return Response(serializer.data)
+    try:
+        fields = requested_fields(request)
+    except ValueError as error:
+        return Response({'detail': str(error)}, status=400)
+
+    room = get_object_or_404(room_queryset(fields + ['updated']), id=pk)
+    etag, last_modified, not_modified = conditional(request, [room], fields)
+    if not_modified is not None:
+        return with_validators(not_modified, etag, last_modified)
+
+    prefetch_rooms([room], fields)
+    serializer = RoomSerializer(room, many=False, fields=fields)
+    return with_validators(Response(serializer.data), etag, last_modified)
@@ -1,4 +1,5 @@
 from django.apps import AppConfig
+from django.contrib.staticfiles.apps import StaticFilesConfig as BaseStaticFilesConfig
 
 
 class BaseConfig(AppConfig):
@@ -6,4 +7,9 @@ class BaseConfig(AppConfig):
     name = 'base'
 
     def ready(self):
-        from . import signals
+        from . import checks, signals
+
+
+class StaticFilesConfig(BaseStaticFilesConfig):
+    # uploads live under static/images too, see MEDIA_ROOT
+    ignore_patterns = BaseStaticFilesConfig.ignore_patterns + ['images/files/*', 'images/variants/*']
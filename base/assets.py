@@ -0,0 +1,303 @@
+"""
+Static and media files served straight from the ASGI app.
+
+collectstatic with CompressedManifestStaticFilesStorage copies the static
+files to STATIC_ROOT under content-hashed names and writes a .gz, and a
+.br when the brotli package is installed, next to every text file it is
+worth compressing for.
+
+AssetsMiddleware answers requests under STATIC_URL from STATIC_ROOT and
+under MEDIA_URL from MEDIA_ROOT before Django sees them:
+
+    - the precompressed variant the client accepts is sent as is, so
+      nothing is compressed per request
+    - hashed static names, content-addressed uploads and image variants
+      never change and are cached for a year; other files revalidate
+      against their ETag
+    - single byte ranges are honoured, so audio and video can seek
+    - small files under hashed static names are kept in memory, for the
+      STATIC_CACHE_SIZE most recently served; larger and other files are
+      read in chunks off the event loop
+
+Anything it does not find falls through to Django.
+"""
+
+import gzip
+import mimetypes
+import os
+import re
+import stat
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+
+
+COMPRESSIBLE_EXTENSIONS = {'.css', '.js', '.mjs', '.map', '.json', '.svg', '.txt', '.html', '.xml', '.ico'}
+# Smaller files gain less from compression than a header costs.
+MIN_COMPRESS_SIZE = 512
+# (Content-Encoding, file suffix), preferred first
+ENCODINGS = (('br', '.br'), ('gzip', '.gz'))
+
+IMMUTABLE = 'public, max-age=31536000, immutable'
+REVALIDATE = 'public, max-age=0, must-revalidate'
+HASHED_NAME = re.compile(r'\.[0-9a-f]{12}\.[^./]+$')
+IMMUTABLE_MEDIA = re.compile(r'^(files/[0-9a-f]{2}/[0-9a-f]{64}|variants/)')
+
+CHUNK_SIZE = 64 * 1024
+MEMORY_FILE_SIZE = 256 * 1024
+# hashed static files kept with their bodies, least recently served dropped
+STATIC_CACHE_SIZE = 256
+
+
+def _brotli():
+    try:
+        import brotli
+    except ImportError:
+        return None
+    return brotli
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """Manifest storage that also writes compressed copies of text files."""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run, **options)
+        if dry_run:
+            return
+        brotli = _brotli()
+        for name in set(self.hashed_files.values()) | set(paths):
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE_EXTENSIONS and self.exists(name):
+                self._compress(name, brotli)
+
+    def _compress(self, name, brotli):
+        path = self.path(name)
+        with open(path, 'rb') as file:
+            data = file.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        variants = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            variants['.br'] = brotli.compress(data, quality=11)
+        for suffix, compressed in variants.items():
+            # not worth a header when it saves next to nothing
+            if len(compressed) < len(data) * 0.95:
+                with open(path + suffix, 'wb') as file:
+                    file.write(compressed)
+
+
+class Asset:
+    """A file on disk and the precompressed variants found next to it."""
+
+    def __init__(self, path, stat_result, cache_control):
+        self.path = path
+        self.size = stat_result.st_size
+        self.etag = f'"{stat_result.st_mtime_ns:x}-{self.size:x}"'
+        self.last_modified = formatdate(stat_result.st_mtime, usegmt=True)
+        self.mtime = int(stat_result.st_mtime)
+        self.content_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        if self.content_type.startswith('text/') or self.content_type in ('application/javascript', 'image/svg+xml'):
+            self.content_type += '; charset=utf-8'
+        self.cache_control = cache_control
+        self.compressible = os.path.splitext(path)[1].lower() in COMPRESSIBLE_EXTENSIONS
+        self.encodings = {}
+        if self.compressible:
+            for encoding, suffix in ENCODINGS:
+                try:
+                    self.encodings[encoding] = (path + suffix, os.stat(path + suffix).st_size)
+                except OSError:
+                    pass
+        self.bodies = {}
+
+    def body(self, path, size):
+        """The bytes of a small file, read once."""
+        if size > MEMORY_FILE_SIZE:
+            return None
+        if path not in self.bodies:
+            with open(path, 'rb') as file:
+                self.bodies[path] = file.read()
+        return self.bodies[path]
+
+
+def _find(root, relative):
+    """The regular file at root/relative, never outside root."""
+    if not root:
+        return None, None
+    root = os.path.realpath(root)
+    path = os.path.realpath(os.path.join(root, relative.lstrip('/')))
+    if not path.startswith(root + os.sep):
+        return None, None
+    try:
+        stat_result = os.stat(path)
+    except OSError:
+        return None, None
+    if not stat.S_ISREG(stat_result.st_mode):
+        return None, None
+    return path, stat_result
+
+
+def _accepted(accept_encoding):
+    accepted = set()
+    for part in accept_encoding.split(','):
+        coding, _, params = part.strip().partition(';')
+        if params.replace(' ', '') in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000'):
+            continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+def parse_range(header, size):
+    """
+    (start, end) of a single "bytes=" range, None to send the whole file, or
+    False when the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition('=')
+    if unit.strip().lower() != 'bytes' or ',' in spec:
+        return None
+    first, _, last = spec.strip().partition('-')
+    try:
+        if not first:
+            length = int(last)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(first)
+        end = int(last) if last else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+class AssetsMiddleware:
+    """ASGI middleware serving STATIC_ROOT and MEDIA_ROOT, see the module docstring."""
+
+    def __init__(self, app):
+        self.app = app
+        # hashed static names never change, so they can be kept
+        self.static_assets = OrderedDict()
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] in ('GET', 'HEAD'):
+            asset = await self.lookup(scope['path'])
+            if asset is not None:
+                return await self.serve(asset, scope, send)
+        return await self.app(scope, receive, send)
+
+    async def lookup(self, url_path):
+        static_url, media_url = settings.STATIC_URL, settings.MEDIA_URL
+        static_root = getattr(settings, 'STATIC_ROOT', None)
+        if static_url and url_path.startswith(static_url):
+            relative = url_path[len(static_url):]
+            asset = self.static_assets.get(relative)
+            if asset is not None:
+                self.static_assets.move_to_end(relative)
+                return asset
+            path, stat_result = await sync_to_async(_find, thread_sensitive=False)(static_root, relative)
+            if path is None:
+                return None
+            if not HASHED_NAME.search(relative):
+                # may be replaced by the next collectstatic, look it up every time
+                return await sync_to_async(Asset, thread_sensitive=False)(path, stat_result, REVALIDATE)
+            asset = await sync_to_async(Asset, thread_sensitive=False)(path, stat_result, IMMUTABLE)
+            self.static_assets[relative] = asset
+            if len(self.static_assets) > STATIC_CACHE_SIZE:
+                self.static_assets.popitem(last=False)
+            return asset
+        if media_url and url_path.startswith(media_url):
+            relative = url_path[len(media_url):]
+            # uploads come and go, so they are looked up every time
+            path, stat_result = await sync_to_async(_find, thread_sensitive=False)(settings.MEDIA_ROOT, relative)
+            if path is None:
+                return None
+            cache_control = IMMUTABLE if IMMUTABLE_MEDIA.match(relative) else REVALIDATE
+            return await sync_to_async(Asset, thread_sensitive=False)(path, stat_result, cache_control)
+        return None
+
+    async def serve(self, asset, scope, send):
+        headers = {
+            key.decode('latin-1').lower(): value.decode('latin-1')
+            for key, value in scope['headers']
+        }
+        response_headers = [
+            (b'cache-control', asset.cache_control.encode()),
+            (b'last-modified', asset.last_modified.encode()),
+            (b'accept-ranges', b'bytes'),
+        ]
+        if asset.compressible:
+            response_headers.append((b'vary', b'Accept-Encoding'))
+
+        path, size, encoding = asset.path, asset.size, None
+        range_header = headers.get('range')
+        if range_header is None:
+            accepted = _accepted(headers.get('accept-encoding', ''))
+            encoding = next((name for name in asset.encodings if name in accepted), None)
+            if encoding is not None:
+                path, size = asset.encodings[encoding]
+                response_headers.append((b'content-encoding', encoding.encode()))
+        etag = asset.etag if encoding is None else f'{asset.etag[:-1]}-{encoding}"'
+        response_headers.append((b'etag', etag.encode()))
+
+        if self.not_modified(asset, etag, headers):
+            return await self.respond(send, 304, response_headers)
+
+        status, start, end = 200, 0, size - 1
+        if range_header is not None:
+            byte_range = parse_range(range_header, size)
+            if byte_range is False:
+                response_headers.append((b'content-range', f'bytes */{size}'.encode()))
+                return await self.respond(send, 416, response_headers)
+            if byte_range is not None:
+                status, (start, end) = 206, byte_range
+                response_headers.append((b'content-range', f'bytes {start}-{end}/{size}'.encode()))
+
+        response_headers += [
+            (b'content-type', asset.content_type.encode()),
+            (b'content-length', str(end - start + 1).encode()),
+        ]
+        if scope['method'] == 'HEAD':
+            return await self.respond(send, status, response_headers)
+
+        body = asset.bodies.get(path)
+        if body is None and size <= MEMORY_FILE_SIZE:
+            body = await sync_to_async(asset.body, thread_sensitive=False)(path, size)
+        if body is not None:
+            return await self.respond(send, status, response_headers, body[start:end + 1])
+
+        await send({'type': 'http.response.start', 'status': status, 'headers': response_headers})
+        file = await sync_to_async(open, thread_sensitive=False)(path, 'rb')
+        try:
+            await sync_to_async(file.seek, thread_sensitive=False)(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = await sync_to_async(file.read, thread_sensitive=False)(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({'type': 'http.response.body', 'body': chunk, 'more_body': remaining > 0})
+            if remaining > 0:
+                # the file shrank under us
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await sync_to_async(file.close, thread_sensitive=False)()
+
+    @staticmethod
+    def not_modified(asset, etag, headers):
+        if_none_match = headers.get('if-none-match')
+        if if_none_match is not None:
+            return if_none_match.strip() == '*' or etag in (tag.strip() for tag in if_none_match.split(','))
+        if_modified_since = headers.get('if-modified-since')
+        if if_modified_since is not None:
+            try:
+                return asset.mtime <= parsedate_to_datetime(if_modified_since).timestamp()
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    @staticmethod
+    async def respond(send, status, headers, body=b''):
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
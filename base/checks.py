@@ -0,0 +1,65 @@
+"""
+System checks of the settings the base app relies on.
+"""
+
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+from .versions import VERSION_CACHE
+
+
+# backends whose entries another worker process cannot see
+PROCESS_LOCAL_CACHES = (LocMemCache, DummyCache)
+
+CACHED_SESSION_ENGINES = (
+    'django.contrib.sessions.backends.cache',
+    'django.contrib.sessions.backends.cached_db',
+)
+
+
+@register(Tags.caches)
+def check_version_cache(app_configs, **kwargs):
+    """The version tokens of base.versions must be shared by every worker."""
+    try:
+        backend = caches[VERSION_CACHE]
+    except InvalidCacheBackendError:
+        return [Error(
+            f"CACHES has no '{VERSION_CACHE}' alias.",
+            hint='Add a cache every worker shares, see base.versions.',
+            id='base.E001',
+        )]
+    if isinstance(backend, PROCESS_LOCAL_CACHES):
+        return [Error(
+            f"The '{VERSION_CACHE}' cache is local to each process, so workers would "
+            f"answer polls with 304s for versions another worker has bumped.",
+            hint='Use a shared backend such as Redis, Memcached, the database or files.',
+            id='base.E002',
+        )]
+    return []
+
+
+@register(Tags.caches)
+def check_session_cache(app_configs, **kwargs):
+    """Cached sessions must be shared, or a logout would not reach every worker."""
+    if settings.SESSION_ENGINE not in CACHED_SESSION_ENGINES:
+        return []
+    alias = settings.SESSION_CACHE_ALIAS
+    try:
+        backend = caches[alias]
+    except InvalidCacheBackendError:
+        return [Error(
+            f"SESSION_CACHE_ALIAS names '{alias}', which CACHES does not have.",
+            hint='Add a cache every worker shares.',
+            id='base.E003',
+        )]
+    if isinstance(backend, PROCESS_LOCAL_CACHES):
+        return [Error(
+            f"Sessions are cached in '{alias}', which is local to each process, so a "
+            f"session flushed on one worker would stay valid on the others.",
+            hint="Point SESSION_CACHE_ALIAS at a shared cache, or use the 'db' session engine.",
+            id='base.E004',
+        )]
+    return []
@@ -1,87 +1,351 @@
-from channels.generic.websocket import WebsocketConsumer
+from channels.generic.websocket import AsyncWebsocketConsumer
+from channels.db import database_sync_to_async
+from asgiref.sync import sync_to_async
 from django.shortcuts import get_object_or_404
-from django.template.loader import render_to_string, get_template
-from asgiref.sync import async_to_sync
+from django.template.loader import render_to_string
+from django.core.cache import cache
+from django.db import connection
+import asyncio
 import json
 from .models import *
+from .presence import get_presence, debounce
+from .notifications import notification_group_name, get_unread_count
+from .lobby import lobby_group_name, lobby_snapshot, lobby_context
+from .game.server import game_server
+from .game.scheduler import tournament_scheduler, tournament_group_name
+from .game.protocol import SnapshotEncoder, wire_int
+from .matchmaking import matchmaker
+from .leaderboard import rating_of
 
-class ChatroomConsumer(WebsocketConsumer):
-    def connect(self):
+
+CHAT_MESSAGE_TEMPLATE = "private_message/partials/chat_message_p.html"
+ONLINE_COUNT_TEMPLATE = "chat/partials/online_count.html"
+
+# Work spent building online-count fragments. Each presence change costs one
+# render and a fixed number of queries, however many sockets are in the room.
+online_count_stats = {'renders': 0, 'queries': 0, 'cache_hits': 0}
+
+
+def build_message_event(message):
+    # Render the message once for its author and once for everyone else, so
+    # recipients of the group event only have to pick a variant and send it.
+    context = {
+        'message': message,
+        'chat_group': message.group,
+    }
+    return {
+        'type': 'message_handler',
+        'author_id': message.author_id,
+        'html_author': render_to_string(CHAT_MESSAGE_TEMPLATE, {**context, 'user': message.author}),
+        'html': render_to_string(CHAT_MESSAGE_TEMPLATE, {**context, 'user': None}),
+    }
+
+
+def online_count_cache_key(chatroom_name):
+    return f'online-count:{chatroom_name}'
+
+
+def _count_queries(execute, sql, params, many, context):
+    online_count_stats['queries'] += 1
+    return execute(sql, params, many, context)
+
+
+def render_online_count(chatroom_name, online_user_ids):
+    # The fragment is the same for every socket in the room, so it is built
+    # once per presence change and reused while the online set is unchanged.
+    key = online_count_cache_key(chatroom_name)
+    signature = sorted(online_user_ids)
+    cached = cache.get(key)
+    if cached and cached[0] == signature:
+        online_count_stats['cache_hits'] += 1
+        return cached[1]
+
+    with connection.execute_wrapper(_count_queries):
+        chat_group = ChatGroup.objects.prefetch_related('members').get(group_name=chatroom_name)
+        author_ids = set(chat_group.chat_messages.values_list('author_id', flat=True)[:30])
+
+        context = {
+            'online_count' : len(online_user_ids) -1,
+            'online_user_ids': online_user_ids,
+            'chat_group' : chat_group,
+            'author_ids': author_ids,
+        }
+        html = render_to_string(ONLINE_COUNT_TEMPLATE, context)
+    online_count_stats['renders'] += 1
+
+    cache.set(key, (signature, html))
+    return html
+
+
+async def broadcast_online_count(channel_layer, chatroom_name):
+    online_user_ids = await sync_to_async(get_presence().online_users)(chatroom_name)
+    html = await database_sync_to_async(render_online_count)(chatroom_name, online_user_ids)
+
+    event = {
+        'type': 'online_count_handler',
+        'html': html,
+    }
+    await channel_layer.group_send(chatroom_name, event)
+
+
+class ChatroomConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
         self.user = self.scope['user']
-        self.chatroom_name = self.scope['url_route']['kwargs']['chatroom_name'] 
-        self.chatroom = get_object_or_404(ChatGroup, group_name=self.chatroom_name)
-        
-        async_to_sync(self.channel_layer.group_add)(
+        self.chatroom_name = self.scope['url_route']['kwargs']['chatroom_name']
+        self.chatroom = await database_sync_to_async(get_object_or_404)(ChatGroup, group_name=self.chatroom_name)
+        self.presence = get_presence()
+
+        await self.channel_layer.group_add(
             self.chatroom_name, self.channel_name
         )
-        
+
         # add and update online users
-        if self.user not in self.chatroom.users_online.all():
-            self.chatroom.users_online.add(self.user)
+        if await sync_to_async(self.presence.join)(self.chatroom_name, self.channel_name, self.user.id):
             self.update_online_count()
-        
-        self.accept()
-        
-        
-    def disconnect(self, close_code):
-        async_to_sync(self.channel_layer.group_discard)(
+        self.heartbeat_task = asyncio.ensure_future(self.heartbeat())
+
+        await self.accept()
+
+
+    async def disconnect(self, close_code):
+        await self.channel_layer.group_discard(
             self.chatroom_name, self.channel_name
         )
         # remove and update online users
-        if self.user in self.chatroom.users_online.all():
-            self.chatroom.users_online.remove(self.user)
-            self.update_online_count() 
-        
-    def receive(self, text_data):
+        if hasattr(self, 'heartbeat_task'):
+            self.heartbeat_task.cancel()
+            if await sync_to_async(self.presence.leave)(self.chatroom_name, self.channel_name):
+                self.update_online_count()
+
+    async def heartbeat(self):
+        # keep this socket's presence entry alive until it disconnects
+        while True:
+            await asyncio.sleep(self.presence.ttl / 3)
+            await sync_to_async(self.presence.touch)(self.chatroom_name, self.channel_name, self.user.id)
+
+    async def receive(self, text_data):
         text_data_json = json.loads(text_data)
         body = text_data_json['body']
-        
+
+        event = await self.create_message(body)
+        await self.channel_layer.group_send(
+            self.chatroom_name, event
+        )
+
+    async def message_handler(self, event):
+        if event['author_id'] == self.user.id:
+            html = event['html_author']
+        else:
+            html = event['html']
+        await self.send(text_data=html)
+
+
+    def update_online_count(self):
+        # joins and leaves in the same window share one broadcast
+        channel_layer, chatroom_name = self.channel_layer, self.chatroom_name
+        debounce(chatroom_name, lambda: broadcast_online_count(channel_layer, chatroom_name))
+
+    async def online_count_handler(self, event):
+        await self.send(text_data=event['html'])
+
+    @database_sync_to_async
+    def create_message(self, body):
         message = GroupMessage.objects.create(
             body = body,
-            author = self.user, 
-            group = self.chatroom 
+            author = self.user,
+            group = self.chatroom
         )
-        event = {
-            'type': 'message_handler',
-            'message_id': message.id,
-        }
-        async_to_sync(self.channel_layer.group_send)(
-            self.chatroom_name, event
+        return build_message_event(message)
+
+
+class NotificationConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        self.group_name = notification_group_name(self.user.id)
+        await self.channel_layer.group_add(
+            self.group_name, self.channel_name
         )
-        
-    def message_handler(self, event):
-        message_id = event['message_id']
-        message = GroupMessage.objects.get(id=message_id)
-        context = {
-            'message': message,
-            'user': self.user,
-            'chat_group': self.chatroom
-        }
-        html = render_to_string("private_message/partials/chat_message_p.html", context=context)
-        # print(html)
-        self.send(text_data=html)
-        
-        
-    def update_online_count(self):
-        online_count = self.chatroom.users_online.count() -1
-        
-        event = {
-            'type': 'online_count_handler',
-            'online_count': online_count
-        }
-        async_to_sync(self.channel_layer.group_send)(self.chatroom_name, event)
-        
-    def online_count_handler(self, event):
-        online_count = event['online_count']
-        
-        chat_messages = ChatGroup.objects.get(group_name=self.chatroom_name).chat_messages.all()[:30]
-        author_ids = set([message.author.id for message in chat_messages])
-        users = User.objects.filter(id__in=author_ids)
-        
+        await self.accept()
+
+        # the only read of the inbox, later changes are pushed
+        await self.send(text_data=await self.render_inbox())
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name, self.channel_name
+            )
+
+    async def notification_handler(self, event):
+        await self.send(text_data=event['html'])
+
+    @database_sync_to_async
+    def render_inbox(self):
+        notifications = Notification.objects.filter(user=self.user, is_read=False).order_by('-created_at')
         context = {
-            'online_count' : online_count,
-            'chat_group' : self.chatroom,
-            'users': users
+            'notifications': notifications,
+            'unread_count': get_unread_count(self.user.id),
         }
-        html = render_to_string("chat/partials/online_count.html", context)
-        self.send(text_data=html) 
+        return render_to_string("notification/partials/noti_socket.html", context)
+
+
+class LobbyConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        self.user = self.scope['user']
+        self.room_id = self.scope['url_route']['kwargs']['room_id']
+        room = await database_sync_to_async(get_object_or_404)(Room, id=self.room_id)
+
+        self.group_name = lobby_group_name(self.room_id)
+        await self.channel_layer.group_add(
+            self.group_name, self.channel_name
+        )
+        await self.accept()
+
+        snapshot = await database_sync_to_async(lobby_snapshot)(room)
+        await self.lobby_handler({'kicked_id': None, **snapshot})
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name, self.channel_name
+            )
+
+    async def lobby_handler(self, event):
+        # the snapshot carries everything the partial needs, no queries here
+        context = lobby_context(event, self.user.id)
+        context['kicked'] = event['kicked_id'] is not None and event['kicked_id'] == self.user.id
+        html = render_to_string("room/partials/lobby_event.html", context)
+        if html.strip():
+            await self.send(text_data=html)
+
+
+class TournamentConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        self.room_id = self.scope['url_route']['kwargs']['room_id']
+        room = await database_sync_to_async(get_object_or_404)(Room, id=self.room_id, opponent_type='Tournament')
+
+        self.group_name = tournament_group_name(self.room_id)
+        await self.channel_layer.group_add(
+            self.group_name, self.channel_name
+        )
+        await self.accept()
+
+        # the matches of a drawn bracket are played on this worker
+        if room.bracket_size is not None and not room.is_expired:
+            tournament_scheduler.watch(room.id)
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(
+                self.group_name, self.channel_name
+            )
+
+    async def bracket_handler(self, event):
+        await self.send(text_data=event['html'])
+
+
+class MatchmakingConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        self.user = self.scope['user']
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+
+        await self.accept()
+        rating = await database_sync_to_async(rating_of)(self.user.id)
+        # waiting is over when the socket closes
+        self.queued = True
+        await matchmaker.join(self.user.id, rating, self.channel_name)
+
+    async def disconnect(self, close_code):
+        if getattr(self, 'queued', False):
+            await matchmaker.leave(self.user.id, self.channel_name)
+
+    async def match_found(self, event):
+        self.queued = False
+        await self.send(text_data=event['html'])
+
+
+class GameConsumer(AsyncWebsocketConsumer):
+    async def connect(self):
+        self.user = self.scope['user']
+        kwargs = self.scope['url_route']['kwargs']
+        if 'match_id' in kwargs:
+            await self.connect_match(kwargs['match_id'])
+            return
+
+        self.room_id = kwargs['room_id']
+        room = await database_sync_to_async(get_object_or_404)(Room, id=self.room_id, is_expired=False)
+        if room.opponent_type == 'Tournament':
+            # tournaments are played match by match on ws/game/match/<id>
+            await self.close()
+            return
+        participant_ids = await database_sync_to_async(
+            lambda: set(room.participants.values_list('id', flat=True))
+        )()
+
+        await self.accept()
+        self.encoder = SnapshotEncoder()
+        self.session, self.side = await game_server.join(room, self, self.user, participant_ids)
+        await self.send_hello()
+
+    async def connect_match(self, match_id):
+        # tournament matches are opened by the scheduler, not by sockets
+        await self.accept()
+        self.encoder = SnapshotEncoder()
+        session, self.side = game_server.join_match(match_id, self, self.user.id)
+        if session is None:
+            await self.close()
+            return
+        self.session = session
+        await self.send_hello()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'session'):
+            game_server.leave(self.session, self)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        # {"ack": tick} acknowledges a decoded snapshot, players also send
+        # {"dir": 1} (up), {"dir": -1} (down) or {"dir": 0}, tagged with
+        # "seq" and the "tick" it was pressed at when the client predicts.
+        # A malformed frame is dropped before it reaches the match's loops.
+        try:
+            text_data_json = json.loads(text_data)
+        except (TypeError, ValueError):
+            return
+        if not isinstance(text_data_json, dict):
+            return
+        if 'ack' in text_data_json:
+            tick = wire_int(text_data_json['ack'])
+            if tick is not None:
+                self.encoder.ack(tick)
+        if self.side is not None and 'dir' in text_data_json:
+            match = self.session.match
+            try:
+                if 'seq' in text_data_json:
+                    tick, seq = wire_int(text_data_json.get('tick')), wire_int(text_data_json['seq'])
+                    # sequence numbers only increase, see apply_input()
+                    if tick is not None and seq is not None:
+                        match.apply_input(self.side, text_data_json['dir'], tick, seq)
+                else:
+                    match.set_input(self.side, text_data_json['dir'])
+            except ValueError:
+                pass
+
+    async def send_hello(self):
+        # binary frames carry the state, text frames the rest
+        await self.send(text_data=json.dumps({
+            'side': self.side,
+            'points': self.session.match.points_to_win,
+        }))
+
+    async def send_result(self, winner):
+        await self.send(text_data=json.dumps({'winner': winner}))
+
+    async def send_snapshot(self, snapshot):
+        input_ack = self.session.match.acked_seq[self.side] if self.side is not None else 0
+        await self.send(bytes_data=self.encoder.encode(snapshot, input_ack))
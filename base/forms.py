@@ -14,7 +14,7 @@ class RoomForm(ModelForm):
     class Meta:
         model = Room
         fields = '__all__'
-        exclude = ['host', 'participants']
+        exclude = ['host', 'participants', 'bracket_size']
 
 
 class UserForm(ModelForm):
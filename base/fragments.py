@@ -0,0 +1,91 @@
+"""
+Cache of rendered chat message fragments.
+
+A message renders one way for its author and another for everyone else, so
+each fragment is cached per message, layout and viewer role in the
+"fragments" cache alias (an LRU local-memory cache by default; point it at a
+shared backend to share fragments between workers). Entries carry the
+author's username and avatar they were rendered with, and whether the
+image variants of base.thumbnails were ready, so profile changes never
+serve a stale fragment and originals give way to variants once written.
+Edits, deletes and file removals of the message itself drop its entries
+through the receivers in base.signals.
+
+Invitations embed the viewer's CSRF token and are never cached.
+"""
+
+import time
+
+from django.core.cache import caches
+from django.template.loader import render_to_string
+
+from .thumbnails import get_variants
+
+
+FRAGMENT_CACHE = 'fragments'
+
+FRAGMENT_TEMPLATES = {
+    'chat': 'chat/partials/message_item.html',
+    'private': 'private_message/chat_message.html',
+}
+
+ROLES = ('own', 'other')
+
+# Cache work since the worker started, served by views.render_stats.
+fragment_stats = {'hits': 0, 'misses': 0, 'uncached': 0, 'render_seconds': 0.0}
+
+
+def message_fragment_key(message_id, layout, role):
+    return f'message-fragment:{layout}:{role}:{message_id}'
+
+
+def invalidate_message_fragments(message_id):
+    caches[FRAGMENT_CACHE].delete_many([
+        message_fragment_key(message_id, layout, role)
+        for layout in FRAGMENT_TEMPLATES
+        for role in ROLES
+    ])
+
+
+def _render(message, layout, own, request=None):
+    user = message.author if own else None
+    return render_to_string(FRAGMENT_TEMPLATES[layout], {'message': message, 'user': user}, request)
+
+
+def render_message_fragment(message, layout, viewer_id, request=None):
+    """Render one message as seen by viewer_id, from the cache when possible."""
+    own = message.author_id == viewer_id
+    if message.is_invitation:
+        fragment_stats['uncached'] += 1
+        return _render(message, layout, own, request)
+
+    cache = caches[FRAGMENT_CACHE]
+    key = message_fragment_key(message.id, layout, 'own' if own else 'other')
+    # a fragment rendered before the variants were written links originals
+    files = [message.author.avatar.name, message.file.name if message.is_image else '']
+    signature = (message.author.username, *(
+        (name, record is not None) for name, record in get_variants(*filter(None, files)).items()
+    ))
+    cached = cache.get(key)
+    if cached and cached[0] == signature:
+        fragment_stats['hits'] += 1
+        return cached[1]
+
+    started = time.perf_counter()
+    html = _render(message, layout, own)
+    fragment_stats['render_seconds'] += time.perf_counter() - started
+    fragment_stats['misses'] += 1
+    cache.set(key, (signature, html))
+    return html
+
+
+def fragment_report():
+    hits, misses = fragment_stats['hits'], fragment_stats['misses']
+    mean_render = fragment_stats['render_seconds'] / misses if misses else 0.0
+    return {
+        **fragment_stats,
+        'hit_ratio': hits / (hits + misses) if hits + misses else 0.0,
+        'mean_render_ms': mean_render * 1000,
+        # every hit skipped one render
+        'saved_seconds': hits * mean_render,
+    }
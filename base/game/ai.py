@@ -0,0 +1,137 @@
+"""
+Server-side AI opponent for Pong.
+
+One AIPool drives the PLAYER2 paddle of every AI match on the worker. Each
+call to think() handles all of them as one NumPy batch: the ball of every
+match is gathered into arrays, the point where each ball will cross the
+AI's paddle line is predicted by folding its straight-line path back into
+the table for every wall bounce, and only the paddles whose direction
+changes are sent an input.
+
+Difficulty comes from two knobs:
+
+    reaction_ticks  the AI only sees the ball as it was this many ticks ago
+    error           standard deviation of the aim offset, in table units,
+                    drawn again each time the ball turns towards the AI
+
+Like engine, this module has no Django dependency.
+"""
+
+import itertools
+
+import numpy as np
+
+from .engine import PADDLE_SPEED, PADDLE_WIDTH, PADDLE_X, PLAYER2, TABLE_HEIGHT
+
+
+FACE_X = PADDLE_X[PLAYER2] - PADDLE_WIDTH / 2
+HALF_HEIGHT = TABLE_HEIGHT / 2
+
+# close enough to the target to stop instead of jittering around it
+DEAD_ZONE = PADDLE_SPEED / 2
+
+# direction of a paddle the pool has not steered yet
+UNKNOWN = 2
+
+
+def fold(y):
+    """Map unbounded straight-line ys back onto the table, wall bounces included."""
+    y = (y + HALF_HEIGHT) % (4 * HALF_HEIGHT)
+    y = np.where(y > 2 * HALF_HEIGHT, 4 * HALF_HEIGHT - y, y)
+    return y - HALF_HEIGHT
+
+
+class AIPool:
+    """Plays PLAYER2 in every registered match."""
+
+    def __init__(self, reaction_ticks=6, error=0.15, seed=None, capacity=16):
+        self.reaction_ticks = reaction_ticks
+        self.error = error
+        self.random = np.random.default_rng(seed)
+        self.passes = 0
+        # match -> its row in the arrays, and the matches in row order
+        self.matches = {}
+        self.order = []
+        # ball x, y, vx and vy of every match over the last passes, a ring
+        # buffer indexed by pass number
+        self.seen = np.zeros((reaction_ticks + 1, capacity, 4))
+        self.added = np.zeros(capacity, dtype=np.int64)
+        self.offsets = np.zeros(capacity)
+        self.directions = np.zeros(capacity, dtype=np.int8)
+
+    def __len__(self):
+        return len(self.order)
+
+    def add(self, match):
+        if match in self.matches:
+            return
+        row = len(self.order)
+        if row == len(self.added):
+            self._grow(2 * row)
+        self.matches[match] = row
+        self.order.append(match)
+        self.added[row] = self.passes
+        self.offsets[row] = 0.0
+        self.directions[row] = UNKNOWN
+
+    def remove(self, match):
+        row = self.matches.pop(match, None)
+        if row is None:
+            return
+        # move the last match into the freed row
+        last = self.order.pop()
+        if last is not match:
+            self.order[row] = last
+            self.matches[last] = row
+            end = len(self.order)
+            self.seen[:, row] = self.seen[:, end]
+            self.added[row] = self.added[end]
+            self.offsets[row] = self.offsets[end]
+            self.directions[row] = self.directions[end]
+
+    def _grow(self, capacity):
+        seen = np.zeros((self.reaction_ticks + 1, capacity, 4))
+        seen[:, :self.seen.shape[1]] = self.seen
+        self.seen = seen
+        for name in ('added', 'offsets', 'directions'):
+            array = getattr(self, name)
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def think(self):
+        """Observe every match and set its AI paddle input for the next tick."""
+        count = len(self.order)
+        if not count:
+            return
+        window = self.reaction_ticks + 1
+        balls = np.fromiter(
+            itertools.chain.from_iterable(
+                (match.ball_x, match.ball_y, match.ball_vx, match.ball_vy) for match in self.order
+            ),
+            dtype=float, count=4 * count,
+        ).reshape(count, 4)
+        paddles = np.fromiter((match.paddles[PLAYER2] for match in self.order), dtype=float, count=count)
+
+        # a new aim offset whenever the ball turns towards the AI
+        added = self.added[:count]
+        previous = self.seen[(self.passes - 1) % window, :count, 2]
+        turned = (added < self.passes) & (previous <= 0) & (balls[:, 2] > 0)
+        if turned.any():
+            self.offsets[:count][turned] = self.random.normal(0.0, self.error, np.count_nonzero(turned))
+        self.seen[self.passes % window, :count] = balls
+
+        # the oldest observation within the reaction time
+        oldest = np.maximum(added, self.passes - self.reaction_ticks) % window
+        x, y, vx, vy = self.seen[oldest, np.arange(count)].T
+        self.passes += 1
+
+        # wait in the middle while the ball moves away
+        towards = vx > 0
+        crossing = y + vy * (FACE_X - x) / np.where(towards, vx, 1.0)
+        target = np.where(towards, fold(crossing) + self.offsets[:count], 0.0)
+
+        directions = (target > paddles + DEAD_ZONE).astype(np.int8) - (target < paddles - DEAD_ZONE)
+        for row in np.flatnonzero(directions != self.directions[:count]):
+            self.order[row].set_input(PLAYER2, int(directions[row]))
+        self.directions[:count] = directions
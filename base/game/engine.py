@@ -0,0 +1,207 @@
+"""
+Server-authoritative Pong simulation.
+
+The table uses the same units as the three.js client: a 5 x 3 plane centred
+on the origin, player 1 on the left edge, player 2 on the right edge. The
+simulation advances in fixed ticks and never looks at the wall clock, so it
+can be stepped headless and replayed deterministically from a seed.
+
+Players send inputs tagged with a sequence number and the tick they were
+pressed at. The match keeps a short ring buffer of past states, so an input
+that arrives late is applied where it belongs: the match rewinds to that
+tick and replays forward. Every input, set_input()'s included, is kept per
+tick for the length of that window so the replay applies it again. The
+last processed sequence number per player is exposed so clients can
+reconcile their predicted paddle.
+
+This module has no Django dependency; base.game.server drives it.
+"""
+
+import collections
+import math
+import random
+
+
+TICK_RATE = 60
+TICK = 1 / TICK_RATE
+
+TABLE_WIDTH = 5.0
+TABLE_HEIGHT = 3.0
+PADDLE_WIDTH = 0.1
+PADDLE_HEIGHT = 0.5
+PADDLE_SPEED = 0.1
+PADDLE_LIMIT = TABLE_HEIGHT / 2 - PADDLE_HEIGHT / 2
+PADDLE_X = (-TABLE_WIDTH / 2, TABLE_WIDTH / 2)
+BALL_RADIUS = 0.05
+BALL_SPEED = 0.1
+MAX_BOUNCE_ANGLE = math.pi / 4
+RESPAWN_TICKS = TICK_RATE
+
+# How far back a late input may rewind the match (200 ms), and how far ahead
+# of the server a client's tick may claim to be.
+REWIND_TICKS = 12
+MAX_INPUT_LEAD = 6
+
+PLAYER1, PLAYER2 = 0, 1
+
+
+def input_direction(value):
+    """
+    A client's direction as 1 (up), -1 (down) or 0 (idle), clamped. Raises
+    ValueError when it is not a number.
+    """
+    try:
+        return max(-1, min(1, int(value)))
+    except (TypeError, OverflowError):
+        raise ValueError(f'Invalid direction: {value!r}')
+
+
+class PongMatch:
+    """State and rules of one match. Call step() once per tick."""
+
+    def __init__(self, points_to_win=1, seed=None):
+        self.points_to_win = points_to_win
+        self.seed = seed if seed is not None else random.randrange(2 ** 32)
+        self.tick = 0
+        self.started = False
+        self.paddles = [0.0, 0.0]
+        self.inputs = [0, 0]
+        self.scores = [0, 0]
+        self.winner = None
+        self.acked_seq = [0, 0]
+        self.scheduled_inputs = {}
+        self.history = collections.deque(maxlen=REWIND_TICKS)
+        self.serve(PLAYER1)
+
+    @property
+    def finished(self):
+        return self.winner is not None
+
+    def serve(self, towards):
+        """Put the ball in the centre, moving towards the given side after a pause."""
+        self.ball_x = 0.0
+        self.ball_y = 0.0
+        self.ball_vx = -BALL_SPEED if towards == PLAYER1 else BALL_SPEED
+        self.ball_vy = 0.0
+        self.serve_at = self.tick + RESPAWN_TICKS
+
+    def set_input(self, side, direction):
+        """
+        direction is 1 (up), -1 (down) or 0 (idle), from the next tick on.
+        Recorded with the other inputs, so a rewind replays it too.
+        """
+        direction = input_direction(direction)
+        self.scheduled_inputs.setdefault(self.tick + 1, []).append((side, direction))
+
+    def apply_input(self, side, direction, tick, seq):
+        """
+        Apply a player's input at the tick it was pressed. Inputs for past
+        ticks rewind and replay the match, inputs for future ticks wait for
+        them. Returns how far the correction moved the ball and paddles.
+        """
+        direction = input_direction(direction)
+        if self.finished or seq <= self.acked_seq[side]:
+            return 0.0
+        self.acked_seq[side] = seq
+
+        oldest = self.history[0][0] + 1 if self.history else self.tick + 1
+        tick = max(oldest, min(self.tick + MAX_INPUT_LEAD, tick))
+        self.scheduled_inputs.setdefault(tick, []).append((side, direction))
+        if tick > self.tick:
+            return 0.0
+
+        before = self.positions()
+        now = self.tick
+        self.rewind(tick - 1)
+        while self.tick < now:
+            self.step()
+        return max(abs(a - b) for a, b in zip(before, self.positions()))
+
+    def save_state(self):
+        return (
+            self.tick, self.winner, self.serve_at,
+            self.ball_x, self.ball_y, self.ball_vx, self.ball_vy,
+            tuple(self.paddles), tuple(self.inputs), tuple(self.scores),
+        )
+
+    def load_state(self, state):
+        (self.tick, self.winner, self.serve_at,
+         self.ball_x, self.ball_y, self.ball_vx, self.ball_vy,
+         paddles, inputs, scores) = state
+        self.paddles, self.inputs, self.scores = list(paddles), list(inputs), list(scores)
+
+    def rewind(self, tick):
+        """Restore the state saved at `tick` and forget everything after it."""
+        while self.history and self.history[-1][0] > tick:
+            self.history.pop()
+        self.load_state(self.history.pop()[1])
+
+    def positions(self):
+        return (self.ball_x, self.ball_y, self.paddles[PLAYER1], self.paddles[PLAYER2])
+
+    def step(self):
+        self.history.append((self.tick, self.save_state()))
+        self.tick += 1
+
+        for side, direction in self.scheduled_inputs.get(self.tick, ()):
+            self.inputs[side] = direction
+        self.scheduled_inputs.pop(self.tick - REWIND_TICKS, None)
+
+        for side in (PLAYER1, PLAYER2):
+            y = self.paddles[side] + self.inputs[side] * PADDLE_SPEED
+            self.paddles[side] = max(-PADDLE_LIMIT, min(PADDLE_LIMIT, y))
+
+        if not self.started or self.finished or self.tick < self.serve_at:
+            return
+
+        self.ball_x += self.ball_vx
+        self.ball_y += self.ball_vy
+
+        # top and bottom barriers
+        if abs(self.ball_y) >= TABLE_HEIGHT / 2:
+            self.ball_y = math.copysign(TABLE_HEIGHT / 2, self.ball_y)
+            self.ball_vy = -self.ball_vy
+
+        # paddles
+        if self.ball_vx < 0:
+            self._collide(PLAYER1, PADDLE_X[PLAYER1] + PADDLE_WIDTH / 2, 1)
+        else:
+            self._collide(PLAYER2, PADDLE_X[PLAYER2] - PADDLE_WIDTH / 2, -1)
+
+        # goals
+        if self.ball_x < PADDLE_X[PLAYER1] - 2 * BALL_RADIUS:
+            self._score(PLAYER2)
+        elif self.ball_x > PADDLE_X[PLAYER2] + 2 * BALL_RADIUS:
+            self._score(PLAYER1)
+
+    def _collide(self, side, face_x, direction):
+        crossed = self.ball_x <= face_x if direction > 0 else self.ball_x >= face_x
+        if not crossed or abs(self.ball_y - self.paddles[side]) >= PADDLE_HEIGHT / 2:
+            return
+        # only bounce while the ball is still in front of the paddle
+        if abs(self.ball_x - face_x) > BALL_SPEED:
+            return
+        # seeded by tick rather than a running RNG, so replays bounce the same
+        angle = random.Random(self.seed * TICK_RATE + self.tick).uniform(-MAX_BOUNCE_ANGLE, MAX_BOUNCE_ANGLE)
+        self.ball_x = face_x
+        self.ball_vx = direction * BALL_SPEED * math.cos(angle)
+        self.ball_vy = BALL_SPEED * math.sin(angle)
+
+    def _score(self, side):
+        self.scores[side] += 1
+        if self.scores[side] >= self.points_to_win:
+            self.winner = side
+            return
+        self.serve(towards=1 - side)
+
+    def snapshot(self):
+        """Compact state: tick, ball position, paddle positions and scores."""
+        return [
+            self.tick,
+            round(self.ball_x, 3),
+            round(self.ball_y, 3),
+            round(self.paddles[PLAYER1], 3),
+            round(self.paddles[PLAYER2], 3),
+            self.scores[PLAYER1],
+            self.scores[PLAYER2],
+        ]
@@ -0,0 +1,69 @@
+"""
+Deterministic latency and jitter simulation of Pong input handling.
+
+Player 1's inputs reach the server some ticks after they were pressed, in
+order as over a socket, while player 2 is steered with set_input() every
+tick like the AI. The same presses are played once as if every input
+arrived on time, and the two runs are compared:
+
+    corrections  per late input: ticks late, how far apply_input() moved
+                 the ball and paddles, and how far it moved player 1's
+                 paddle alone
+    divergence   per tick: how far the late run's ball and paddles are
+                 from the on-time run's
+
+Once every input has arrived the late run must be the on-time one, so the
+divergence converges to zero. Used by the tests and manage.py bench_netcode.
+Like engine, this module has no Django dependency.
+"""
+
+import random
+from collections import namedtuple
+
+from .engine import PLAYER1, PLAYER2, REWIND_TICKS, PongMatch
+
+
+Correction = namedtuple('Correction', 'late size paddle')
+Simulation = namedtuple('Simulation', 'state corrections divergence last_arrival')
+
+
+def simulate(latency, jitter, ticks=600, seed=0, press_rate=0.1):
+    rng = random.Random(seed)
+    presses = []  # (pressed at tick, seq, direction)
+    for tick in range(1, ticks):
+        if rng.random() < press_rate:
+            presses.append((tick, len(presses) + 1, rng.choice((-1, 0, 1))))
+    steering = [rng.choice((-1, 0, 1)) for _ in range(ticks + REWIND_TICKS)]
+
+    # on time is while the match is still at the tick before
+    arrivals, last = {}, 0
+    for pressed, seq, direction in presses:
+        last = max(last, pressed - 1 + latency + rng.randint(0, jitter))
+        arrivals.setdefault(last, []).append((pressed, seq, direction))
+    on_time = {}
+    for pressed, seq, direction in presses:
+        on_time.setdefault(pressed - 1, []).append((pressed, seq, direction))
+
+    reference = _play(on_time, steering, seed)
+    late = _play(arrivals, steering, seed)
+    divergence = [
+        max(abs(a - b) for a, b in zip(expected, actual))
+        for expected, actual in zip(reference.divergence, late.divergence)
+    ]
+    return late._replace(divergence=divergence, last_arrival=last)
+
+
+def _play(arrivals, steering, seed):
+    """Run the match, with the positions after every tick as its divergence."""
+    match = PongMatch(points_to_win=1000, seed=seed)
+    match.started = True
+    corrections, positions = [], []
+    for tick in range(len(steering)):
+        for pressed, seq, direction in arrivals.get(tick, ()):
+            paddle = match.paddles[PLAYER1]
+            moved = match.apply_input(PLAYER1, direction, pressed, seq)
+            corrections.append(Correction(tick + 1 - pressed, moved, abs(match.paddles[PLAYER1] - paddle)))
+        match.set_input(PLAYER2, steering[tick])
+        match.step()
+        positions.append(match.positions())
+    return Simulation(match.save_state(), corrections, positions, None)
@@ -0,0 +1,155 @@
+"""
+Binary wire format for Pong snapshots.
+
+Positions are quantized to millimetres (1/1000 of a table unit) and packed
+little-endian with struct. Two frame types exist:
+
+    FULL   B type | I tick | h ball_x | h ball_y | h paddle1 | h paddle2
+                  | H score1 | H score2 | I input_ack           (21 bytes)
+
+    DELTA  B type | I tick | B tick - base_tick | B changed-field mask
+                  | one zigzag varint per changed field, holding the
+                    difference from the base snapshot
+
+A DELTA is encoded against the last snapshot the client acknowledged, so a
+lost frame never corrupts later ones: until a new ack arrives the server
+keeps diffing against the same base. When there is no usable base a FULL
+frame is sent.
+
+input_ack is the last input sequence number the match processed for the
+receiving player (0 for spectators). The client drops the inputs up to it
+and replays the rest on top of the server's paddle position.
+"""
+
+import struct
+
+
+FULL = 1
+DELTA = 2
+
+SCALE = 1000
+FIELDS = 7
+
+# snapshots kept per encoder/decoder to resolve acks and delta bases; a
+# base older than the decoder's history could already be forgotten
+HISTORY = 64
+MAX_BASE_AGE = HISTORY - 1
+
+# ticks and input sequence numbers travel as uint32
+MAX_UINT32 = 2 ** 32 - 1
+
+_full = struct.Struct('<BIhhhhHHI')
+_delta_header = struct.Struct('<BIBB')
+
+
+def wire_int(value):
+    """A tick or sequence number from a client, None unless a uint32 holds it."""
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 <= value <= MAX_UINT32:
+        return None
+    return value
+
+
+def quantize(snapshot, input_ack=0):
+    """Engine snapshot list -> (tick, fields) with integer fields."""
+    tick, ball_x, ball_y, paddle1, paddle2, score1, score2 = snapshot
+    return tick, (
+        round(ball_x * SCALE),
+        round(ball_y * SCALE),
+        round(paddle1 * SCALE),
+        round(paddle2 * SCALE),
+        score1,
+        score2,
+        input_ack,
+    )
+
+
+def dequantize(tick, fields):
+    ball_x, ball_y, paddle1, paddle2, score1, score2, input_ack = fields
+    return [tick, ball_x / SCALE, ball_y / SCALE, paddle1 / SCALE, paddle2 / SCALE, score1, score2, input_ack]
+
+
+def _write_varint(out, value):
+    value = (value << 1) ^ (value >> 63)  # zigzag
+    while value > 0x7f:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def _read_varint(data, offset):
+    shift = result = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        result |= (byte & 0x7f) << shift
+        if not byte & 0x80:
+            break
+        shift += 7
+    return (result >> 1) ^ -(result & 1), offset
+
+
+def _remember(history, tick, fields):
+    history[tick] = fields
+    if len(history) > HISTORY:
+        del history[min(history)]
+
+
+class SnapshotEncoder:
+    """Encodes one socket's stream of snapshots."""
+
+    def __init__(self):
+        self.history = {}
+        self.base = None
+
+    def ack(self, tick):
+        """The client has decoded `tick`; use it as the next delta base."""
+        fields = self.history.get(tick)
+        if fields is not None and (self.base is None or tick > self.base[0]):
+            self.base = (tick, fields)
+
+    def encode(self, snapshot, input_ack=0):
+        tick, fields = quantize(snapshot, input_ack)
+        _remember(self.history, tick, fields)
+
+        if self.base is None or not 0 < tick - self.base[0] <= MAX_BASE_AGE:
+            return _full.pack(FULL, tick, *fields)
+
+        base_tick, base_fields = self.base
+        mask = 0
+        out = bytearray()
+        for index in range(FIELDS):
+            diff = fields[index] - base_fields[index]
+            if diff:
+                mask |= 1 << index
+                _write_varint(out, diff)
+        return _delta_header.pack(DELTA, tick, tick - base_tick, mask) + bytes(out)
+
+
+class SnapshotDecoder:
+    """Client-side counterpart of SnapshotEncoder."""
+
+    def __init__(self):
+        self.history = {}
+
+    def decode(self, frame):
+        """
+        Return the snapshot list with input_ack appended; ack its tick back
+        to the server.
+        """
+        if frame[0] == FULL:
+            _, tick, *fields = _full.unpack(frame)
+        elif frame[0] == DELTA:
+            _, tick, age, mask = _delta_header.unpack_from(frame)
+            base_fields = self.history[tick - age]
+            fields = list(base_fields)
+            offset = _delta_header.size
+            for index in range(FIELDS):
+                if mask & (1 << index):
+                    diff, offset = _read_varint(frame, offset)
+                    fields[index] += diff
+        else:
+            raise ValueError(f'Unknown frame type {frame[0]}')
+
+        fields = tuple(fields)
+        _remember(self.history, tick, fields)
+        return dequantize(tick, fields)
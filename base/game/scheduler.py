@@ -0,0 +1,194 @@
+"""
+Plays the matches of Tournament rooms on the worker's GameServer.
+
+A tournament is scheduled on the worker its bracket page's socket reached:
+TournamentConsumer calls watch() and one task per tournament takes it from
+there. The task starts every match that has both its players at the same
+time, so a round is played in parallel, and waits for them. When a match
+ends its result goes through base.tournament.record_result(), the bracket
+is pushed to the tournament-<room id> group and the matches that became
+ready start straight away.
+
+Matches are held to two time limits:
+
+    JOIN_TIMEOUT    both players must connect within this many seconds. A
+                    player who did not loses by forfeit. If neither did the
+                    match is void: nothing is recorded, and it is played
+                    again once a bracket page schedules the tournament anew.
+    MATCH_TIMEOUT   a match still running after this many seconds is won by
+                    whoever leads, player1 when level.
+
+A tournament left with void matches only stops being scheduled until then.
+Players learn the result on the match socket as {"winner": side}, null when
+void. Results recorded by another worker are picked up every POLL_INTERVAL.
+Tournaments share the worker's event loop, so one worker runs any number of
+them; put sticky routing by room in front of several workers, as for games.
+"""
+
+import asyncio
+import logging
+
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.template.loader import render_to_string
+
+from base.models import Room, Match
+from base.tournament import record_result, bracket_columns
+from .engine import PLAYER1, PLAYER2
+from .server import game_server
+
+
+JOIN_TIMEOUT = 60
+MATCH_TIMEOUT = 10 * 60
+POLL_INTERVAL = 5
+
+logger = logging.getLogger(__name__)
+
+
+def tournament_group_name(room_id):
+    return f'tournament-{room_id}'
+
+
+def render_bracket_event(room):
+    return render_to_string('tournament/partials/bracket_event.html', {
+        'brackets': bracket_columns(room),
+        'room': room,
+    })
+
+
+def ready_matches(room_id):
+    """The matches waiting to be played, or None once the tournament is over."""
+    room = Room.objects.get(pk=room_id)
+    if room.is_expired:
+        return None
+    return list(Match.objects.filter(
+        room_id=room_id, is_completed=False, player1__isnull=False, player2__isnull=False,
+    ))
+
+
+def match_outcome(session):
+    """
+    (player1_score, player2_score, winner_id) of a finished or stopped game,
+    None when neither player showed up.
+    """
+    match = session.match
+    scores = list(match.scores)
+    connected = [player is not None for player in session.players]
+    if not session.joined.is_set():
+        if not any(connected):
+            return None
+        # forfeit: whoever showed up wins by the full score
+        side = PLAYER1 if connected[PLAYER1] else PLAYER2
+        scores = [0, 0]
+        scores[side] = match.points_to_win
+        return scores[PLAYER1], scores[PLAYER2], session.seats[side]
+    if match.finished:
+        side = match.winner
+    else:
+        side = PLAYER2 if scores[PLAYER2] > scores[PLAYER1] else PLAYER1
+    return scores[PLAYER1], scores[PLAYER2], session.seats[side]
+
+
+class TournamentScheduler:
+    def __init__(self, server):
+        self.server = server
+        self.tasks = {}
+        self.wakeups = {}
+
+    def __len__(self):
+        return len(self.tasks)
+
+    def watch(self, room_id):
+        """Schedule the room's tournament on this worker unless it already is."""
+        if room_id not in self.tasks:
+            self.wakeups[room_id] = asyncio.Event()
+            self.tasks[room_id] = asyncio.ensure_future(self.run(room_id))
+
+    async def run(self, room_id):
+        playing = {}
+        void = set()
+        wakeup = self.wakeups[room_id]
+        try:
+            while True:
+                wakeup.clear()
+                finished = [match_id for match_id, task in playing.items() if task.done()]
+                for match_id in finished:
+                    task = playing.pop(match_id)
+                    if task.cancelled():
+                        continue
+                    if task.exception() is not None:
+                        logger.error('Tournament match %s failed', match_id, exc_info=task.exception())
+                    elif not task.result():
+                        void.add(match_id)
+                if finished:
+                    await self.broadcast(room_id)
+
+                matches = await database_sync_to_async(ready_matches)(room_id)
+                if matches is None:
+                    # the last result may have landed since the broadcast
+                    await self.broadcast(room_id)
+                    break
+                for match in matches:
+                    if match.id not in playing and match.id not in void:
+                        playing[match.id] = asyncio.ensure_future(self.play(room_id, match))
+                if matches and not playing:
+                    # nobody is playing; the next watch() replays the void matches
+                    break
+
+                await self.wait(wakeup, POLL_INTERVAL)
+        finally:
+            for task in playing.values():
+                task.cancel()
+            self.tasks.pop(room_id, None)
+            self.wakeups.pop(room_id, None)
+
+    async def play(self, room_id, match):
+        """Play the match and record its outcome; False when it was void."""
+        points_to_win = await database_sync_to_async(
+            lambda: Room.objects.values_list('points', flat=True).get(pk=room_id)
+        )()
+        session = self.server.open_match(match, max(points_to_win, 1))
+        try:
+            if await self.wait(session.joined, JOIN_TIMEOUT):
+                await self.wait(session.done, MATCH_TIMEOUT)
+        finally:
+            self.server.close(session)
+
+        outcome = match_outcome(session)
+        if outcome is None:
+            logger.info('Tournament match %s is void, neither player joined', match.id)
+        else:
+            player1_score, player2_score, winner_id = outcome
+            try:
+                await database_sync_to_async(record_result)(match, player1_score, player2_score, winner_id)
+            except ValueError:
+                # recorded meanwhile by another worker
+                logger.info('Tournament match %s already had a result', match.id)
+        # a finished game has told its sockets already
+        if not session.match.finished:
+            winner = None if outcome is None else session.seats.index(outcome[2])
+            for consumer in list(session.subscribers):
+                await consumer.send_result(winner)
+        wakeup = self.wakeups.get(room_id)
+        if wakeup is not None:
+            wakeup.set()
+        return outcome is not None
+
+    @staticmethod
+    async def wait(event, timeout):
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    async def broadcast(self, room_id):
+        room = await database_sync_to_async(Room.objects.get)(pk=room_id)
+        html = await database_sync_to_async(render_bracket_event)(room)
+        await get_channel_layer().group_send(tournament_group_name(room_id), {
+            'type': 'bracket_handler',
+            'html': html,
+        })
+
+
+tournament_scheduler = TournamentScheduler(game_server)
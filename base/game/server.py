@@ -0,0 +1,202 @@
+"""
+Runs PongMatch simulations as asyncio tasks inside the ASGI worker.
+
+There is one task per active match. Each task steps its match at TICK_RATE
+and hands the snapshot to every connected socket. Both players of a room
+must reach the same worker, so put sticky routing by room in front of
+multiple workers.
+
+The result is the server's alone: record_result() writes it to the room
+when the match ends and every socket is sent {"winner": side}. Clients
+never report it.
+
+PLAYER2 of every AI room is played by one shared AIPool, stepped by its own
+task at TICK_RATE while any AI match is running. Its difficulty is set with
+the PONG_AI setting, the keyword arguments of AIPool.
+
+Tournament matches are opened by base.game.scheduler with their two players
+fixed. Their result is left to the scheduler instead of being written to the
+room.
+"""
+
+import asyncio
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import transaction
+
+from base.models import Room
+from base.leaderboard import record_game
+from .ai import AIPool
+from .engine import PongMatch, TICK, TICK_RATE, PLAYER1, PLAYER2
+
+
+# Stop a match that has had no player connected for this many ticks.
+ABANDON_TICKS = 10 * TICK_RATE
+
+
+class GameSession:
+    """A running match, its players and the sockets watching it."""
+
+    def __init__(self, key, room_id, match, opponent_type, seats=None, abandon_ticks=ABANDON_TICKS):
+        self.key = key
+        self.room_id = room_id
+        self.match = match
+        self.opponent_type = opponent_type
+        # user ids allowed on each side, None for whoever comes first
+        self.seats = seats or [None, None]
+        self.abandon_ticks = abandon_ticks
+        self.players = [None, None]
+        self.subscribers = set()
+        self.task = None
+        # set once both sides are connected, and when the task ends
+        self.joined = asyncio.Event()
+        self.done = asyncio.Event()
+
+    @property
+    def ready(self):
+        if self.opponent_type == 'AI':
+            return self.players[PLAYER1] is not None
+        return None not in self.players
+
+
+class GameServer:
+    def __init__(self):
+        self.sessions = {}
+        self.ai = AIPool(**getattr(settings, 'PONG_AI', {}))
+        self.ai_task = None
+
+    async def join(self, room, consumer, user, participant_ids):
+        """
+        Attach a socket to the room's match, starting it if needed. Returns
+        the session and the side the user controls: the host plays PLAYER1
+        and, outside AI rooms, another participant PLAYER2. Everyone else,
+        anonymous users included, watches (None).
+        """
+        session = self.sessions.get(room.id)
+        if session is None:
+            session = GameSession(room.id, room.id, PongMatch(points_to_win=room.points), room.opponent_type)
+            self.sessions[room.id] = session
+            session.task = asyncio.ensure_future(self.run(session))
+            if room.opponent_type == 'AI':
+                self.ai.add(session.match)
+                if self.ai_task is None:
+                    self.ai_task = asyncio.ensure_future(self.run_ai())
+
+        side = None
+        user_id = user.id if user.is_authenticated else None
+        if user_id is not None and user_id == room.host_id:
+            side = PLAYER1
+        elif (room.opponent_type != 'AI' and user_id in participant_ids
+              and session.players[PLAYER2] in (None, user_id)):
+            side = PLAYER2
+        return session, self.seat(session, consumer, side, user_id)
+
+    def seat(self, session, consumer, side, user_id):
+        if side is not None:
+            session.players[side] = user_id
+
+        session.subscribers.add(consumer)
+        if session.ready:
+            session.match.started = True
+            session.joined.set()
+        return side
+
+    def open_match(self, match, points_to_win):
+        """Start the game of a tournament Match, waiting for its two players."""
+        key = ('match', match.id)
+        # the scheduler keeps the time, no-shows included
+        session = GameSession(key, match.room_id, PongMatch(points_to_win=points_to_win), 'Tournament',
+                              seats=[match.player1_id, match.player2_id], abandon_ticks=None)
+        self.sessions[key] = session
+        session.task = asyncio.ensure_future(self.run(session))
+        return session
+
+    def join_match(self, match_id, consumer, user_id):
+        """
+        Attach a socket to a running tournament match. Returns the session,
+        or None when the match is not running on this worker, and the side.
+        """
+        session = self.sessions.get(('match', match_id))
+        if session is None:
+            return None, None
+        side = session.seats.index(user_id) if user_id in session.seats else None
+        return session, self.seat(session, consumer, side, user_id)
+
+    def close(self, session):
+        if session.task is not None:
+            session.task.cancel()
+
+    def leave(self, session, consumer):
+        session.subscribers.discard(consumer)
+
+    async def run(self, session):
+        loop = asyncio.get_running_loop()
+        match = session.match
+        next_tick = loop.time()
+        idle_ticks = 0
+        try:
+            while not match.finished and (session.abandon_ticks is None or idle_ticks < session.abandon_ticks):
+                match.step()
+                await self.broadcast(session)
+
+                idle_ticks = 0 if session.subscribers else idle_ticks + 1
+                # schedule against the ideal timeline so ticks do not drift
+                next_tick += TICK
+                await asyncio.sleep(max(0, next_tick - loop.time()))
+
+            if match.finished and session.key == session.room_id:
+                await self.record_result(session)
+            for consumer in list(session.subscribers):
+                await consumer.send_result(match.winner)
+        finally:
+            self.sessions.pop(session.key, None)
+            self.ai.remove(match)
+            session.done.set()
+
+    async def run_ai(self):
+        """Move the AI paddle of every AI match, one batch per tick."""
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        try:
+            while len(self.ai):
+                self.ai.think()
+                next_tick += TICK
+                await asyncio.sleep(max(0, next_tick - loop.time()))
+        finally:
+            self.ai_task = None
+
+    async def broadcast(self, session):
+        snapshot = session.match.snapshot()
+        for consumer in list(session.subscribers):
+            await consumer.send_snapshot(snapshot)
+
+    @database_sync_to_async
+    def record_result(self, session):
+        """
+        Expire the room with its result and rate the players. Only the
+        recorder that claims the room, flipping is_expired, gets that far,
+        so a game is never rated twice.
+        """
+        with transaction.atomic():
+            if not Room.objects.filter(pk=session.room_id, is_expired=False).update(is_expired=True):
+                return
+            room = Room.objects.get(id=session.room_id)
+            winner = session.match.winner
+            loser = PLAYER2 if winner == PLAYER1 else PLAYER1
+            if session.opponent_type == 'AI':
+                room.won_by_ai = winner == PLAYER2
+                room.won_by_user_id = session.players[PLAYER1] if winner == PLAYER1 else None
+                players = [session.players[PLAYER1], None]
+            else:
+                room.won_by_user_id = session.players[winner]
+                players = session.players
+            # saved as well so the room's receivers see the result
+            room.save()
+
+            # tournament rooms are rated match by match, see base.tournament
+            if session.opponent_type != 'Tournament':
+                scores = session.match.scores
+                record_game(players[winner], players[loser], scores[winner], scores[loser])
+
+game_server = GameServer()
@@ -0,0 +1,49 @@
+"""
+Keyset pagination over a chat group's message history.
+
+Pages are cut at a (created, id) cursor instead of an OFFSET, so fetching an
+old page is an index range seek on (group, created, id) and costs the same
+however far back it is. The id breaks ties between messages created in the
+same microsecond.
+
+A cursor is the "<microseconds since epoch>-<id>" of the oldest message on
+the previous page.
+"""
+
+import datetime
+
+
+PAGE_SIZE = 30
+
+EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def encode_cursor(message):
+    delta = message.created - EPOCH
+    micros = (delta.days * 86400 + delta.seconds) * 10 ** 6 + delta.microseconds
+    return f'{micros}-{message.id}'
+
+
+def decode_cursor(cursor):
+    """Return (created, id). Raises ValueError for a malformed cursor."""
+    micros, message_id = cursor.split('-')
+    return EPOCH + datetime.timedelta(microseconds=int(micros)), int(message_id)
+
+
+def message_page(chat_group, before=None, size=PAGE_SIZE):
+    """
+    Return up to `size` messages of the group older than the `before` cursor,
+    newest first, and the cursor of the next older page (None at the start
+    of the history).
+    """
+    # authors and invited rooms are rendered with every message
+    messages = chat_group.chat_messages.select_related('author', 'room')
+    if before:
+        created, message_id = decode_cursor(before)
+        messages = messages.filter(created__lte=created).exclude(created=created, id__gte=message_id)
+
+    messages = list(messages[:size + 1])
+    if len(messages) <= size:
+        return messages, None
+    messages = messages[:size]
+    return messages, encode_cursor(messages[-1])
@@ -0,0 +1,113 @@
+"""
+Player ratings and the leaderboard.
+
+Every result updates the two players' PlayerStats rows as it is recorded:
+wins, losses, points for and against, and an Elo rating. Tournament matches
+come in through base.tournament.record_result(), room games through the
+game server; both are outcomes the server played, never what a client
+reports. Nothing is aggregated per request.
+
+Ranks come from RatingBucket, which counts the players in each
+RATING_BUCKET-wide band of rating. A player's rank is the number of
+players in the bands above theirs, a sum over a few hundred rows at most,
+plus those above them in their own band, a short range of the rating
+index. Neither grows with the number of matches played.
+
+AI rooms rate the player against a fixed AI_RATING; the AI has no row.
+"""
+
+from django.db import transaction
+from django.db.models import F, Sum
+
+from .models import PlayerStats, RatingBucket
+
+
+INITIAL_RATING = 1500
+AI_RATING = 1500
+K_FACTOR = 32
+RATING_BUCKET = 10
+
+
+def bucket_floor(rating):
+    return int(rating // RATING_BUCKET) * RATING_BUCKET
+
+
+def expected_score(rating, opponent_rating):
+    return 1 / (1 + 10 ** ((opponent_rating - rating) / 400))
+
+
+def _bucket_add(floor, delta):
+    if not RatingBucket.objects.filter(floor=floor).update(players=F('players') + delta):
+        RatingBucket.objects.create(floor=floor, players=delta)
+
+
+def forget_rating(rating):
+    """Take a deleted player, rated `rating`, out of their band."""
+    _bucket_add(bucket_floor(rating), -1)
+
+
+def _stats_for_update(user_id):
+    stats, created = PlayerStats.objects.get_or_create(user_id=user_id)
+    if created:
+        _bucket_add(bucket_floor(stats.rating), 1)
+    return PlayerStats.objects.select_for_update().get(pk=user_id)
+
+
+def _apply(stats, won, points_for, points_against, rating):
+    if won:
+        stats.wins += 1
+    else:
+        stats.losses += 1
+    stats.points_for += points_for
+    stats.points_against += points_against
+
+    old_floor, new_floor = bucket_floor(stats.rating), bucket_floor(rating)
+    if old_floor != new_floor:
+        _bucket_add(old_floor, -1)
+        _bucket_add(new_floor, 1)
+    stats.rating = rating
+    stats.save()
+
+
+def record_game(winner_id, loser_id, winner_points=0, loser_points=0):
+    """
+    Count one finished game. Pass None for the side played by the AI.
+    """
+    with transaction.atomic():
+        # lock in id order so two games of the same players cannot deadlock
+        ids = sorted(user_id for user_id in (winner_id, loser_id) if user_id is not None)
+        stats = {user_id: _stats_for_update(user_id) for user_id in ids}
+        winner = stats.get(winner_id)
+        loser = stats.get(loser_id)
+
+        winner_rating = winner.rating if winner else AI_RATING
+        loser_rating = loser.rating if loser else AI_RATING
+        change = K_FACTOR * (1 - expected_score(winner_rating, loser_rating))
+        if winner:
+            _apply(winner, True, winner_points, loser_points, winner_rating + change)
+        if loser:
+            _apply(loser, False, loser_points, winner_points, loser_rating - change)
+
+
+def top_players(n=10):
+    """The n best rated players, best first, along the rating index."""
+    return list(PlayerStats.objects.select_related('user')[:n])
+
+
+def rating_of(user_id):
+    """The user's rating, INITIAL_RATING before their first game."""
+    rating = PlayerStats.objects.filter(pk=user_id).values_list('rating', flat=True).first()
+    return INITIAL_RATING if rating is None else rating
+
+
+def rank_of(user_id):
+    """1-based leaderboard rank of the user, None before their first game."""
+    rating = PlayerStats.objects.filter(pk=user_id).values_list('rating', flat=True).first()
+    if rating is None:
+        return None
+    floor = bucket_floor(rating)
+    above = RatingBucket.objects.filter(floor__gt=floor).aggregate(players=Sum('players'))['players'] or 0
+    # equal ratings are ranked by user id, like the leaderboard
+    above += PlayerStats.objects.filter(rating__gt=rating, rating__lt=floor + RATING_BUCKET).count()
+    above += PlayerStats.objects.filter(rating=rating, user_id__lt=user_id).count()
+    return above + 1
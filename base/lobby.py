@@ -0,0 +1,124 @@
+"""
+Room lobby events.
+
+Views that change who is in a room, or whether they are ready, call
+send_lobby_event(). Sockets on LobbyConsumer receive a snapshot of the
+lobby and re-render their own view of it, so nothing polls the lobby.
+
+The room list reads OpenLobby, one denormalized row per open room with its
+host display fields, participant count and readiness. The receivers in
+base.signals refresh a row whenever its room, participants or host change,
+so listing the lobbies is a single query, and bump the "lobby" version the
+room list is tagged with.
+"""
+
+from uuid import uuid4
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.utils import timezone
+
+from .models import Room, OpenLobby, ChatGroup
+from .versions import bump_version
+
+
+def lobby_group_name(room_id):
+    return f'room-lobby-{room_id}'
+
+
+def lobby_snapshot(room):
+    """Plain, serializable lobby state: room flags and participant cards."""
+    participants = [
+        {
+            'id': participant.id,
+            'username': participant.username,
+            'bio': participant.bio,
+            'avatar_url': participant.avatar.url if participant.avatar else '',
+        }
+        for participant in room.participants.all()
+    ]
+    return {
+        'room': {
+            'id': room.id,
+            'host_id': room.host_id,
+            'opponent_type': room.opponent_type,
+            'opp_ready': room.opp_ready,
+        },
+        'participants': participants,
+    }
+
+
+def lobby_context(snapshot, viewer_id):
+    participants = snapshot['participants']
+    return {
+        'room': snapshot['room'],
+        'participants': participants,
+        'other_player': participants[1] if len(participants) > 1 else None,
+        'viewer_id': viewer_id,
+    }
+
+
+def create_room_chat(room, members):
+    """The room's chat group, administered by its host."""
+    # a suffix keeps rooms of the same name apart
+    group_name = f"{room.name.replace(' ', '-')}-{uuid4().hex[:6]}"
+    chat_group = ChatGroup.objects.create(
+        admin=room.host,
+        group_name=group_name,
+        groupchat_name=group_name,
+        room=room,
+    )
+    chat_group.members.set(members)
+    return chat_group
+
+
+def send_lobby_event(room, kicked_id=None):
+    event = {
+        'type': 'lobby_handler',
+        'kicked_id': kicked_id,
+        **lobby_snapshot(room),
+    }
+    async_to_sync(get_channel_layer().group_send)(lobby_group_name(room.id), event)
+
+
+def refresh_open_lobby(room):
+    """Bring the room's OpenLobby row in line with the room."""
+    bump_version('lobby')
+    if room.is_expired:
+        OpenLobby.objects.filter(room_id=room.id).delete()
+        return
+
+    host = room.host
+    OpenLobby.objects.update_or_create(room_id=room.id, defaults={
+        'name': room.name,
+        'description': room.description,
+        'points': room.points,
+        'opponent_type': room.opponent_type,
+        'host': host,
+        'host_username': (host.username or '') if host else '',
+        'host_avatar_url': host.avatar.url if host and host.avatar else '',
+        'participant_count': room.participants.count(),
+        # the host is ready by starting the game, only the guest says so
+        'is_ready': room.opp_ready,
+        'created': room.created,
+        'updated': room.updated,
+    })
+
+
+def refresh_lobby_host(user):
+    # update() skips auto_now, so bump changed by hand
+    if OpenLobby.objects.filter(host=user).update(
+        host_username=user.username or '',
+        host_avatar_url=user.avatar.url if user.avatar else '',
+        changed=timezone.now(),
+    ):
+        bump_version('lobby')
+
+
+def open_lobbies(room_ids=None):
+    """All open lobbies, or those of room_ids in that order."""
+    if room_ids is None:
+        return OpenLobby.objects.all()
+    lobbies = OpenLobby.objects.in_bulk(room_ids)
+    return [lobbies[room_id] for room_id in room_ids if room_id in lobbies]
+
@@ -0,0 +1,50 @@
+"""
+Cost of one AIPool.think() pass as the number of AI matches grows.
+
+Every match is stepped between passes so the AI sees moving balls, but only
+think() is timed. The budget column is the share of a 60 Hz tick one pass
+takes on one core:
+
+    python manage.py bench_ai --matches 1 10 100 1000 5000
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from base.game.ai import AIPool
+from base.game.engine import TICK, PongMatch
+
+
+class Command(BaseCommand):
+    help = 'Measure the AI batch for increasing numbers of AI matches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--matches', type=int, nargs='+', default=[1, 10, 100, 1000, 5000])
+        parser.add_argument('--ticks', type=int, default=300)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'matches':>8} {'us/pass':>10} {'us/match':>9} {'budget':>7}")
+        for count in options['matches']:
+            seconds = self.bench(count, options['ticks'])
+            self.stdout.write(
+                f'{count:>8} {seconds * 1e6:>10.1f} {seconds * 1e6 / count:>9.2f} {seconds / TICK:>7.1%}'
+            )
+
+    @staticmethod
+    def bench(count, ticks):
+        """Mean seconds per think() pass over `count` matches."""
+        pool = AIPool(seed=0)
+        matches = [PongMatch(points_to_win=10 ** 6, seed=number) for number in range(count)]
+        for match in matches:
+            match.started = True
+            pool.add(match)
+
+        elapsed = 0.0
+        for _ in range(ticks):
+            started = time.perf_counter()
+            pool.think()
+            elapsed += time.perf_counter() - started
+            for match in matches:
+                match.step()
+        return elapsed / ticks
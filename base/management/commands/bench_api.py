@@ -0,0 +1,131 @@
+"""
+Latency, queries and memory of GET /api/rooms/ over many rooms.
+
+Fills the database with --rooms rooms, most of them expired, with two of
+twenty users as participants each, then requests pages of the endpoint
+through the test client: the first page, the pages after it, a page deep
+in the cursor, sparse fieldsets, filters and a revalidation with the
+ETag. Each request reports its status, median time of five, queries,
+tracemalloc peak and response size.
+
+For comparison, the old endpoint is measured too: RoomSerializer over
+--old rooms, every field, participants loaded one room at a time, scaled
+up to all of them.
+
+Everything is created in a transaction that is rolled back at the end, but
+run it against a scratch database all the same:
+
+    python manage.py bench_api --rooms 100000
+"""
+
+import base64
+import random
+import statistics
+import time
+import tracemalloc
+import uuid
+from urllib.parse import urlencode
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+
+from base.api.serializers import RoomSerializer
+from base.models import Room, User
+
+
+MB = 1024 * 1024
+BATCH = 5000
+
+
+def cursor_at(position):
+    """A ?cursor= value for the page of rooms with ids below position."""
+    return base64.b64encode(urlencode({'p': position}).encode()).decode()
+
+
+class Command(BaseCommand):
+    help = 'Measure the paginated rooms API over many rooms.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=100000)
+        parser.add_argument('--old', type=int, default=5000)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        # the test client needs the test environment's ALLOWED_HOSTS
+        setup_test_environment()
+        with transaction.atomic():
+            ids = self.fill(options['rooms'], random.Random(options['seed']))
+            client = Client()
+            self.stdout.write(f"{'':>26} {'status':>6} {'ms':>7} {'queries':>7} {'peak MB':>7} {'bytes':>7}")
+            response = self.report('first page', client, '/api/rooms/')
+            for number in range(3):
+                response = self.report(f'next page {number + 1}', client, response.json()['next'])
+            self.report('deep cursor', client, f'/api/rooms/?cursor={cursor_at(ids[len(ids) // 100])}')
+            self.report('fields=id,name', client, '/api/rooms/?fields=id,name')
+            self.report('fields=id,participants', client, '/api/rooms/?fields=id,participants&page_size=200')
+            self.report('open AI rooms', client, '/api/rooms/?is_expired=false&opponent_type=AI')
+            response = client.get('/api/rooms/?fields=id,name')
+            self.report('If-None-Match', client, '/api/rooms/?fields=id,name', HTTP_IF_NONE_MATCH=response['ETag'])
+            self.old_endpoint(options['old'], len(ids))
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def fill(count, rng):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        User.objects.bulk_create([
+            User(email=f'{prefix}-{number}@bench.invalid', username=f'{prefix}-{number}', avatar=None)
+            for number in range(20)
+        ])
+        users = list(User.objects.filter(username__startswith=f'{prefix}-'))
+        for start in range(0, count, BATCH):
+            Room.objects.bulk_create([
+                Room(
+                    host=rng.choice(users), name=f'{prefix} room {number}', invitation_link=f'{prefix}-{number}',
+                    opponent_type=rng.choice(('AI', 'vs Player', 'Tournament')), is_expired=rng.random() < 0.7,
+                )
+                for number in range(start, min(start + BATCH, count))
+            ])
+        ids = list(Room.objects.filter(invitation_link__startswith=f'{prefix}-').values_list('id', flat=True))
+        Through = Room.participants.through
+        for start in range(0, len(ids), BATCH):
+            Through.objects.bulk_create([
+                Through(room_id=room_id, user_id=user.id)
+                for room_id in ids[start:start + BATCH] for user in rng.sample(users, 2)
+            ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return sorted(ids, reverse=True)
+
+    def report(self, label, client, url, repeat=5, **headers):
+        # timed without tracemalloc, which slows every allocation down
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            client.get(url, **headers)
+            timings.append(time.perf_counter() - started)
+        # with DEBUG on, the query log is capped and would hide the count
+        reset_queries()
+        tracemalloc.start()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url, **headers)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(
+            f'{label:>26} {response.status_code:>6} {statistics.median(timings) * 1e3:>7.1f} {len(queries):>7} '
+            f'{peak / MB:>7.2f} {len(response.content):>7}'
+        )
+        return response
+
+    def old_endpoint(self, count, total):
+        tracemalloc.start()
+        started = time.perf_counter()
+        RoomSerializer(Room.objects.all()[:count], many=True).data
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        self.stdout.write(
+            f'old endpoint: {count} rooms in {elapsed:.1f} s, peak {peak / MB:.1f} MB; '
+            f'about {elapsed * total / count:.0f} s for all {total}'
+        )
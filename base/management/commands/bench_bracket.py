@@ -0,0 +1,92 @@
+"""
+Query counts and time of drawing and playing out a tournament bracket.
+
+For each --format, draws a bracket for --players players with
+generate_bracket() and then reports random scores with record_result()
+for whichever match has both players seated, until the tournament is
+over. Reports the matches drawn, the time and queries of the draw
+(including its bulk_create batches), and the mean and largest number of
+queries per result (including seating and the next Swiss round). A
+correct run ends with a champion and no open match.
+
+Everything is created in a transaction that is rolled back at the end, but
+run it against a scratch database all the same:
+
+    python manage.py bench_bracket --players 1024 --format single double swiss
+"""
+
+import random
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+
+from base.models import Match, Room, User
+from base.tournament import generate_bracket, record_result
+
+
+class Command(BaseCommand):
+    help = 'Draw and play out large tournament brackets, counting queries.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=1024)
+        parser.add_argument('--format', nargs='+', default=['single', 'double', 'swiss'],
+                            choices=[choice for choice, _ in Room.TOURNAMENT_FORMAT_CHOICES])
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            prefix = f'bench-{uuid.uuid4().hex[:8]}'
+            User.objects.bulk_create([
+                User(email=f'{prefix}-{number}@bench.invalid', username=f'{prefix}-{number}', avatar=None)
+                for number in range(options['players'])
+            ])
+            players = list(User.objects.filter(username__startswith=f'{prefix}-'))
+            self.stdout.write(
+                f"{'format':>7} {'matches':>7} {'draw ms':>8} {'draw q':>6} "
+                f"{'results':>7} {'mean q':>6} {'max q':>5} {'ms/result':>9} {'champion':>8}"
+            )
+            for tournament_format in options['format']:
+                self.play(players, tournament_format, random.Random(options['seed']))
+            transaction.set_rollback(True)
+
+    def play(self, players, tournament_format, rng):
+        room = Room.objects.create(
+            name=f'bench {tournament_format}', opponent_type='Tournament',
+            tournament_format=tournament_format, host=players[0],
+        )
+        room.participants.set(players)
+        # with DEBUG on, the query log is capped and would hide the counts
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            generate_bracket(room, seed=rng.randrange(2 ** 32))
+            drawn = time.perf_counter() - started
+        draw_queries = len(queries)
+        matches = room.matches.count()
+
+        counts, elapsed = [], 0.0
+        while True:
+            ready = Match.objects.filter(
+                room=room, is_completed=False, player1__isnull=False, player2__isnull=False,
+            ).first()
+            if ready is None:
+                break
+            player1_score, player2_score = rng.sample(range(6), 2)
+            reset_queries()
+            with CaptureQueriesContext(connection) as queries:
+                started = time.perf_counter()
+                record_result(ready, player1_score, player2_score)
+                elapsed += time.perf_counter() - started
+            counts.append(len(queries))
+
+        room.refresh_from_db()
+        open_matches = room.matches.filter(is_completed=False).exists()
+        finished = 'yes' if room.won_by_user_id and not open_matches else 'NO'
+        self.stdout.write(
+            f'{tournament_format:>7} {matches:>7} {drawn * 1e3:>8.0f} {draw_queries:>6} '
+            f'{len(counts):>7} {sum(counts) / max(len(counts), 1):>6.1f} {max(counts, default=0):>5} '
+            f'{elapsed / max(len(counts), 1) * 1e3:>9.2f} {finished:>8}'
+        )
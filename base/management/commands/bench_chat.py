@@ -0,0 +1,103 @@
+"""
+Load benchmark of chat message fan-out through ChatroomConsumer.
+
+For each room size, that many sockets join one chat group and one of them
+sends messages back to back. Every socket must receive every message; the
+command reports messages and deliveries per second and the p50/p99 delay
+between sending a message and a socket receiving it.
+
+It creates its users and chat group and deletes them afterwards, but run it
+against a scratch database all the same:
+
+    python manage.py bench_chat --sockets 10 100 1000 --messages 20
+"""
+
+import asyncio
+import json
+import time
+import uuid
+
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+
+from base.models import ChatGroup, GroupMessage, User
+from base.routing import websocket_urlpatterns
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Measure chat fan-out throughput and delivery latency per room size.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sockets', type=int, nargs='+', default=[10, 100, 1000])
+        parser.add_argument('--messages', type=int, default=20)
+
+    def handle(self, *args, **options):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        sender = User.objects.create_user(email=f'{prefix}@bench.invalid', username=prefix, password=None)
+        group = ChatGroup.objects.create(group_name=prefix)
+        try:
+            self.stdout.write(f"{'sockets':>8} {'msg/s':>9} {'deliveries/s':>13} {'p50 ms':>8} {'p99 ms':>8}")
+            for sockets in options['sockets']:
+                result = asyncio.run(self.run(group.group_name, sender, sockets, options['messages']))
+                self.stdout.write(
+                    f"{sockets:>8} {result['messages_per_second']:>9.1f} {result['deliveries_per_second']:>13.0f}"
+                    f" {result['p50'] * 1000:>8.1f} {result['p99'] * 1000:>8.1f}"
+                )
+        finally:
+            GroupMessage.objects.filter(group=group).delete()
+            group.delete()
+            sender.delete()
+
+    async def run(self, group_name, sender, sockets, messages):
+        app = URLRouter(websocket_urlpatterns)
+        communicators = []
+        for index in range(sockets):
+            communicator = WebsocketCommunicator(app, f'/ws/chatroom/{group_name}')
+            # recipients only need an id that differs from the author's
+            communicator.scope['user'] = sender if index == 0 else User(id=-index)
+            connected, _ = await communicator.connect()
+            assert connected
+            communicators.append(communicator)
+
+        sent_at = {}
+        latencies = []
+
+        async def collect(communicator):
+            received = 0
+            while received < messages:
+                html = await communicator.receive_from(timeout=60)
+                at = time.perf_counter()
+                # online counts are pushed on the same socket
+                for marker, started in sent_at.items():
+                    if marker in html:
+                        latencies.append(at - started)
+                        received += 1
+                        break
+
+        collectors = [asyncio.ensure_future(collect(communicator)) for communicator in communicators]
+        started = time.perf_counter()
+        for number in range(messages):
+            marker = f'{group_name}-message-{number}-end'
+            sent_at[marker] = time.perf_counter()
+            await communicators[0].send_to(text_data=json.dumps({'body': marker}))
+            # let the consumer pick it up before the next one is stamped
+            await asyncio.sleep(0)
+        await asyncio.gather(*collectors)
+        elapsed = time.perf_counter() - started
+
+        for communicator in communicators:
+            await communicator.disconnect()
+        await database_sync_to_async(GroupMessage.objects.filter(group__group_name=group_name).delete)()
+        return {
+            'messages_per_second': messages / elapsed,
+            'deliveries_per_second': messages * sockets / elapsed,
+            'p50': percentile(latencies, 0.5),
+            'p99': percentile(latencies, 0.99),
+        }
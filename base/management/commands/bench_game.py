@@ -0,0 +1,126 @@
+"""
+Headless benchmark of the Pong game server.
+
+    engine  steps --matches PongMatch simulations back to back for --ticks
+            ticks each and reports ticks per second on one core, and how
+            many matches that is at TICK_RATE.
+    server  runs --matches sessions on GameServer's real tick loop for
+            --seconds, each with two sockets that encode every snapshot and
+            acknowledge it, and reports the share of the TICK_RATE ticks it
+            kept up with.
+
+Both run in this process, so they measure one core:
+
+    python manage.py bench_game --matches 100 500 1000
+"""
+
+import asyncio
+import random
+import time
+
+from django.core.management.base import BaseCommand
+
+from base.game.engine import PLAYER1, PLAYER2, TICK_RATE, PongMatch
+from base.game.protocol import SnapshotEncoder
+from base.game.server import GameServer, GameSession
+
+
+# high enough that no match ends while it is measured
+POINTS_TO_WIN = 10 ** 6
+
+
+def new_match(seed):
+    match = PongMatch(points_to_win=POINTS_TO_WIN, seed=seed)
+    match.started = True
+    return match
+
+
+class FakeSocket:
+    """Stands in for GameConsumer: encodes snapshots, acks them, moves at random."""
+
+    def __init__(self, match, side, rng):
+        self.match = match
+        self.side = side
+        self.rng = rng
+        self.encoder = SnapshotEncoder()
+        self.bytes = 0
+
+    async def send_snapshot(self, snapshot):
+        frame = self.encoder.encode(snapshot, self.match.acked_seq[self.side])
+        self.bytes += len(frame)
+        self.encoder.ack(snapshot[0])
+        if self.rng.random() < 0.1:
+            self.match.set_input(self.side, self.rng.choice((-1, 0, 1)))
+
+    async def send_result(self, winner):
+        pass
+
+
+class Command(BaseCommand):
+    help = 'Measure Pong simulation and game server tick throughput on one core.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--matches', type=int, nargs='+', default=[100, 500, 1000])
+        parser.add_argument('--ticks', type=int, default=600)
+        parser.add_argument('--seconds', type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        self.stdout.write('engine: PongMatch.step() back to back')
+        self.stdout.write(f"{'matches':>8} {'ticks/s':>10} {'us/tick':>8} {'matches at 60 Hz':>17}")
+        for count in options['matches']:
+            ticks_per_second = self.bench_engine(count, options['ticks'])
+            self.stdout.write(
+                f'{count:>8} {ticks_per_second:>10.0f} {1e6 / ticks_per_second:>8.1f}'
+                f' {ticks_per_second / TICK_RATE:>17.0f}'
+            )
+
+        self.stdout.write('\nserver: GameServer tick loop with two encoding sockets per match')
+        self.stdout.write(f"{'matches':>8} {'ticks/s':>10} {'kept up':>8} {'bytes/tick':>11}")
+        for count in options['matches']:
+            result = asyncio.run(self.bench_server(count, options['seconds']))
+            self.stdout.write(
+                f"{count:>8} {result['ticks_per_second']:>10.0f} {result['kept_up']:>8.1%}"
+                f" {result['bytes_per_tick']:>11.1f}"
+            )
+
+    @staticmethod
+    def bench_engine(count, ticks):
+        matches = [new_match(seed) for seed in range(count)]
+        rng = random.Random(0)
+        started = time.perf_counter()
+        for tick in range(ticks):
+            for match in matches:
+                if tick % 10 == 0:
+                    match.set_input(PLAYER1, rng.choice((-1, 0, 1)))
+                    match.set_input(PLAYER2, rng.choice((-1, 0, 1)))
+                match.step()
+        return count * ticks / (time.perf_counter() - started)
+
+    @staticmethod
+    async def bench_server(count, seconds):
+        server = GameServer()
+        rng = random.Random(0)
+        sessions = []
+        for number in range(count):
+            match = new_match(number)
+            session = GameSession(number, number, match, 'vs Player', abandon_ticks=None)
+            session.subscribers = {FakeSocket(match, PLAYER1, rng), FakeSocket(match, PLAYER2, rng)}
+            server.sessions[number] = session
+            sessions.append(session)
+
+        started = time.perf_counter()
+        for session in sessions:
+            session.task = asyncio.ensure_future(server.run(session))
+        await asyncio.sleep(seconds)
+        elapsed = time.perf_counter() - started
+        for session in sessions:
+            server.close(session)
+        await asyncio.gather(*(session.task for session in sessions), return_exceptions=True)
+
+        ticks = sum(session.match.tick for session in sessions)
+        sent = sum(socket.bytes for session in sessions for socket in session.subscribers)
+        return {
+            'ticks_per_second': ticks / elapsed,
+            'kept_up': ticks / (count * TICK_RATE * elapsed),
+            'bytes_per_tick': sent / (2 * ticks),
+        }
@@ -0,0 +1,77 @@
+"""
+Chat history pages by (created, id) keyset against OFFSET pagination.
+
+Fills one chat group with --messages messages and times fetching a page of
+PAGE_SIZE messages --depth messages back from the newest: with
+base.history.message_page and its cursor, and with an OFFSET slice.
+
+Everything is created in a transaction that is rolled back at the end, but
+run it against a scratch database all the same:
+
+    python manage.py bench_history --messages 1000000 --depth 0 1000 100000 500000
+"""
+
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from base.history import PAGE_SIZE, encode_cursor, message_page
+from base.models import ChatGroup, GroupMessage, User
+
+
+BATCH = 5000
+
+
+class Command(BaseCommand):
+    help = 'Compare keyset and OFFSET pagination of a long chat history.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--messages', type=int, default=1000000)
+        parser.add_argument('--depth', type=int, nargs='+', default=[0, 1000, 100000, 500000])
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            group = self.fill(options['messages'])
+            self.stdout.write(f"{'depth':>8} {'keyset ms':>10} {'offset ms':>10}")
+            for depth in options['depth']:
+                if depth >= options['messages']:
+                    continue
+                keyset, offset = self.measure(group, depth, options['repeat'])
+                self.stdout.write(f'{depth:>8} {keyset * 1e3:>10.2f} {offset * 1e3:>10.2f}')
+            transaction.set_rollback(True)
+
+    def fill(self, count):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        author = User.objects.create_user(email=f'{prefix}@bench.invalid', username=prefix, password=None)
+        group = ChatGroup.objects.create(group_name=prefix)
+        for start in range(0, count, BATCH):
+            GroupMessage.objects.bulk_create([
+                GroupMessage(group=group, author=author, body=f'message {number}')
+                for number in range(start, min(start + BATCH, count))
+            ])
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+        return group
+
+    @staticmethod
+    def measure(group, depth, repeat):
+        """Mean seconds per page at `depth` messages back, keyset then OFFSET."""
+        if depth:
+            newer = group.chat_messages.all()[depth - 1]
+            cursor = encode_cursor(newer)
+        else:
+            cursor = None
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            message_page(group, cursor)
+        keyset = (time.perf_counter() - started) / repeat
+
+        started = time.perf_counter()
+        for _ in range(repeat):
+            list(group.chat_messages.select_related('author', 'room')[depth:depth + PAGE_SIZE + 1])
+        offset = (time.perf_counter() - started) / repeat
+        return keyset, offset
@@ -0,0 +1,201 @@
+"""
+Request volume of room lobbies: 1 s polling against pushed lobby events.
+
+Every lobby has a host and a guest with the room page open, over a window
+of --seconds. In that window the guest joins and gets ready, and
+every tenth guest is kicked.
+
+    polling  each open page requested player_list and check_kickout_status
+             once a second. The cost per request is measured on the real
+             views, both as full responses and as the 304 revalidations
+             @polled answers unchanged polls with.
+    push     each open page holds one LobbyConsumer socket. The sockets are
+             opened through the real routing, the events are sent with
+             send_lobby_event() as the views do, and the frames the sockets
+             receive are counted.
+
+It creates its users and rooms and deletes them afterwards, but run it
+against a scratch database all the same:
+
+    python manage.py bench_lobby --lobbies 500 --seconds 60
+"""
+
+import asyncio
+import time
+import uuid
+
+from channels.db import database_sync_to_async
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from base.lobby import send_lobby_event
+from base.models import Room, User
+from base.routing import websocket_urlpatterns
+
+
+PAGES_PER_LOBBY = 2
+POLLS_PER_PAGE = 2  # player_list and check_kickout_status
+KICK_EVERY = 10
+
+
+class Command(BaseCommand):
+    help = 'Compare lobby polling with pushed lobby events for many concurrent lobbies.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--lobbies', type=int, default=500)
+        parser.add_argument('--seconds', type=int, default=60)
+
+    def handle(self, *args, **options):
+        lobbies, seconds = options['lobbies'], options['seconds']
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        users = User.objects.bulk_create([
+            User(email=f'{prefix}-{number}@bench.invalid', username=f'{prefix}-{number}', password='!')
+            for number in range(2 * lobbies)
+        ])
+        if users[0].pk is None:
+            users = list(User.objects.filter(username__startswith=f'{prefix}-').order_by('id'))
+        hosts, guests = users[::2], users[1::2]
+        Room.objects.bulk_create([
+            Room(host=host, name=f'{prefix}-{number}', opponent_type='vs Player')
+            for number, host in enumerate(hosts)
+        ])
+        rooms = list(Room.objects.filter(name__startswith=f'{prefix}-').order_by('id'))
+        Room.participants.through.objects.bulk_create([
+            Room.participants.through(room_id=room.id, user_id=room.host_id) for room in rooms
+        ])
+
+        try:
+            full, revalidated = self.measure_poll(rooms[0], guests[0])
+            push = asyncio.run(self.measure_push(rooms, guests))
+        finally:
+            Room.objects.filter(name__startswith=f'{prefix}-').delete()
+            User.objects.filter(username__startswith=f'{prefix}-').delete()
+
+        requests = lobbies * PAGES_PER_LOBBY * POLLS_PER_PAGE * seconds
+        self.stdout.write(f'{lobbies} lobbies, {lobbies * PAGES_PER_LOBBY} open pages, {seconds} s window\n')
+        self.stdout.write(f"{'':24} {'messages':>10} {'queries':>10} {'bytes':>12} {'server s':>9}")
+        for label, cost in (('polling, full responses', full), ('polling, 304s', revalidated)):
+            self.stdout.write(
+                f'{label:24} {requests:>10} {round(requests * cost["queries"]):>10}'
+                f' {round(requests * cost["bytes"]):>12} {requests * cost["seconds"]:>9.1f}'
+            )
+        self.stdout.write(
+            f"{'push':24} {push['messages']:>10} {push['queries']:>10}"
+            f" {push['bytes']:>12} {push['seconds']:>9.1f}"
+        )
+        self.stdout.write(
+            f"push: {push['connects']} socket connects and {push['frames']} frames"
+            f" for {push['events']} lobby events"
+        )
+
+    def measure_poll(self, room, guest, samples=20):
+        """Mean queries, bytes and seconds of one poll, full and as a 304."""
+        client = Client()
+        client.force_login(guest)
+        room.participants.add(guest)
+        urls = [
+            reverse('player_list', args=[room.id]),
+            f"{reverse('check_kickout_status')}?room_id={room.id}&player_id={guest.id}",
+        ]
+        results = []
+        for revalidate in (False, True):
+            queries = size = elapsed = 0
+            for _ in range(samples):
+                for url in urls:
+                    headers = {'HTTP_HX_REQUEST': 'true'}
+                    if revalidate:
+                        headers['HTTP_IF_NONE_MATCH'] = client.get(url, **headers)['ETag']
+                    started = time.perf_counter()
+                    with CaptureQueriesContext(connection) as captured:
+                        response = client.get(url, **headers)
+                    elapsed += time.perf_counter() - started
+                    queries += len(captured)
+                    size += len(response.content)
+            polls = samples * len(urls)
+            results.append({'queries': queries / polls, 'bytes': size / polls, 'seconds': elapsed / polls})
+        room.participants.remove(guest)
+        return results
+
+    async def measure_push(self, rooms, guests):
+        app = URLRouter(websocket_urlpatterns)
+        hosts = await database_sync_to_async(lambda: {user.id: user for user in User.objects.filter(id__in=[room.host_id for room in rooms])})()
+
+        started = time.perf_counter()
+        await database_sync_to_async(self.count_queries)(True)
+        communicators = []
+        for room, guest in zip(rooms, guests):
+            for user in (hosts[room.host_id], guest):
+                communicator = WebsocketCommunicator(app, f'/ws/lobby/{room.id}')
+                communicator.scope['user'] = user
+                connected, _ = await communicator.connect()
+                assert connected
+                communicators.append(communicator)
+        connect_queries = await database_sync_to_async(self.count_queries)(False)
+
+        event_queries = events = 0
+        for number, (room, guest) in enumerate(zip(rooms, guests)):
+            for queries in await database_sync_to_async(self.play_lobby)(room, guest, number % KICK_EVERY == 0):
+                event_queries += queries
+                events += 1
+
+        received = await asyncio.gather(*(self.drain(communicator) for communicator in communicators))
+        elapsed = time.perf_counter() - started
+        for communicator in communicators:
+            await communicator.disconnect()
+
+        frames = sum(count for count, size in received)
+        return {
+            'connects': len(communicators),
+            'events': events,
+            'frames': frames,
+            'messages': len(communicators) + frames,
+            'queries': connect_queries + event_queries,
+            'bytes': sum(size for count, size in received),
+            'seconds': elapsed,
+        }
+
+    @staticmethod
+    def count_queries(start):
+        # sync ORM calls of the consumers share this thread and connection
+        if start:
+            connection.force_debug_cursor = True
+            connection.queries_log.clear()
+            return 0
+        connection.force_debug_cursor = False
+        count = len(connection.queries_log)
+        connection.queries_log.clear()
+        return count
+
+    @staticmethod
+    def play_lobby(room, guest, kick):
+        """Apply the lobby's changes and send their events; queries per event."""
+        def send(**kwargs):
+            with CaptureQueriesContext(connection) as captured:
+                send_lobby_event(room, **kwargs)
+            return len(captured)
+
+        counts = []
+        room.participants.add(guest)
+        counts.append(send())
+        room.opp_ready = True
+        Room.objects.filter(id=room.id).update(opp_ready=True)
+        counts.append(send())
+        if kick:
+            room.participants.remove(guest)
+            counts.append(send(kicked_id=guest.id))
+        return counts
+
+    @staticmethod
+    async def drain(communicator):
+        count = size = 0
+        while not await communicator.receive_nothing(timeout=0.05):
+            message = await communicator.receive_output()
+            if message['type'] == 'websocket.send':
+                count += 1
+                size += len(message.get('text') or message.get('bytes') or '')
+        return count, size
@@ -0,0 +1,131 @@
+"""
+Simulator benchmark of the matchmaking queue at --players queued players.
+
+    stream   players arrive at --rate per second, rated from N(1500, 350),
+             and the queue is swept every SWEEP_INTERVAL as the Matchmaker
+             does. Reports how many were paired, the cost of enqueue()
+             (mean and p99) and the wait until paired (median and p95).
+    scaling  the cost of enqueue() against a queue already holding N
+             players too far apart to pair, with LocalQueue's rating buckets
+             and with a linear scan over every ticket.
+    sweep    one sweep over --players waiting players.
+
+Time is simulated, only the queue's own work is timed. It runs LocalQueue
+in this process and touches no database:
+
+    python manage.py bench_matchmaking --players 10000
+"""
+
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+
+from base.matchmaking import SWEEP_INTERVAL, BaseQueue, LocalQueue, Ticket
+
+
+PROBES = 2000
+LINEAR_PROBES = 500
+
+
+def percentile(values, share):
+    values = sorted(values)
+    return values[min(int(len(values) * share), len(values) - 1)]
+
+
+class LinearQueue(BaseQueue):
+    """Every enqueue scans all waiting tickets: what the buckets avoid."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self.tickets = {}
+
+    def enqueue(self, user_id, rating, channel_name, now):
+        ticket = Ticket(user_id, rating, channel_name, now)
+        other = self.best_match(ticket, self.tickets.values(), now)
+        if other is None:
+            self.tickets[user_id] = ticket
+            return None
+        del self.tickets[other.user_id]
+        return other, ticket
+
+
+class Command(BaseCommand):
+    help = 'Simulate the matchmaking queue with many waiting players.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--players', type=int, default=10000)
+        parser.add_argument('--rate', type=float, default=100, help='arrivals per second')
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        players = options['players']
+        self.stream(players, options['rate'], rng)
+        self.stdout.write(f"{'queued':>8} {'buckets us':>11} {'linear us':>10}")
+        for size in sorted({100, 1000, players}):
+            self.stdout.write(f'{size:>8} {self.scaling(LocalQueue, size, rng, PROBES) * 1e6:>11.1f}'
+                              f' {self.scaling(LinearQueue, size, rng, LINEAR_PROBES) * 1e6:>10.1f}')
+        self.sweep(players)
+
+    def stream(self, players, rate, rng):
+        queue = LocalQueue()
+        now = next_sweep = 0.0
+        costs, waits = [], []
+        for user_id in range(players):
+            now += rng.expovariate(rate)
+            while next_sweep <= now:
+                waits += [next_sweep - first.since for first, _ in queue.sweep(next_sweep)]
+                next_sweep += SWEEP_INTERVAL
+            started = time.perf_counter()
+            pair = queue.enqueue(user_id, rng.gauss(1500, 350), f'channel-{user_id}', now)
+            costs.append(time.perf_counter() - started)
+            if pair is not None:
+                waits.append(now - pair[0].since)
+        # the last arrivals wait for their bands to widen
+        while len(queue) > 1 and queue.band(Ticket(0, 0, '', now), next_sweep) < queue.max_band:
+            waits += [next_sweep - first.since for first, _ in queue.sweep(next_sweep)]
+            next_sweep += SWEEP_INTERVAL
+        waits += [next_sweep - first.since for first, _ in queue.sweep(next_sweep)]
+
+        self.stdout.write(
+            f'stream: {players} players at {rate:g}/s, {2 * len(waits)} paired, {len(queue)} left;'
+            f' enqueue {statistics.mean(costs) * 1e6:.1f} us mean, {percentile(costs, 0.99) * 1e6:.1f} us p99;'
+            f' wait {statistics.median(waits):.1f} s median, {percentile(waits, 0.95):.1f} s p95'
+        )
+
+    @staticmethod
+    def scaling(backend, size, rng, probes):
+        """Mean seconds per enqueue() into a queue of `size` players that stays that size."""
+        queue = backend()
+        # base_band + 10 apart: nobody waiting pairs with anybody else
+        spacing = queue.base_band + 10
+        for user_id in range(size):
+            queue.enqueue(user_id, user_id * spacing, f'channel-{user_id}', 0.0)
+        elapsed = 0.0
+        for probe in range(probes):
+            user_id = size + probe
+            started = time.perf_counter()
+            pair = queue.enqueue(user_id, rng.uniform(0, size * spacing), 'probe', 0.0)
+            elapsed += time.perf_counter() - started
+            if pair is not None:
+                # put the paired player back, and take the probe out
+                waiting = next(ticket for ticket in pair if ticket.user_id != user_id)
+                queue.enqueue(waiting.user_id, waiting.rating, waiting.channel_name, 0.0)
+            elif isinstance(queue, LocalQueue):
+                queue.cancel(user_id, 'probe')
+            else:
+                del queue.tickets[user_id]
+        return elapsed / probes
+
+    def sweep(self, players):
+        queue = LocalQueue()
+        # too far apart for any band, so the sweep checks every ticket
+        spacing = 2 * queue.max_band + 1
+        for user_id in range(players):
+            queue.enqueue(user_id, user_id * spacing, f'channel-{user_id}', 0.0)
+        started = time.perf_counter()
+        queue.sweep(3600.0)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'sweep of {len(queue)} waiting players: {elapsed * 1e3:.1f} ms')
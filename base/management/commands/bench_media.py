@@ -0,0 +1,109 @@
+"""
+Render time of a chat history page of image messages, with and without the
+file metadata stored at upload.
+
+Stores --images messages, each a --width x --height JPEG or PNG of noise,
+described by base.media.describe_upload() as chat_file_upload does, and
+renders the newest history page through message_item.html, bypassing the
+fragment cache:
+
+    before   GroupMessage.is_image opens the file and verifies it with
+             Pillow on every evaluation, as it did before describe_upload()
+    after    is_image reads the stored file_type
+
+Reports the median of --repeat renders and the files opened per render.
+Files are written to a temporary MEDIA_ROOT and the messages are created in
+a transaction that is rolled back at the end, but run it against a scratch
+database all the same:
+
+    python manage.py bench_media --images 30
+"""
+
+import io
+import random
+import shutil
+import statistics
+import tempfile
+import time
+import uuid
+from unittest import mock
+
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test import override_settings
+from PIL import Image
+
+from base.history import message_page
+from base.media import describe_upload
+from base.models import ChatGroup, GroupMessage, User
+
+
+def pillow_is_image(message):
+    try:
+        image = Image.open(message.file)
+        image.verify()
+        return True
+    except (IOError, SyntaxError):
+        return False
+
+
+class Command(BaseCommand):
+    help = 'Compare chat history renders that open image files with stored metadata.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=30)
+        parser.add_argument('--width', type=int, default=1600)
+        parser.add_argument('--height', type=int, default=1200)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        media = tempfile.mkdtemp()
+        try:
+            with override_settings(MEDIA_ROOT=media), transaction.atomic():
+                group, author = self.fill(options)
+                self.stdout.write(f"{'':>7} {'median ms':>10} {'opens':>6} {'images':>6}")
+                with mock.patch.object(GroupMessage, 'is_image', property(pillow_is_image)):
+                    self.report('before', group, author, options['repeat'])
+                self.report('after', group, author, options['repeat'])
+                transaction.set_rollback(True)
+        finally:
+            shutil.rmtree(media)
+
+    @staticmethod
+    def fill(options):
+        rng = random.Random(options['seed'])
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        author = User.objects.create_user(email=f'{prefix}@bench.invalid', username=prefix, password=None, avatar=None)
+        group = ChatGroup.objects.create(group_name=prefix)
+        size = (options['width'], options['height'])
+        for number in range(options['images']):
+            image_format, extension = ('PNG', 'png') if number % 2 else ('JPEG', 'jpg')
+            buffer = io.BytesIO()
+            Image.frombytes('RGB', size, rng.randbytes(size[0] * size[1] * 3)).save(buffer, image_format)
+            upload = SimpleUploadedFile(f'{prefix}-{number}.{extension}', buffer.getvalue())
+            GroupMessage.objects.create(file=upload, author=author, group=group, **describe_upload(upload))
+        return group, author
+
+    def report(self, label, group, author, repeat):
+        def render():
+            messages, _ = message_page(group)
+            return [
+                render_to_string('chat/partials/message_item.html', {'message': message, 'user': author})
+                for message in messages
+            ]
+
+        render()
+        timings = []
+        with mock.patch.object(FileSystemStorage, 'open', autospec=True, side_effect=FileSystemStorage.open) as opened:
+            for _ in range(repeat):
+                started = time.perf_counter()
+                html = render()
+                timings.append(time.perf_counter() - started)
+        images = sum('<img' in fragment for fragment in html)
+        self.stdout.write(
+            f'{label:>7} {statistics.median(timings) * 1e3:>10.1f} {opened.call_count / repeat:>6.0f} {images:>6}'
+        )
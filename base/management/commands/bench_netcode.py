@@ -0,0 +1,49 @@
+"""
+Divergence and correction size of late Pong inputs under latency and jitter.
+
+Runs base.game.netsim for each --latency (ticks, one tick is 1/60 s) with
+up to --jitter extra ticks, and reports per condition how many inputs came
+late, the mean and largest correction apply_input() made, the largest
+distance between the late and the on-time match, and whether both ended in
+the same state:
+
+    python manage.py bench_netcode --latency 1 3 6 9 --jitter 0 3
+"""
+
+from statistics import mean
+
+from django.core.management.base import BaseCommand
+
+from base.game.engine import REWIND_TICKS
+from base.game.netsim import simulate
+
+
+class Command(BaseCommand):
+    help = 'Measure input corrections for increasing latency and jitter.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--latency', type=int, nargs='+', default=[0, 1, 3, 6, REWIND_TICKS - 3])
+        parser.add_argument('--jitter', type=int, nargs='+', default=[0, 3])
+        parser.add_argument('--ticks', type=int, default=3600)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        on_time = simulate(0, 0, ticks=options['ticks'], seed=options['seed'])
+        self.stdout.write(
+            f"{'latency':>7} {'jitter':>6} {'inputs':>6} {'late':>5} "
+            f"{'mean fix':>8} {'max fix':>8} {'max drift':>9} {'converged':>9}"
+        )
+        for latency in options['latency']:
+            for jitter in options['jitter']:
+                simulation = simulate(latency, jitter, ticks=options['ticks'], seed=options['seed'])
+                late = [correction for correction in simulation.corrections if correction.late]
+                sizes = [correction.size for correction in late] or [0.0]
+                converged = (
+                    simulation.state == on_time.state
+                    and not any(simulation.divergence[simulation.last_arrival:])
+                )
+                self.stdout.write(
+                    f'{latency:>7} {jitter:>6} {len(simulation.corrections):>6} {len(late):>5} '
+                    f'{mean(sizes):>8.3f} {max(sizes):>8.3f} {max(simulation.divergence):>9.3f} '
+                    f"{'yes' if converged else 'NO':>9}"
+                )
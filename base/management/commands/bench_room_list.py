@@ -0,0 +1,100 @@
+"""
+Requests per second of the polled room list, and the cost of reading it.
+
+Creates --rooms open rooms with --participants participants each, through
+the ORM so the OpenLobby rows are kept by the signal receivers, and logs a
+client in:
+
+    render       GET /room_list/ as htmx polls it, rendered every time
+    revalidate   the same GET with the ETag of the last answer, a 304
+    rooms        reading the list the way room_list did before OpenLobby:
+                 the open rooms, then host, participants and their count
+                 per room
+    lobbies      reading the OpenLobby rows room_list reads now
+
+The rooms and users it creates are deleted afterwards, but run it against a
+scratch database all the same:
+
+    python manage.py bench_room_list --rooms 200
+"""
+
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, reset_queries
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment
+from django.urls import reverse
+
+from base.lobby import open_lobbies
+from base.models import ChatGroup, Room, User
+
+
+class Command(BaseCommand):
+    help = 'Measure room list polls with and without ETag revalidation.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=200)
+        parser.add_argument('--participants', type=int, default=2)
+        parser.add_argument('--requests', type=int, default=200)
+
+    def handle(self, *args, **options):
+        # the test client needs the test environment's ALLOWED_HOSTS
+        setup_test_environment()
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        users = [
+            User.objects.create_user(
+                email=f'{prefix}-{number}@bench.invalid', username=f'{prefix}-{number}', password=None, avatar=None,
+            )
+            for number in range(max(options['participants'], 1))
+        ]
+        ChatGroup.objects.get_or_create(group_name='public-chat')
+        try:
+            for number in range(options['rooms']):
+                room = Room.objects.create(
+                    host=users[number % len(users)], name=f'{prefix} room {number}', description='bench',
+                    opponent_type=('AI', 'vs Player', 'Tournament')[number % 3], points=3,
+                )
+                room.participants.set(users[:options['participants']])
+            self.measure(users[0], options['requests'])
+        finally:
+            Room.objects.filter(host__in=users).delete()
+            for user in users:
+                user.delete()
+
+    def measure(self, user, requests):
+        client = Client()
+        client.force_login(user)
+        url = reverse('room_list')
+        first = client.get(url, HTTP_HX_REQUEST='true')
+        etag = first['ETag']
+
+        self.stdout.write(f"{'':>10} {'req/s':>8} {'ms':>8} {'queries':>8} {'status':>6}")
+        self.report('render', lambda: client.get(url, HTTP_HX_REQUEST='true'), requests)
+        self.report('revalidate', lambda: client.get(url, HTTP_HX_REQUEST='true', HTTP_IF_NONE_MATCH=etag), requests)
+        self.report('rooms', self.read_rooms, requests)
+        self.report('lobbies', lambda: list(open_lobbies()), requests)
+
+    @staticmethod
+    def read_rooms():
+        rooms = list(Room.objects.filter(is_expired=False))
+        for room in rooms:
+            room.host and room.host.username
+            list(room.participants.all())
+            room.participants.count()
+        return rooms
+
+    def report(self, label, call, repeat):
+        # with DEBUG on, the query log is capped and would hide the count
+        reset_queries()
+        with CaptureQueriesContext(connection) as queries:
+            result = call()
+        started = time.perf_counter()
+        for _ in range(repeat):
+            call()
+        elapsed = (time.perf_counter() - started) / repeat
+        status = getattr(result, 'status_code', '')
+        self.stdout.write(
+            f'{label:>10} {1 / elapsed:>8.0f} {elapsed * 1e3:>8.2f} {len(queries):>8} {status:>6}'
+        )
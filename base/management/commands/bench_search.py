@@ -0,0 +1,113 @@
+"""
+Room and message search through base.search against icontains scans.
+
+Fills the database with --rooms rooms and one chat group of --messages
+messages, written in words drawn from a Zipf-like vocabulary, then times
+search_rooms() and search_messages() against the LIKE '%q%' filters they
+replaced, for a rare word, a four-letter prefix and a common word.
+
+bulk_create bypasses the receivers that keep the SQLite FTS5 tables current,
+so the new rows are indexed the way the migration backfills them.
+Everything is created in a transaction that is rolled back at the end, but
+run it against a scratch database all the same:
+
+    python manage.py bench_search --rooms 100000 --messages 5000000
+"""
+
+import itertools
+import random
+import string
+import time
+import uuid
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Q
+
+from base.models import ChatGroup, GroupMessage, Room, User
+from base.search import SEARCH_LIMIT, search_messages, search_rooms
+
+
+BATCH = 5000
+VOCABULARY = 50000
+
+
+class Command(BaseCommand):
+    help = 'Compare full-text search with icontains scans over many rooms and messages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rooms', type=int, default=100000)
+        parser.add_argument('--messages', type=int, default=5000000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=1)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+        words = sorted({
+            ''.join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 9)))
+            for _ in range(VOCABULARY)
+        })
+        rng.shuffle(words)
+        weights = list(itertools.accumulate(1 / rank for rank in range(1, len(words) + 1)))
+
+        def text(count):
+            return ' '.join(rng.choices(words, cum_weights=weights, k=count))
+
+        with transaction.atomic():
+            started = time.perf_counter()
+            group = self.fill(options['rooms'], options['messages'], text)
+            self.stdout.write(f'filled in {time.perf_counter() - started:.0f} s')
+            repeat = options['repeat']
+
+            self.stdout.write(f"{'':>8} {'query':>20} {'search ms':>10} {'like ms':>10}")
+            for q in (words[3000], words[300][:4], f'{words[20000]} {words[100][:3]}'):
+                search = self.measure(lambda: search_rooms(q), repeat)
+                like = self.measure(lambda: list(
+                    Room.objects.filter(Q(name__icontains=q) | Q(description__icontains=q))[:SEARCH_LIMIT]
+                ), repeat)
+                self.stdout.write(f"{'rooms':>8} {q:>20} {search * 1e3:>10.1f} {like * 1e3:>10.1f}")
+            for q in (words[3000], words[300][:4], words[20]):
+                search = self.measure(lambda: search_messages(q, group), repeat)
+                like = self.measure(lambda: list(
+                    GroupMessage.objects.filter(group=group, body__icontains=q).order_by()[:SEARCH_LIMIT]
+                ), repeat)
+                self.stdout.write(f"{'messages':>8} {q:>20} {search * 1e3:>10.1f} {like * 1e3:>10.1f}")
+            transaction.set_rollback(True)
+
+    @staticmethod
+    def fill(rooms, messages, text):
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        host = User.objects.create_user(email=f'{prefix}@bench.invalid', username=prefix, password=None)
+        group = ChatGroup.objects.create(group_name=prefix)
+        for start in range(0, rooms, BATCH):
+            Room.objects.bulk_create([
+                Room(host=host, name=text(2), description=text(8))
+                for _ in range(start, min(start + BATCH, rooms))
+            ])
+        for start in range(0, messages, BATCH):
+            GroupMessage.objects.bulk_create([
+                GroupMessage(group=group, author=host, body=text(6))
+                for _ in range(start, min(start + BATCH, messages))
+            ])
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    "INSERT INTO base_room_fts (rowid, name, description) "
+                    "SELECT id, name, coalesce(description, '') FROM base_room WHERE host_id = %s",
+                    [host.id],
+                )
+                cursor.execute(
+                    "INSERT INTO base_groupmessage_fts (rowid, body, group_id) "
+                    "SELECT id, coalesce(body, ''), group_id FROM base_groupmessage WHERE group_id = %s",
+                    [group.id],
+                )
+            cursor.execute('ANALYZE')
+        return group
+
+    @staticmethod
+    def measure(query, repeat):
+        """Mean seconds per call of `query`."""
+        started = time.perf_counter()
+        for _ in range(repeat):
+            query()
+        return (time.perf_counter() - started) / repeat
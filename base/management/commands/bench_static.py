@@ -0,0 +1,134 @@
+"""
+Static and media requests through AssetsMiddleware against Django's own
+static serving.
+
+Collects the static files with STATICFILES_STORAGE into a temporary
+STATIC_ROOT and writes a --media MB file into a temporary MEDIA_ROOT, then
+calls both ASGI apps in process, --requests times per file, with
+Accept-Encoding: gzip, deflate, br:
+
+    before   ASGIStaticFilesHandler with DEBUG on, what runserver under
+             Daphne serves today: static files found through the finders,
+             media through django.views.static.serve
+    after    AssetsMiddleware serving the hashed, precompressed copies and
+             MEDIA_ROOT
+
+Reports status, bytes sent, mean time and Cache-Control per file, then
+checks revalidation and byte ranges against the middleware. It touches no
+database:
+
+    python manage.py bench_static --requests 2000
+"""
+
+import asyncio
+import os
+import shutil
+import tempfile
+import time
+
+from django.conf import settings
+from django.contrib.staticfiles.handlers import ASGIStaticFilesHandler
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.asgi import get_asgi_application
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.urls import re_path
+from django.views.static import serve
+
+from base.assets import AssetsMiddleware
+
+
+MB = 1024 * 1024
+ACCEPT = [('accept-encoding', 'gzip, deflate, br')]
+STATIC_FILES = ('styles/style.css', 'js/script.js', 'images/logo.svg')
+
+
+def serve_media(request, path):
+    return serve(request, path, document_root=settings.MEDIA_ROOT)
+
+
+# the project's URLconf binds MEDIA_ROOT when it is imported
+urlpatterns = [re_path(r'^images/(?P<path>.*)$', serve_media)]
+
+
+def scope(path, headers=()):
+    return {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'root_path': '', 'query_string': b'',
+        'headers': [(key.encode(), value.encode()) for key, value in [('host', 'localhost'), *headers]],
+        'server': ('localhost', 80), 'client': ('127.0.0.1', 1),
+    }
+
+
+async def call(app, path, headers=()):
+    """Status, headers and body of a GET of path."""
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    await app(scope(path, headers), receive, send)
+    response_headers = {key.decode(): value.decode() for key, value in messages[0]['headers']}
+    return messages[0]['status'], response_headers, b''.join(message.get('body', b'') for message in messages[1:])
+
+
+async def measure(app, path, headers, repeat):
+    """Status, headers and body of path, and the mean seconds per request."""
+    await call(app, path, headers)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        status, response_headers, body = await call(app, path, headers)
+    return status, response_headers, body, (time.perf_counter() - started) / repeat
+
+
+class Command(BaseCommand):
+    help = 'Compare AssetsMiddleware with Django static serving.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--media', type=float, default=0.4, help='media file size in MB')
+
+    def handle(self, *args, **options):
+        static_root, media_root = tempfile.mkdtemp(), tempfile.mkdtemp()
+        try:
+            media_name = 'bench.jpg'
+            with open(os.path.join(media_root, media_name), 'wb') as file:
+                file.write(os.urandom(int(options['media'] * MB)))
+            with override_settings(STATIC_ROOT=static_root, MEDIA_ROOT=media_root, ROOT_URLCONF=__name__):
+                call_command('collectstatic', interactive=False, verbosity=0)
+                asyncio.run(self.compare(media_name, options['requests']))
+        finally:
+            shutil.rmtree(static_root)
+            shutil.rmtree(media_root)
+
+    async def compare(self, media_name, repeat):
+        django_app = get_asgi_application()
+        before, after = ASGIStaticFilesHandler(django_app), AssetsMiddleware(django_app)
+        self.stdout.write(f"{'':>26} {'':>6} {'status':>6} {'bytes':>7} {'ms':>6}  cache")
+        for name in STATIC_FILES:
+            with override_settings(DEBUG=True):
+                await self.report(name, 'before', before, f'/static/{name}', repeat)
+            await self.report('', 'after', after, f'/static/{staticfiles_storage.stored_name(name)}', repeat)
+        with override_settings(DEBUG=True):
+            await self.report(media_name, 'before', before, f'/images/{media_name}', repeat // 10)
+        await self.report('', 'after', after, f'/images/{media_name}', repeat // 10)
+
+        url = f'/static/{staticfiles_storage.stored_name(STATIC_FILES[0])}'
+        _, headers, _ = await call(after, url, ACCEPT)
+        status, _, _ = await call(after, url, ACCEPT + [('if-none-match', headers['etag'])])
+        self.stdout.write(f'If-None-Match on {STATIC_FILES[0]}: {status}')
+        for byte_range in ('bytes=100-199', 'bytes=-10', 'bytes=999999999-'):
+            status, headers, body = await call(after, f'/images/{media_name}', [('range', byte_range)])
+            self.stdout.write(f"{byte_range}: {status} {headers.get('content-range')}, {len(body)} bytes")
+
+    async def report(self, name, label, app, path, repeat):
+        status, headers, body, elapsed = await measure(app, path, ACCEPT, max(repeat, 1))
+        cache = headers.get('cache-control', '-')
+        encoding = headers.get('content-encoding')
+        if encoding:
+            cache += f', {encoding}'
+        self.stdout.write(f'{name:>26} {label:>6} {status:>6} {len(body):>7} {elapsed * 1e3:>6.2f}  {cache}')
@@ -0,0 +1,213 @@
+"""
+Disk usage and memory high-water marks of chat file uploads.
+
+Uploads go through Django's WSGI handler, middleware and the real
+chat_file_upload view. Each multipart body is generated as it is read, so
+the only copy of a file in memory is whatever the server keeps:
+
+    identical  --uploads threads post the same --size MB file at once, each
+               to its own chat group: stored files, references, bytes on
+               disk and what the copies would have taken.
+    distinct   --distinct threads post different --size MB files at once.
+    oversize   one upload of --oversize MB, twice CHAT_UPLOAD_MAX_SIZE by
+               default, answered with a 413.
+
+Memory is tracemalloc's peak of Python allocations during each scenario,
+and the process's peak RSS at the end. Files are written to a temporary
+MEDIA_ROOT; the users, groups and messages it creates are deleted
+afterwards, but run it against a scratch database all the same:
+
+    python manage.py bench_uploads --uploads 50 --size 2
+"""
+
+import hashlib
+import io
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.middleware.csrf import _get_new_csrf_token
+from django.test import Client, override_settings
+from django.test.client import BOUNDARY
+from django.urls import reverse
+
+from base.models import ChatGroup, GroupMessage, StoredFile, User
+from base.uploads import max_upload_size
+
+
+MB = 1024 * 1024
+BLOCK = 64 * 1024
+
+
+class StreamedUpload(io.RawIOBase):
+    """A multipart body holding one file of `size` bytes, made up as it is read."""
+
+    def __init__(self, size, seed=0, name='upload.bin'):
+        self.head = (
+            f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="file"; filename="{name}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode()
+        self.tail = f'\r\n--{BOUNDARY}--\r\n'.encode()
+        self.block = hashlib.sha256(str(seed).encode()).digest() * (BLOCK // 32)
+        self.size = size
+        self.length = len(self.head) + size + len(self.tail)
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        body, end = len(self.head), len(self.head) + self.size
+        written = 0
+        while written < len(buffer) and self.position < self.length:
+            limit = len(buffer) - written
+            if self.position < body:
+                piece = self.head[self.position:self.position + limit]
+            elif self.position < end:
+                offset = (self.position - body) % BLOCK
+                piece = self.block[offset:offset + min(limit, end - self.position)]
+            else:
+                piece = self.tail[self.position - end:self.position - end + limit]
+            buffer[written:written + len(piece)] = piece
+            written += len(piece)
+            self.position += len(piece)
+        return written
+
+
+def session_cookie(user):
+    client = Client()
+    client.force_login(user)
+    return client.cookies[settings.SESSION_COOKIE_NAME].value
+
+
+def post_upload(session, group_name, upload):
+    """Post `upload` through the WSGI handler in `session`; the response status code."""
+    token = _get_new_csrf_token()
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'SCRIPT_NAME': '',
+        'PATH_INFO': reverse('chat-file-upload', args=[group_name]),
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'SERVER_PROTOCOL': 'HTTP/1.1',
+        'CONTENT_TYPE': f'multipart/form-data; boundary={BOUNDARY}',
+        'CONTENT_LENGTH': str(upload.length),
+        'HTTP_COOKIE': f'{settings.SESSION_COOKIE_NAME}={session}; {settings.CSRF_COOKIE_NAME}={token}',
+        'HTTP_X_CSRFTOKEN': token,
+        'HTTP_HX_REQUEST': 'true',
+        'wsgi.input': upload,
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http',
+    }
+    statuses = []
+    response = WSGIHandler()(environ, lambda status, headers: statuses.append(status))
+    b''.join(response)
+    response.close()
+    return int(statuses[0].split()[0])
+
+
+def post_concurrently(uploads):
+    """Post (session, group_name, upload) triples from one thread each; the status codes."""
+    statuses = [None] * len(uploads)
+    barrier = threading.Barrier(len(uploads))
+
+    def post(index, session, group_name, upload):
+        barrier.wait()
+        try:
+            statuses[index] = post_upload(session, group_name, upload)
+        finally:
+            connections.close_all()
+
+    threads = [threading.Thread(target=post, args=(index, *upload)) for index, upload in enumerate(uploads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return statuses
+
+
+def disk_usage(root):
+    return sum(
+        os.path.getsize(os.path.join(directory, name))
+        for directory, _, names in os.walk(root) for name in names
+    )
+
+
+def peak_rss():
+    # kilobytes on Linux, bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class Command(BaseCommand):
+    help = 'Measure disk usage and memory of concurrent identical, distinct and oversize uploads.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--uploads', type=int, default=50)
+        parser.add_argument('--distinct', type=int, default=8)
+        parser.add_argument('--size', type=float, default=2)
+        parser.add_argument('--oversize', type=float, default=None)
+
+    def handle(self, *args, **options):
+        size = int(options['size'] * MB)
+        oversize = int((options['oversize'] or 2 * max_upload_size() / MB) * MB)
+        prefix = f'bench-{uuid.uuid4().hex[:8]}'
+        media = tempfile.mkdtemp()
+        user = User.objects.create_user(email=f'{prefix}@bench.invalid', username=prefix, password=None, avatar=None)
+        session = session_cookie(user)
+        groups = [
+            ChatGroup.objects.create(group_name=f'{prefix}-{number}')
+            for number in range(options['uploads'] + options['distinct'] + 1)
+        ]
+        identical, distinct, oversized = (
+            groups[:options['uploads']], groups[options['uploads']:-1], groups[-1]
+        )
+        try:
+            with override_settings(MEDIA_ROOT=media):
+                self.report('identical', size, media, [
+                    (session, group.group_name, StreamedUpload(size)) for group in identical
+                ])
+                self.report('distinct', size, media, [
+                    (session, group.group_name, StreamedUpload(size, seed=number + 1))
+                    for number, group in enumerate(distinct)
+                ])
+                self.report('oversize', oversize, media, [(session, oversized.group_name, StreamedUpload(oversize))])
+        finally:
+            names = list(GroupMessage.objects.filter(group__in=groups).values_list('file', flat=True))
+            GroupMessage.objects.filter(group__in=groups).delete()
+            StoredFile.objects.filter(name__in=names).delete()
+            ChatGroup.objects.filter(group_name__startswith=f'{prefix}-').delete()
+            user.delete()
+            shutil.rmtree(media)
+        self.stdout.write(f'peak RSS of the process {peak_rss() / MB:.1f} MB')
+
+    def report(self, label, size, media, uploads):
+        before = disk_usage(media)
+        tracemalloc.start()
+        started = time.perf_counter()
+        statuses = post_concurrently(uploads)
+        elapsed = time.perf_counter() - started
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        stored = disk_usage(media) - before
+        counts = {status: statuses.count(status) for status in sorted(set(statuses))}
+        self.stdout.write(
+            f'{label}: {len(uploads)} x {size / MB:.1f} MB in {elapsed:.2f} s, responses {counts}, '
+            f'{stored / MB:.1f} MB on disk ({statuses.count(200) * size / MB:.1f} MB as copies), '
+            f'Python peak {peak / MB:.1f} MB'
+        )
+        messages = GroupMessage.objects.filter(group__group_name__in=[group_name for _, group_name, _ in uploads])
+        for stored_file in StoredFile.objects.filter(name__in=messages.values('file'), references__gt=1):
+            self.stdout.write(f'  {stored_file.name}: {stored_file.references} references')
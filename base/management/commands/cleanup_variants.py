@@ -0,0 +1,81 @@
+"""
+Delete the image variants no stored original uses any more.
+
+Variants are shared by every original with the same content, so they are
+not removed with an avatar or chat file (see base.thumbnails). This command
+collects the digest of every avatar and chat file still referenced, and
+deletes the variant files of any other digest. Files younger than --min-age
+seconds are kept, as their original may still be on its way in:
+
+    python manage.py cleanup_variants --dry-run
+    python manage.py cleanup_variants --min-age 3600
+"""
+
+import hashlib
+from datetime import timedelta
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from base.models import GroupMessage, User
+from base.thumbnails import get_variants, variant_digest
+
+
+BATCH = 500
+
+
+class Command(BaseCommand):
+    help = 'Delete the image variants of originals that are gone.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--min-age', type=int, default=3600)
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        storage = default_storage
+        live = self.live_digests(storage)
+        cutoff = timezone.now() - timedelta(seconds=options['min_age'])
+
+        deleted = kept = size = 0
+        for path in self.variant_files(storage):
+            if variant_digest(path) in live or storage.get_modified_time(path) > cutoff:
+                kept += 1
+                continue
+            size += storage.size(path)
+            if not options['dry_run']:
+                storage.delete(path)
+            deleted += 1
+        verb = 'Would delete' if options['dry_run'] else 'Deleted'
+        self.stdout.write(f'{verb} {deleted} variant files ({size} bytes), kept {kept}.')
+
+    @staticmethod
+    def variant_files(storage):
+        if not storage.exists('variants'):
+            return
+        directories, _ = storage.listdir('variants')
+        for directory in directories:
+            for name in storage.listdir(f'variants/{directory}')[1]:
+                yield f'variants/{directory}/{name}'
+
+    @staticmethod
+    def live_digests(storage):
+        """The digests of every stored avatar and chat file."""
+        names = set(User.objects.exclude(avatar='').values_list('avatar', flat=True).iterator())
+        names.update(GroupMessage.objects.exclude(file='').values_list('file', flat=True).iterator())
+        names.discard(None)
+        names = sorted(names)
+
+        digests = set()
+        for start in range(0, len(names), BATCH):
+            for name, record in get_variants(*names[start:start + BATCH]).items():
+                if record is not None:
+                    digests.add(record['digest'])
+                    continue
+                # not recorded, or the cache was emptied: hash the original
+                try:
+                    with storage.open(name, 'rb') as file:
+                        digests.add(hashlib.sha256(file.read()).hexdigest())
+                except OSError:
+                    pass
+        return digests
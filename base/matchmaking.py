@@ -0,0 +1,318 @@
+"""
+Matchmaking for vs Player games.
+
+Players looking for an opponent hold a socket on MatchmakingConsumer, which
+puts a ticket in the queue: user id, rating, channel name and the time they
+started waiting. A ticket accepts opponents within its band of rating,
+base_band at first, widened by band_growth per second of waiting up to
+max_band. Two players are paired when each is inside the other's band, the
+closest pair first.
+
+The queue keeps tickets in base_band-wide buckets of rating. Any two tickets
+in the same bucket would have been paired on enqueue, so a bucket holds at
+most one ticket and enqueue() looks at 2 * max_band / base_band + 1 buckets
+at most, however many players are waiting. Bands widen while nobody
+enqueues, so the Matchmaker also sweeps the queue every SWEEP_INTERVAL.
+
+A pair gets a vs Player room, hosted by whoever waited longer, and its chat
+group in one transaction. Both sockets are then sent to the room.
+
+The backend is configured with the MATCHMAKING setting:
+
+    MATCHMAKING = {
+        'BACKEND': 'base.matchmaking.LocalQueue',
+        'OPTIONS': {'base_band': 50, 'band_growth': 5, 'max_band': 400},
+    }
+
+LocalQueue only pairs players whose socket reached the same worker;
+RedisQueue shares one queue between all workers.
+"""
+
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from asgiref.sync import sync_to_async
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.utils.module_loading import import_string
+
+from .lobby import create_room_chat
+from .models import Room, User
+
+
+# Seconds between two sweeps, which pair players whose bands have grown.
+SWEEP_INTERVAL = 2
+MATCH_POINTS = 5
+
+logger = logging.getLogger(__name__)
+
+Ticket = namedtuple('Ticket', 'user_id rating channel_name since')
+
+
+class BaseQueue:
+    def __init__(self, base_band=50, band_growth=5, max_band=400):
+        self.base_band = base_band
+        self.band_growth = band_growth
+        self.max_band = max_band
+
+    def band(self, ticket, now):
+        return min(self.base_band + self.band_growth * max(now - ticket.since, 0), self.max_band)
+
+    def best_match(self, ticket, candidates, now):
+        """The closest candidate the ticket and the candidate both accept."""
+        band = self.band(ticket, now)
+        best, best_gap = None, None
+        for other in candidates:
+            gap = abs(other.rating - ticket.rating)
+            if other.user_id == ticket.user_id or gap > band or gap > self.band(other, now):
+                continue
+            # on a tie the longer wait goes first
+            if best is None or (gap, other.since) < (best_gap, best.since):
+                best, best_gap = other, gap
+        return best
+
+
+class LocalQueue(BaseQueue):
+    """In-process queue. Only pairs sockets of the current worker."""
+
+    def __init__(self, **options):
+        super().__init__(**options)
+        self._tickets = {}
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._tickets)
+
+    def _bucket(self, rating):
+        return int(rating // self.base_band)
+
+    def _add(self, ticket):
+        self._tickets[ticket.user_id] = ticket
+        self._buckets.setdefault(self._bucket(ticket.rating), {})[ticket.user_id] = ticket
+
+    def _remove(self, ticket):
+        del self._tickets[ticket.user_id]
+        bucket = self._buckets[self._bucket(ticket.rating)]
+        del bucket[ticket.user_id]
+        if not bucket:
+            del self._buckets[self._bucket(ticket.rating)]
+
+    def _find(self, ticket, now):
+        home = self._bucket(ticket.rating)
+        reach = int(self.band(ticket, now) // self.base_band) + 1
+        candidates = (
+            other
+            for index in range(home - reach, home + reach + 1)
+            for other in self._buckets.get(index, {}).values()
+        )
+        return self.best_match(ticket, candidates, now)
+
+    def enqueue(self, user_id, rating, channel_name, now=None):
+        """
+        Queue the player, or pair them straight away. Returns the pair, the
+        longer waiting ticket first, or None.
+        """
+        now = time.monotonic() if now is None else now
+        ticket = Ticket(user_id, rating, channel_name, now)
+        with self._lock:
+            if user_id in self._tickets:
+                # another tab takes the place in the queue over
+                ticket = ticket._replace(since=self._tickets[user_id].since)
+                self._remove(self._tickets[user_id])
+            other = self._find(ticket, now)
+            if other is None:
+                self._add(ticket)
+                return None
+            self._remove(other)
+        return (other, ticket) if other.since <= ticket.since else (ticket, other)
+
+    def cancel(self, user_id, channel_name):
+        with self._lock:
+            ticket = self._tickets.get(user_id)
+            if ticket is not None and ticket.channel_name == channel_name:
+                self._remove(ticket)
+
+    def sweep(self, now=None):
+        """Pair the waiting players whose bands now overlap, longest waiting first."""
+        now = time.monotonic() if now is None else now
+        pairs = []
+        with self._lock:
+            for ticket in list(self._tickets.values()):
+                if ticket.user_id not in self._tickets:
+                    continue
+                other = self._find(ticket, now)
+                if other is None:
+                    continue
+                self._remove(ticket)
+                self._remove(other)
+                pairs.append((ticket, other))
+        return pairs
+
+
+class RedisQueue(BaseQueue):
+    """
+    Queue shared by all workers: a sorted set of user ids by rating and a
+    hash of their tickets. A ticket is claimed by whoever removes it from the
+    sorted set, so two workers never pair the same player.
+    """
+
+    def __init__(self, url='redis://127.0.0.1:6379/0', prefix='matchmaking', **options):
+        import redis
+
+        super().__init__(**options)
+        self.client = redis.Redis.from_url(url)
+        self.ratings_key = f'{prefix}:ratings'
+        self.tickets_key = f'{prefix}:tickets'
+
+    def __len__(self):
+        return self.client.zcard(self.ratings_key)
+
+    @staticmethod
+    def _load(user_id, raw):
+        rating, channel_name, since = json.loads(raw)
+        return Ticket(int(user_id), rating, channel_name, since)
+
+    def _candidates(self, ticket, now):
+        band = self.band(ticket, now)
+        user_ids = self.client.zrangebyscore(self.ratings_key, ticket.rating - band, ticket.rating + band)
+        if not user_ids:
+            return []
+        raws = self.client.hmget(self.tickets_key, user_ids)
+        return [self._load(user_id, raw) for user_id, raw in zip(user_ids, raws) if raw is not None]
+
+    def _claim(self, ticket):
+        if not self.client.zrem(self.ratings_key, ticket.user_id):
+            return False
+        self.client.hdel(self.tickets_key, ticket.user_id)
+        return True
+
+    def _add(self, ticket):
+        pipe = self.client.pipeline()
+        pipe.hset(self.tickets_key, ticket.user_id, json.dumps([ticket.rating, ticket.channel_name, ticket.since]))
+        pipe.zadd(self.ratings_key, {ticket.user_id: ticket.rating})
+        pipe.execute()
+
+    def _pair(self, ticket, now):
+        while True:
+            other = self.best_match(ticket, self._candidates(ticket, now), now)
+            if other is None or self._claim(other):
+                return other
+
+    def enqueue(self, user_id, rating, channel_name, now=None):
+        now = time.time() if now is None else now
+        ticket = Ticket(user_id, rating, channel_name, now)
+        raw = self.client.hget(self.tickets_key, user_id)
+        if raw is not None:
+            queued = self._load(user_id, raw)
+            if self._claim(queued):
+                # another tab takes the place in the queue over
+                ticket = ticket._replace(since=queued.since)
+        other = self._pair(ticket, now)
+        if other is None:
+            self._add(ticket)
+            return None
+        return (other, ticket) if other.since <= ticket.since else (ticket, other)
+
+    def cancel(self, user_id, channel_name):
+        raw = self.client.hget(self.tickets_key, user_id)
+        if raw is not None and self._load(user_id, raw).channel_name == channel_name:
+            self._claim(self._load(user_id, raw))
+
+    def sweep(self, now=None):
+        now = time.time() if now is None else now
+        tickets = [self._load(user_id, raw) for user_id, raw in self.client.hgetall(self.tickets_key).items()]
+        pairs = []
+        for ticket in sorted(tickets, key=lambda ticket: ticket.since):
+            if self.best_match(ticket, self._candidates(ticket, now), now) is None:
+                continue
+            if not self._claim(ticket):
+                # paired meanwhile
+                continue
+            other = self._pair(ticket, now)
+            if other is None:
+                self._add(ticket)
+                continue
+            pairs.append((ticket, other))
+        return pairs
+
+
+_queue = None
+
+
+def get_queue():
+    global _queue
+    if _queue is None:
+        config = getattr(settings, 'MATCHMAKING', {})
+        backend = import_string(config.get('BACKEND', 'base.matchmaking.LocalQueue'))
+        _queue = backend(**config.get('OPTIONS', {}))
+    return _queue
+
+
+def create_match_room(host_id, opponent_id):
+    """The vs Player room of a pair, with both players in it and in its chat."""
+    users = User.objects.in_bulk([host_id, opponent_id])
+    host, opponent = users[host_id], users[opponent_id]
+    with transaction.atomic():
+        room = Room.objects.create(
+            host=host,
+            name=f'{host.username} vs {opponent.username}',
+            opponent_type='vs Player',
+            is_2player=True,
+            points=MATCH_POINTS,
+        )
+        room.participants.set([host, opponent])
+        create_room_chat(room, [host, opponent])
+    return room
+
+
+class Matchmaker:
+    """Pairs the queue's players and sends them to their rooms."""
+
+    def __init__(self):
+        self.sweeper = None
+
+    async def join(self, user_id, rating, channel_name):
+        pair = await sync_to_async(get_queue().enqueue)(user_id, rating, channel_name)
+        if pair is not None:
+            await self.start(pair)
+        if self.sweeper is None:
+            self.sweeper = asyncio.ensure_future(self.sweep())
+
+    async def leave(self, user_id, channel_name):
+        await sync_to_async(get_queue().cancel)(user_id, channel_name)
+
+    async def sweep(self):
+        queue = get_queue()
+        try:
+            while await sync_to_async(len)(queue):
+                await asyncio.sleep(SWEEP_INTERVAL)
+                for pair in await sync_to_async(queue.sweep)():
+                    await self.start(pair)
+        finally:
+            self.sweeper = None
+
+    async def start(self, pair):
+        host, opponent = pair
+        try:
+            room = await database_sync_to_async(create_match_room)(host.user_id, opponent.user_id)
+        except Exception:
+            logger.exception('Could not open a room for users %s and %s', host.user_id, opponent.user_id)
+            return
+        html = await sync_to_async(render_to_string)('room/partials/match_found.html', {'room': room})
+        channel_layer = get_channel_layer()
+        for ticket in pair:
+            await channel_layer.send(ticket.channel_name, {
+                'type': 'match_found',
+                'html': html,
+            })
+
+
+matchmaker = Matchmaker()
@@ -0,0 +1,69 @@
+"""
+Metadata of uploaded chat files.
+
+describe_upload() reads an upload once, as it comes in, and returns what
+templates need to know about it: the MIME type sniffed from its content,
+its size and, for images, its pixel dimensions. The values are stored on
+the GroupMessage, so rendering a message never opens its file.
+
+A file is an image when Pillow can identify and verify it. Other files are
+recognised by a few leading bytes, then by their name.
+"""
+
+import mimetypes
+
+from PIL import Image
+
+
+DEFAULT_TYPE = 'application/octet-stream'
+
+# (offset, magic bytes, MIME type) of common non-image attachments
+SIGNATURES = (
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'\x1aE\xdf\xa3', 'video/webm'),
+    (4, b'ftyp', 'video/mp4'),
+    (8, b'WAVE', 'audio/wav'),
+)
+
+SNIFF_BYTES = 16
+
+
+def sniff_type(head, name):
+    for offset, magic, mime_type in SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return mime_type
+    return mimetypes.guess_type(name)[0] or DEFAULT_TYPE
+
+
+def describe_upload(file):
+    """
+    The file_type, file_size, file_width and file_height of an uploaded or
+    stored file, as keyword arguments for GroupMessage.
+    """
+    metadata = {
+        'file_type': DEFAULT_TYPE,
+        'file_size': file.size,
+        'file_width': None,
+        'file_height': None,
+    }
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+            image.verify()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        file.seek(0)
+        metadata['file_type'] = sniff_type(file.read(SNIFF_BYTES), file.name)
+    else:
+        metadata.update(
+            file_type=Image.MIME.get(image_format, f'image/{image_format.lower()}'),
+            file_width=width,
+            file_height=height,
+        )
+    finally:
+        file.seek(0)
+    return metadata
@@ -0,0 +1,17 @@
+# Generated by Django 3.2.25 on 2026-10-18 14:58
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0037_user_blocked_groups'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='chatgroup',
+            name='users_online',
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0038_remove_chatgroup_users_online'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='groupmessage',
+            options={'ordering': ['-created', '-id']},
+        ),
+        migrations.AddIndex(
+            model_name='groupmessage',
+            index=models.Index(fields=['group', 'created', 'id'], name='groupmessage_history_idx'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.db import migrations
+
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE base_room_fts USING fts5(name, description, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO base_room_fts (rowid, name, description) SELECT id, name, coalesce(description, '') FROM base_room",
+    "CREATE VIRTUAL TABLE base_groupmessage_fts USING fts5(body, group_id UNINDEXED, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO base_groupmessage_fts (rowid, body, group_id) SELECT id, coalesce(body, ''), group_id FROM base_groupmessage",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TABLE base_room_fts",
+    "DROP TABLE base_groupmessage_fts",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE INDEX base_room_search_idx ON base_room USING GIN (to_tsvector('simple', name || ' ' || coalesce(description, '')))",
+    "CREATE INDEX base_groupmessage_search_idx ON base_groupmessage USING GIN (to_tsvector('simple', coalesce(body, '')))",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX base_room_search_idx",
+    "DROP INDEX base_groupmessage_search_idx",
+]
+
+
+def run(statements):
+    # see base.search, other databases fall back to unindexed icontains
+    def operation(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return operation
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0039_groupmessage_history_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
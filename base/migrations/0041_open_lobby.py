@@ -0,0 +1,58 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_open_lobbies(apps, schema_editor):
+    Room = apps.get_model('base', 'Room')
+    OpenLobby = apps.get_model('base', 'OpenLobby')
+    for room in Room.objects.filter(is_expired=False).select_related('host'):
+        host = room.host
+        OpenLobby.objects.create(
+            room=room,
+            name=room.name,
+            description=room.description,
+            points=room.points,
+            opponent_type=room.opponent_type,
+            host=host,
+            host_username=(host.username or '') if host else '',
+            host_avatar_url=host.avatar.url if host and host.avatar else '',
+            participant_count=room.participants.count(),
+            is_ready=room.host_ready and room.opp_ready,
+            created=room.created,
+            updated=room.updated,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0040_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OpenLobby',
+            fields=[
+                ('room', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='open_lobby', serialize=False, to='base.room')),
+                ('name', models.CharField(max_length=200)),
+                ('description', models.TextField(blank=True, null=True)),
+                ('points', models.IntegerField(default=1)),
+                ('opponent_type', models.CharField(max_length=10)),
+                ('host_username', models.CharField(blank=True, max_length=200)),
+                ('host_avatar_url', models.CharField(blank=True, max_length=255)),
+                ('participant_count', models.IntegerField(default=0)),
+                ('is_ready', models.BooleanField(default=False)),
+                ('created', models.DateTimeField()),
+                ('updated', models.DateTimeField()),
+                ('changed', models.DateTimeField(auto_now=True, db_index=True)),
+                ('host', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-updated', '-created'],
+            },
+        ),
+        migrations.RunPython(fill_open_lobbies, migrations.RunPython.noop),
+    ]
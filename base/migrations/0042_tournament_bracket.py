@@ -0,0 +1,68 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:44
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0041_open_lobby'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='match',
+            options={'ordering': ['bracket', 'round_number', 'slot']},
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='bracket',
+            field=models.CharField(choices=[('W', 'Winners'), ('L', 'Losers'), ('F', 'Grand final'), ('S', 'Swiss')], default='W', max_length=1),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='is_bye',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='room',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='matches', to='base.room'),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='round_number',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name='match',
+            name='slot',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='bracket_size',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='room',
+            name='tournament_format',
+            field=models.CharField(choices=[('single', 'Single elimination'), ('double', 'Double elimination'), ('swiss', 'Swiss')], default='single', max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='match',
+            name='player1',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='matches_as_player1', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='match',
+            name='player2',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='matches_as_player2', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddConstraint(
+            model_name='match',
+            constraint=models.UniqueConstraint(fields=('room', 'bracket', 'round_number', 'slot'), name='match_bracket_position'),
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 3.2.25 on 2026-10-18 15:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_player_stats(apps, schema_editor):
+    # Replays past results with the rules of base.leaderboard at the time:
+    # Elo from 1500 with K = 32, AI at 1500, bands of 10 points.
+    Room = apps.get_model('base', 'Room')
+    Match = apps.get_model('base', 'Match')
+    PlayerStats = apps.get_model('base', 'PlayerStats')
+    RatingBucket = apps.get_model('base', 'RatingBucket')
+    stats = {}
+
+    def record(winner_id, loser_id, winner_points=0, loser_points=0):
+        for user_id in (winner_id, loser_id):
+            if user_id is not None and user_id not in stats:
+                stats[user_id] = PlayerStats(user_id=user_id)
+        winner, loser = stats.get(winner_id), stats.get(loser_id)
+        winner_rating = winner.rating if winner else 1500
+        loser_rating = loser.rating if loser else 1500
+        change = 32 * (1 - 1 / (1 + 10 ** ((loser_rating - winner_rating) / 400)))
+        if winner:
+            winner.wins += 1
+            winner.points_for += winner_points
+            winner.points_against += loser_points
+            winner.rating += change
+        if loser:
+            loser.losses += 1
+            loser.points_for += loser_points
+            loser.points_against += winner_points
+            loser.rating -= change
+
+    rooms = Room.objects.filter(is_expired=True).exclude(opponent_type='Tournament').order_by('updated')
+    for room in rooms:
+        if room.opponent_type == 'AI' and room.host_id:
+            if room.won_by_ai:
+                record(None, room.host_id)
+            elif room.won_by_user_id:
+                record(room.won_by_user_id, None)
+        elif room.opponent_type == 'vs Player' and room.won_by_user_id:
+            opponent = room.participants.exclude(id=room.won_by_user_id).first()
+            if opponent:
+                record(room.won_by_user_id, opponent.id)
+
+    matches = Match.objects.filter(room__isnull=False, is_completed=True, is_bye=False).order_by('id')
+    for match in matches:
+        if match.winner_id not in (match.player1_id, match.player2_id) or None in (match.player1_id, match.player2_id):
+            continue
+        scores = {match.player1_id: match.player1_score or 0, match.player2_id: match.player2_score or 0}
+        loser_id = match.player2_id if match.winner_id == match.player1_id else match.player1_id
+        record(match.winner_id, loser_id, scores[match.winner_id], scores[loser_id])
+
+    PlayerStats.objects.bulk_create(stats.values())
+    buckets = {}
+    for player in stats.values():
+        floor = int(player.rating // 10) * 10
+        buckets[floor] = buckets.get(floor, 0) + 1
+    RatingBucket.objects.bulk_create([RatingBucket(floor=floor, players=count) for floor, count in buckets.items()])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0042_tournament_bracket'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PlayerStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to='base.user')),
+                ('wins', models.PositiveIntegerField(default=0)),
+                ('losses', models.PositiveIntegerField(default=0)),
+                ('points_for', models.PositiveIntegerField(default=0)),
+                ('points_against', models.PositiveIntegerField(default=0)),
+                ('rating', models.FloatField(default=1500)),
+                ('updated', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-rating', 'user_id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='RatingBucket',
+            fields=[
+                ('floor', models.IntegerField(primary_key=True, serialize=False)),
+                ('players', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='playerstats',
+            index=models.Index(fields=['-rating', 'user'], name='playerstats_rating_idx'),
+        ),
+        migrations.RunPython(fill_player_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,102 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:01
+
+import mimetypes
+
+from django.db import migrations, models
+from PIL import Image
+
+
+# A copy of base.media as it was when this migration was written, so later
+# changes to the app's code cannot change what it does.
+
+DEFAULT_TYPE = 'application/octet-stream'
+
+SIGNATURES = (
+    (0, b'%PDF-', 'application/pdf'),
+    (0, b'PK\x03\x04', 'application/zip'),
+    (0, b'\x1f\x8b', 'application/gzip'),
+    (0, b'ID3', 'audio/mpeg'),
+    (0, b'OggS', 'audio/ogg'),
+    (0, b'\x1aE\xdf\xa3', 'video/webm'),
+    (4, b'ftyp', 'video/mp4'),
+    (8, b'WAVE', 'audio/wav'),
+)
+
+SNIFF_BYTES = 16
+
+
+def sniff_type(head, name):
+    for offset, magic, mime_type in SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            return mime_type
+    return mimetypes.guess_type(name)[0] or DEFAULT_TYPE
+
+
+def describe_file(file):
+    metadata = {
+        'file_type': DEFAULT_TYPE,
+        'file_size': file.size,
+        'file_width': None,
+        'file_height': None,
+    }
+    try:
+        file.seek(0)
+        with Image.open(file) as image:
+            image_format, (width, height) = image.format, image.size
+            image.verify()
+    except (OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        file.seek(0)
+        metadata['file_type'] = sniff_type(file.read(SNIFF_BYTES), file.name)
+    else:
+        metadata.update(
+            file_type=Image.MIME.get(image_format, f'image/{image_format.lower()}'),
+            file_width=width,
+            file_height=height,
+        )
+    finally:
+        file.seek(0)
+    return metadata
+
+
+def fill_file_metadata(apps, schema_editor):
+    GroupMessage = apps.get_model('base', 'GroupMessage')
+    messages = GroupMessage.objects.exclude(file='').exclude(file__isnull=True)
+    for message in messages.iterator():
+        try:
+            with message.file.open('rb'):
+                metadata = describe_file(message.file)
+        except OSError:
+            # the file is gone, it renders as a plain link
+            continue
+        GroupMessage.objects.filter(pk=message.pk).update(**metadata)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0043_player_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='groupmessage',
+            name='file_height',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='groupmessage',
+            name='file_size',
+            field=models.PositiveBigIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='groupmessage',
+            name='file_type',
+            field=models.CharField(blank=True, default='', max_length=100),
+        ),
+        migrations.AddField(
+            model_name='groupmessage',
+            name='file_width',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(fill_file_metadata, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 3.2.25 on 2026-10-18 16:09
+
+import base.uploads
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0044_message_file_metadata'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('size', models.PositiveBigIntegerField()),
+                ('references', models.PositiveIntegerField(default=1)),
+                ('created', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='groupmessage',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=base.uploads.chat_file_storage, upload_to='files/'),
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations
+from django.db.models import OuterRef, Subquery
+
+
+def follow_guest_ready(apps, schema_editor):
+    # is_ready was host_ready and opp_ready, and nothing sets host_ready
+    Room = apps.get_model('base', 'Room')
+    OpenLobby = apps.get_model('base', 'OpenLobby')
+    OpenLobby.objects.update(is_ready=Subquery(Room.objects.filter(pk=OuterRef('room_id')).values('opp_ready')))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('base', '0045_stored_file'),
+    ]
+
+    operations = [
+        migrations.RunPython(follow_guest_ready, migrations.RunPython.noop),
+    ]
@@ -1,7 +1,7 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser, BaseUserManager
+from .uploads import chat_file_storage
 import shortuuid
-from PIL import Image
 import os
 import uuid
 
@@ -84,6 +84,15 @@ class Room(models.Model):
         ('AI', 'AI'),
     )
     opponent_type = models.CharField(max_length=10, choices=OPPONENT_TYPE_CHOICES, default='AI')
+
+    TOURNAMENT_FORMAT_CHOICES = (
+        ('single', 'Single elimination'),
+        ('double', 'Double elimination'),
+        ('swiss', 'Swiss'),
+    )
+    tournament_format = models.CharField(max_length=10, choices=TOURNAMENT_FORMAT_CHOICES, default='single')
+    # set once the bracket is drawn, see base.tournament
+    bracket_size = models.PositiveIntegerField(null=True, blank=True)
     won_by_user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='won_by_user')
     won_by_ai = models.BooleanField(default=False)
     is_expired = models.BooleanField(default=False)
@@ -102,12 +111,33 @@ class Room(models.Model):
             self.invitation_link = str(uuid.uuid4())
         super().save(*args, **kwargs)
 
+class OpenLobby(models.Model):
+    # Denormalized room list row, one per open room, see base.lobby
+    room = models.OneToOneField(Room, on_delete=models.CASCADE, primary_key=True, related_name='open_lobby')
+    name = models.CharField(max_length=200)
+    description = models.TextField(null=True, blank=True)
+    points = models.IntegerField(default=1)
+    opponent_type = models.CharField(max_length=10)
+    host = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='+')
+    host_username = models.CharField(max_length=200, blank=True)
+    host_avatar_url = models.CharField(max_length=255, blank=True)
+    participant_count = models.IntegerField(default=0)
+    is_ready = models.BooleanField(default=False)
+    created = models.DateTimeField()
+    updated = models.DateTimeField()
+    changed = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        ordering = ['-updated', '-created']
+
+    def __str__(self):
+        return self.name
+
 class ChatGroup(models.Model):
     group_name = models.CharField(max_length=128, unique=True, blank=True)
     groupchat_name = models.CharField(max_length=128, null=True, blank=True)
     room = models.ForeignKey(Room, on_delete=models.CASCADE, null=True, blank=True, default=None)
     admin = models.ForeignKey(User, related_name='groupchats', blank=True, null=True, on_delete=models.SET_NULL)
-    users_online = models.ManyToManyField(User, related_name='online_in_groups', blank=True)
     members = models.ManyToManyField(User, related_name='chat_groups', blank=True)
     is_private = models.BooleanField(default=False)
 
@@ -119,13 +149,29 @@ class ChatGroup(models.Model):
             self.group_name = shortuuid.uuid()
         super().save(*args, **kwargs)
 
+class StoredFile(models.Model):
+    # one row per content in base.uploads.ContentAddressedStorage
+    name = models.CharField(max_length=255, primary_key=True)
+    size = models.PositiveBigIntegerField()
+    references = models.PositiveIntegerField(default=1)
+    created = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.name
+
+
 class GroupMessage(models.Model):
     group = models.ForeignKey(ChatGroup, related_name='chat_messages', on_delete=models.CASCADE)
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     body = models.CharField(max_length=300, blank=True, null=True)
     is_invitation = models.BooleanField(default=False)
     room = models.ForeignKey(Room, on_delete=models.CASCADE, null=True, blank=True, default=None)
-    file = models.FileField(upload_to='files/', blank=True, null=True)
+    file = models.FileField(upload_to='files/', storage=chat_file_storage, blank=True, null=True)
+    # read from the upload once, see base.media
+    file_type = models.CharField(max_length=100, blank=True, default='')
+    file_size = models.PositiveBigIntegerField(null=True, blank=True)
+    file_width = models.PositiveIntegerField(null=True, blank=True)
+    file_height = models.PositiveIntegerField(null=True, blank=True)
     created = models.DateTimeField(auto_now_add=True)
 
     @property
@@ -141,30 +187,73 @@ class GroupMessage(models.Model):
             return f'{self.author.username} : {self.filename}'
 
     class Meta:
-        ordering = ['-created']
+        ordering = ['-created', '-id']
+        indexes = [
+            # keyset pagination of a group's history, see base.history
+            models.Index(fields=['group', 'created', 'id'], name='groupmessage_history_idx'),
+        ]
 
-    @property    
+    @property
     def is_image(self):
-        try:
-            image = Image.open(self.file) 
-            image.verify()
-            return True 
-        except (IOError, SyntaxError):
-            return False
+        return self.file_type.startswith('image/')
 
 class Match(models.Model):
-    player1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='matches_as_player1')
-    player2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='matches_as_player2')
+    # Tournament matches are addressed by (room, bracket, round_number, slot),
+    # see base.tournament. Players are filled in as earlier rounds finish.
+    room = models.ForeignKey(Room, on_delete=models.CASCADE, related_name='matches', null=True, blank=True)
+    player1 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='matches_as_player1', null=True, blank=True)
+    player2 = models.ForeignKey(User, on_delete=models.CASCADE, related_name='matches_as_player2', null=True, blank=True)
     player1_score = models.IntegerField(null=True, blank=True)
     player2_score = models.IntegerField(null=True, blank=True)
     round = models.CharField(max_length=20)
+
+    BRACKET_CHOICES = (
+        ('W', 'Winners'),
+        ('L', 'Losers'),
+        ('F', 'Grand final'),
+        ('S', 'Swiss'),
+    )
+    bracket = models.CharField(max_length=1, choices=BRACKET_CHOICES, default='W')
+    round_number = models.PositiveSmallIntegerField(default=1)
+    slot = models.PositiveIntegerField(default=0)
+    is_bye = models.BooleanField(default=False)
     is_final = models.BooleanField(default=False)
     is_completed = models.BooleanField(default=False)
     winner = models.ForeignKey(User, related_name='match_winner', on_delete=models.SET_NULL, null=True, blank=True)
 
+    class Meta:
+        ordering = ['bracket', 'round_number', 'slot']
+        constraints = [
+            models.UniqueConstraint(fields=['room', 'bracket', 'round_number', 'slot'], name='match_bracket_position'),
+        ]
+
     def __str__(self):
         return f"{self.player1} vs {self.player2} - {self.round}"
 
+class PlayerStats(models.Model):
+    # Running totals kept by base.leaderboard as results come in
+    user = models.OneToOneField(User, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    wins = models.PositiveIntegerField(default=0)
+    losses = models.PositiveIntegerField(default=0)
+    points_for = models.PositiveIntegerField(default=0)
+    points_against = models.PositiveIntegerField(default=0)
+    rating = models.FloatField(default=1500)
+    updated = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-rating', 'user_id']
+        indexes = [
+            models.Index(fields=['-rating', 'user'], name='playerstats_rating_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user} - {self.rating:.0f}"
+
+class RatingBucket(models.Model):
+    # Number of players per band of rating, so ranks are a short sum
+    floor = models.IntegerField(primary_key=True)
+    players = models.PositiveIntegerField(default=0)
+
 class Notification(models.Model):
     TYPE_CHOICES = [
         ('friend_request', 'Friend Request'),
@@ -0,0 +1,56 @@
+"""
+Real-time delivery of user notifications.
+
+Every logged-in page keeps a socket on NotificationConsumer, joined to the
+user's user-notifications-<id> group. New notifications are rendered once
+and pushed to that group, and the unread counter lives in the cache so it
+only has to be counted when it is missing.
+"""
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from .models import Notification
+
+
+# Bounds how long another worker's local cache can serve a stale count.
+UNREAD_COUNT_TIMEOUT = 300
+
+
+def notification_group_name(user_id):
+    return f'user-notifications-{user_id}'
+
+
+def unread_count_cache_key(user_id):
+    return f'notifications-unread:{user_id}'
+
+
+def get_unread_count(user_id):
+    return cache.get_or_set(
+        unread_count_cache_key(user_id),
+        lambda: Notification.objects.filter(user_id=user_id, is_read=False).count(),
+        UNREAD_COUNT_TIMEOUT,
+    )
+
+
+def invalidate_unread_count(user_id):
+    cache.delete(unread_count_cache_key(user_id))
+
+
+def push_notification(notification):
+    try:
+        unread_count = cache.incr(unread_count_cache_key(notification.user_id))
+    except ValueError:
+        unread_count = get_unread_count(notification.user_id)
+
+    html = render_to_string('notification/partials/noti_push.html', {
+        'notification': notification,
+        'unread_count': unread_count,
+    })
+    event = {
+        'type': 'notification_handler',
+        'html': html,
+    }
+    async_to_sync(get_channel_layer().group_send)(notification_group_name(notification.user_id), event)
@@ -0,0 +1,175 @@
+"""
+Presence tracking for chat groups.
+
+Each connected socket is registered in a per-group set with a TTL and keeps
+itself alive with heartbeats, so connect/disconnect never touches the
+database. A user is online in a group while at least one of their sockets is.
+
+The backend is configured with the PRESENCE setting:
+
+    PRESENCE = {
+        'BACKEND': 'base.presence.LocalPresence',
+        'OPTIONS': {'ttl': 60},
+    }
+"""
+
+import asyncio
+import threading
+import time
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+
+# Online-count broadcasts for a group are coalesced into one per window.
+BROADCAST_DEBOUNCE = 0.25
+
+
+class LocalPresence:
+    """In-process presence store. Only sees sockets of the current worker."""
+
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._groups = {}
+        self._lock = threading.Lock()
+
+    def _live(self, group_name, now):
+        sockets = self._groups.get(group_name, {})
+        for channel_name, (user_id, expires) in list(sockets.items()):
+            if expires <= now:
+                del sockets[channel_name]
+        return sockets
+
+    def join(self, group_name, channel_name, user_id):
+        """Register a socket. Returns True if the user just came online."""
+        now = time.monotonic()
+        with self._lock:
+            sockets = self._live(group_name, now)
+            was_online = any(uid == user_id for uid, _ in sockets.values())
+            sockets[channel_name] = (user_id, now + self.ttl)
+            self._groups[group_name] = sockets
+        return not was_online
+
+    touch = join
+
+    def leave(self, group_name, channel_name):
+        """Drop a socket. Returns True if its user just went offline."""
+        now = time.monotonic()
+        with self._lock:
+            sockets = self._live(group_name, now)
+            entry = sockets.pop(channel_name, None)
+            if not sockets:
+                self._groups.pop(group_name, None)
+        if entry is None:
+            return False
+        return not any(uid == entry[0] for uid, _ in sockets.values())
+
+    def online_users(self, group_name):
+        return self.online_users_bulk([group_name])[group_name]
+
+    def online_users_bulk(self, group_names):
+        """Map each group name to the set of user ids online in it."""
+        now = time.monotonic()
+        with self._lock:
+            return {
+                group_name: {uid for uid, _ in self._live(group_name, now).values()}
+                for group_name in group_names
+            }
+
+
+class RedisPresence:
+    """Presence store shared by all workers through a Redis sorted set per group."""
+
+    def __init__(self, url='redis://127.0.0.1:6379/0', ttl=60, prefix='presence'):
+        import redis
+
+        self.ttl = ttl
+        self.prefix = prefix
+        self.client = redis.Redis.from_url(url)
+
+    def _key(self, group_name):
+        return f'{self.prefix}:{group_name}'
+
+    @staticmethod
+    def _sockets(members):
+        """Map channel name to user id for raw 'user_id:channel_name' members."""
+        sockets = {}
+        for member in members:
+            user_id, channel_name = member.decode().split(':', 1)
+            sockets[channel_name] = int(user_id)
+        return sockets
+
+    def _live_sockets(self, group_name, now):
+        key = self._key(group_name)
+        pipe = self.client.pipeline()
+        pipe.zremrangebyscore(key, '-inf', now)
+        pipe.zrangebyscore(key, now, '+inf')
+        return self._sockets(pipe.execute()[1])
+
+    def join(self, group_name, channel_name, user_id):
+        now = time.time()
+        key = self._key(group_name)
+        sockets = self._live_sockets(group_name, now)
+        pipe = self.client.pipeline()
+        pipe.zadd(key, {f'{user_id}:{channel_name}': now + self.ttl})
+        pipe.expire(key, self.ttl)
+        pipe.execute()
+        return user_id not in sockets.values()
+
+    touch = join
+
+    def leave(self, group_name, channel_name):
+        sockets = self._live_sockets(group_name, time.time())
+        user_id = sockets.pop(channel_name, None)
+        if user_id is None:
+            return False
+        self.client.zrem(self._key(group_name), f'{user_id}:{channel_name}')
+        return user_id not in sockets.values()
+
+    def online_users(self, group_name):
+        return self.online_users_bulk([group_name])[group_name]
+
+    def online_users_bulk(self, group_names):
+        group_names = list(group_names)
+        now = time.time()
+        pipe = self.client.pipeline()
+        for group_name in group_names:
+            pipe.zrangebyscore(self._key(group_name), now, '+inf')
+        return {
+            group_name: set(self._sockets(members).values())
+            for group_name, members in zip(group_names, pipe.execute())
+        }
+
+
+_presence = None
+
+
+def get_presence():
+    global _presence
+    if _presence is None:
+        config = getattr(settings, 'PRESENCE', {})
+        backend = import_string(config.get('BACKEND', 'base.presence.LocalPresence'))
+        _presence = backend(**config.get('OPTIONS', {}))
+    return _presence
+
+
+_pending_broadcasts = {}
+
+
+def debounce(key, coroutine_function, delay=BROADCAST_DEBOUNCE):
+    """
+    Run coroutine_function() once, delay seconds from now, ignoring further
+    calls with the same key until it has run.
+    """
+    if key in _pending_broadcasts:
+        return
+
+    async def run():
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            _pending_broadcasts.pop(key, None)
+        await coroutine_function()
+
+    _pending_broadcasts[key] = asyncio.ensure_future(run())
+
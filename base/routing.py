@@ -4,4 +4,10 @@ from .consumers import *
 
 websocket_urlpatterns = [
     path("ws/chatroom/<chatroom_name>", ChatroomConsumer.as_asgi()),
+    path("ws/notifications/", NotificationConsumer.as_asgi()),
+    path("ws/lobby/<int:room_id>", LobbyConsumer.as_asgi()),
+    path("ws/game/<int:room_id>", GameConsumer.as_asgi()),
+    path("ws/game/match/<int:match_id>", GameConsumer.as_asgi()),
+    path("ws/tournament/<int:room_id>", TournamentConsumer.as_asgi()),
+    path("ws/matchmaking/", MatchmakingConsumer.as_asgi()),
 ]
\ No newline at end of file
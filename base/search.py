@@ -0,0 +1,177 @@
+"""
+Full-text search over room names/descriptions and chat message bodies.
+
+The backend follows the database:
+
+    sqlite      FTS5 tables base_room_fts and base_groupmessage_fts, keyed by
+                the row id and kept up to date by the receivers in
+                base.signals (bulk_create and queryset.update() bypass them)
+    postgresql  to_tsvector expressions backed by GIN indexes, maintained by
+                Postgres itself
+    other       icontains filters, unranked
+
+Every word of the query matches as a prefix and all words must match.
+Results come back best match first. Room searches can be narrowed to open
+lobbies inside the query, so the limit counts open rooms only. Messages
+are ranked among the newest MESSAGE_RANK_WINDOW matches only, so a common
+word does not have to score millions of rows.
+"""
+
+import re
+
+from django.db import connection
+from django.db.models import Q
+
+from .models import Room, GroupMessage, OpenLobby
+
+
+SEARCH_LIMIT = 50
+MESSAGE_RANK_WINDOW = 1000
+
+_words = re.compile(r'\w+')
+
+
+def query_words(q):
+    return _words.findall(q.lower())
+
+
+def _in_order(queryset, ids):
+    objects = queryset.in_bulk(ids)
+    return [objects[pk] for pk in ids if pk in objects]
+
+
+class SQLiteSearch:
+    indexes_rows = True
+
+    @staticmethod
+    def _match(words):
+        return ' '.join(f'"{word}"*' for word in words)
+
+    def index_room(self, room):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM base_room_fts WHERE rowid = %s', [room.id])
+            cursor.execute(
+                'INSERT INTO base_room_fts (rowid, name, description) VALUES (%s, %s, %s)',
+                [room.id, room.name, room.description or ''],
+            )
+
+    def unindex_room(self, room_id):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM base_room_fts WHERE rowid = %s', [room_id])
+
+    def index_message(self, message):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM base_groupmessage_fts WHERE rowid = %s', [message.id])
+            cursor.execute(
+                'INSERT INTO base_groupmessage_fts (rowid, body, group_id) VALUES (%s, %s, %s)',
+                [message.id, message.body or '', message.group_id],
+            )
+
+    def unindex_message(self, message_id):
+        with connection.cursor() as cursor:
+            cursor.execute('DELETE FROM base_groupmessage_fts WHERE rowid = %s', [message_id])
+
+    def room_ids(self, words, limit, open_only=False):
+        where = 'AND rowid IN (SELECT room_id FROM base_openlobby) ' if open_only else ''
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT rowid FROM base_room_fts WHERE base_room_fts MATCH %s {where}ORDER BY rank LIMIT %s',
+                [self._match(words), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def message_ids(self, words, group_id, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                'SELECT rowid FROM ('
+                'SELECT rowid, rank FROM base_groupmessage_fts WHERE base_groupmessage_fts MATCH %s '
+                'AND group_id = %s ORDER BY rowid DESC LIMIT %s'
+                ') ORDER BY rank LIMIT %s',
+                [self._match(words), group_id, MESSAGE_RANK_WINDOW, limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class PostgresSearch:
+    # the GIN indexes follow the table, nothing to maintain
+    indexes_rows = False
+
+    ROOM_VECTOR = "to_tsvector('simple', name || ' ' || coalesce(description, ''))"
+    MESSAGE_VECTOR = "to_tsvector('simple', coalesce(body, ''))"
+
+    @staticmethod
+    def _tsquery(words):
+        return ' & '.join(f'{word}:*' for word in words)
+
+    def room_ids(self, words, limit, open_only=False):
+        where = 'AND id IN (SELECT room_id FROM base_openlobby) ' if open_only else ''
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM base_room WHERE {self.ROOM_VECTOR} @@ to_tsquery('simple', %s) {where}"
+                f"ORDER BY ts_rank({self.ROOM_VECTOR}, to_tsquery('simple', %s)) DESC LIMIT %s",
+                [self._tsquery(words), self._tsquery(words), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def message_ids(self, words, group_id, limit):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT id FROM ("
+                f"SELECT id, body FROM base_groupmessage WHERE group_id = %s AND {self.MESSAGE_VECTOR} @@ to_tsquery('simple', %s) "
+                f"ORDER BY id DESC LIMIT %s"
+                f") AS recent ORDER BY ts_rank({self.MESSAGE_VECTOR}, to_tsquery('simple', %s)) DESC LIMIT %s",
+                [group_id, self._tsquery(words), MESSAGE_RANK_WINDOW, self._tsquery(words), limit],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+
+class LikeSearch:
+    indexes_rows = False
+
+    def room_ids(self, words, limit, open_only=False):
+        rooms = Room.objects.all()
+        if open_only:
+            rooms = rooms.filter(id__in=OpenLobby.objects.values('room_id'))
+        for word in words:
+            rooms = rooms.filter(Q(name__icontains=word) | Q(description__icontains=word))
+        return list(rooms.values_list('id', flat=True)[:limit])
+
+    def message_ids(self, words, group_id, limit):
+        messages = GroupMessage.objects.filter(group_id=group_id)
+        for word in words:
+            messages = messages.filter(body__icontains=word)
+        return list(messages.values_list('id', flat=True)[:limit])
+
+
+BACKENDS = {
+    'sqlite': SQLiteSearch,
+    'postgresql': PostgresSearch,
+}
+
+
+def get_search():
+    return BACKENDS.get(connection.vendor, LikeSearch)()
+
+
+def search_room_ids(q, limit=SEARCH_LIMIT, open_only=False):
+    """
+    Ids of the rooms matching every word of q, best match first; with
+    open_only, of the matching rooms that have an open lobby.
+    """
+    words = query_words(q)
+    if not words:
+        return []
+    return get_search().room_ids(words, limit, open_only)
+
+
+def search_rooms(q, limit=SEARCH_LIMIT):
+    return _in_order(Room.objects.all(), search_room_ids(q, limit))
+
+
+def search_messages(q, chat_group, limit=SEARCH_LIMIT):
+    """Messages of chat_group matching every word of q, best match first."""
+    words = query_words(q)
+    if not words:
+        return []
+    ids = get_search().message_ids(words, chat_group.id, limit)
+    return _in_order(GroupMessage.objects.select_related('author', 'room'), ids)
@@ -1,12 +1,191 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_save, pre_delete, post_delete, m2m_changed
 from django.dispatch import receiver
+from django_cleanup.signals import cleanup_post_delete
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
+from django.core.cache import cache
 import logging
-from .models import Room
+from .models import User, Room, GroupMessage, Notification, PlayerStats
+from .consumers import online_count_cache_key
+from .fragments import invalidate_message_fragments
+from .search import get_search
+from .lobby import refresh_open_lobby, refresh_lobby_host
+from .versions import bump_version
+from .thumbnails import schedule_variants, forget_variants
+from .leaderboard import forget_rating
 
 logger = logging.getLogger(__name__)
 
+
+@receiver(post_save, sender=GroupMessage)
+def invalidate_online_count(sender, instance, created, **kwargs):
+    # the online-count fragment lists the authors of the latest messages
+    if created:
+        cache.delete(online_count_cache_key(instance.group.group_name))
+
+
+@receiver(post_save, sender=GroupMessage)
+def invalidate_edited_message(sender, instance, created, **kwargs):
+    # a new message has nothing cached yet
+    if not created:
+        invalidate_message_fragments(instance.id)
+
+
+@receiver(post_delete, sender=GroupMessage)
+def invalidate_deleted_message(sender, instance, **kwargs):
+    invalidate_message_fragments(instance.id)
+
+
+@receiver(cleanup_post_delete, sender=GroupMessage)
+def invalidate_removed_file(sender, instance, **kwargs):
+    # django-cleanup removed the old file of a replaced or deleted attachment
+    invalidate_message_fragments(instance.id)
+
+
+
+def _indexed_fields_changed(update_fields, fields):
+    return update_fields is None or bool(fields & set(update_fields))
+
+
+@receiver(post_save, sender=Room)
+def index_room(sender, instance, update_fields=None, **kwargs):
+    search = get_search()
+    if search.indexes_rows and _indexed_fields_changed(update_fields, {'name', 'description'}):
+        search.index_room(instance)
+
+
+@receiver(post_delete, sender=Room)
+def unindex_room(sender, instance, **kwargs):
+    search = get_search()
+    if search.indexes_rows:
+        search.unindex_room(instance.id)
+
+
+@receiver(post_save, sender=GroupMessage)
+def index_message(sender, instance, update_fields=None, **kwargs):
+    search = get_search()
+    if search.indexes_rows and _indexed_fields_changed(update_fields, {'body'}):
+        search.index_message(instance)
+
+
+@receiver(post_delete, sender=GroupMessage)
+def unindex_message(sender, instance, **kwargs):
+    search = get_search()
+    if search.indexes_rows:
+        search.unindex_message(instance.id)
+
+
+
+@receiver(post_save, sender=GroupMessage)
+def make_image_variants(sender, instance, created, **kwargs):
+    if created and instance.is_image:
+        transaction.on_commit(lambda: schedule_variants(instance.file.name))
+
+
+@receiver(cleanup_post_delete, sender=GroupMessage)
+@receiver(cleanup_post_delete, sender=User)
+def forget_removed_file_variants(sender, file, file_name, **kwargs):
+    # a chat file shared by other messages is still there; variant files
+    # may serve other originals too and are swept by cleanup_variants
+    if not file.storage.exists(file_name):
+        forget_variants(file_name)
+
+
+@receiver(post_save, sender=User)
+def make_avatar_variants(sender, instance, update_fields=None, **kwargs):
+    if instance.avatar and _indexed_fields_changed(update_fields, {'avatar'}):
+        transaction.on_commit(lambda: schedule_variants(instance.avatar.name))
+
+
+@receiver(post_save, sender=Room)
+def update_open_lobby(sender, instance, **kwargs):
+    refresh_open_lobby(instance)
+
+
+def _user_room_ids(user, action, pk_set):
+    """Ids of the rooms a change to user.participants touched."""
+    if action == 'post_clear':
+        return getattr(user, '_cleared_room_ids', ())
+    return pk_set or ()
+
+
+@receiver(m2m_changed, sender=Room.participants.through)
+def remember_cleared_rooms(sender, instance, action, reverse, **kwargs):
+    # post_clear comes without pk_set, so note the rooms a user is leaving
+    if reverse and action == 'pre_clear':
+        instance._cleared_room_ids = set(instance.participants.values_list('id', flat=True))
+
+
+@receiver(m2m_changed, sender=Room.participants.through)
+def update_open_lobby_participants(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        refresh_open_lobby(instance)
+    else:
+        for room in Room.objects.filter(pk__in=_user_room_ids(instance, action, pk_set)):
+            refresh_open_lobby(room)
+
+
+@receiver(post_save, sender=User)
+def update_open_lobby_host(sender, instance, created, update_fields=None, **kwargs):
+    if not created and _indexed_fields_changed(update_fields, {'username', 'avatar'}):
+        refresh_lobby_host(instance)
+
+
+@receiver(pre_delete, sender=User)
+def remember_deleted_user_rooms(sender, instance, **kwargs):
+    # the delete drops the user's participant rows without m2m_changed and
+    # sets their rooms' host to null without saving them
+    rooms = Room.objects.filter(is_expired=False)
+    instance._deleted_room_ids = set(rooms.filter(participants=instance).values_list('id', flat=True))
+    instance._deleted_room_ids.update(rooms.filter(host=instance).values_list('id', flat=True))
+
+
+@receiver(post_delete, sender=User)
+def update_deleted_user_rooms(sender, instance, **kwargs):
+    for room in Room.objects.filter(pk__in=getattr(instance, '_deleted_room_ids', ())):
+        refresh_open_lobby(room)
+        bump_version(f'room:{room.id}')
+
+
+
+@receiver(post_save, sender=Room)
+@receiver(post_delete, sender=Room)
+def bump_room_version(sender, instance, **kwargs):
+    bump_version(f'room:{instance.id}')
+
+
+@receiver(post_delete, sender=Room)
+def bump_lobby_version(sender, instance, **kwargs):
+    # the OpenLobby row goes with the room
+    bump_version('lobby')
+
+
+@receiver(m2m_changed, sender=Room.participants.through)
+def bump_participants_version(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        bump_version(f'room:{instance.id}')
+    else:
+        for room_id in _user_room_ids(instance, action, pk_set):
+            bump_version(f'room:{room_id}')
+
+
+@receiver(post_save, sender=Notification)
+@receiver(post_delete, sender=Notification)
+def bump_notifications_version(sender, instance, **kwargs):
+    bump_version(f'notifications:{instance.user_id}')
+
+
+@receiver(post_delete, sender=PlayerStats)
+def forget_player_rating(sender, instance, **kwargs):
+    # also when the user is deleted, through the cascade
+    forget_rating(instance.rating)
+
+
 # @receiver(post_save, sender=Room)
 # def create_room(sender, instance, created, **kwargs):
 #     if created:
@@ -0,0 +1,82 @@
+from django import template
+from django.core.files.storage import default_storage
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+
+from base.thumbnails import (
+    VARIANT_FORMATS, get_variants, schedule_variants, pick_width, variant_name, count_served,
+)
+
+register = template.Library()
+
+
+def _record(file):
+    record = get_variants(file.name)[file.name]
+    if record is None:
+        # served as the original until the variants are written
+        schedule_variants(file.name)
+    return record
+
+
+def _variant_url(record, width, extension):
+    return default_storage.url(variant_name(record['digest'], width, extension))
+
+
+def _srcset(record, extension):
+    return ', '.join(
+        f'{_variant_url(record, width, extension)} {width}w'
+        for width in sorted(record['widths'])
+    )
+
+
+@register.simple_tag
+def variant_url(file, width):
+    """
+    URL of the narrowest WebP variant of file at least width pixels wide, or
+    of the original while it has none or it is smaller.
+
+        <img src="{% variant_url message.author.avatar 80 %}">
+    """
+    if not file:
+        return ''
+    record = _record(file)
+    if record is None:
+        return file.url
+    chosen = pick_width(record, width)
+    extension = VARIANT_FORMATS[0][0]
+    if chosen is None or record['widths'][chosen][extension] >= record['size']:
+        count_served(record, record['size'])
+        return file.url
+    count_served(record, record['widths'][chosen][extension])
+    return _variant_url(record, chosen, extension)
+
+
+@register.simple_tag
+def responsive_image(file, box_width, **attrs):
+    """
+    A <picture> of file for a box up to box_width CSS pixels wide, with WebP
+    and JPEG srcsets of its variants and the original as the fallback.
+    Keyword arguments become attributes of the <img>.
+
+        {% responsive_image message.file 288 class="max-w-72" alt="" %}
+    """
+    if not file:
+        return ''
+    record = _record(file)
+    if record is None or not record['widths']:
+        if record is not None:
+            count_served(record, record['size'])
+        return format_html('<img src="{}"{}>', file.url, flatatt(attrs))
+
+    sizes = f'(max-width: {box_width}px) 100vw, {box_width}px'
+    webp, jpeg = (extension for extension, image_format, mime_type in VARIANT_FORMATS)
+    # what a 2x screen downloads
+    chosen = pick_width(record, box_width * 2)
+    count_served(record, min(record['widths'][chosen][webp], record['size']))
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}">'
+        '<img src="{}" srcset="{}, {} {}w" sizes="{}"{}></picture>',
+        _srcset(record, webp), sizes,
+        _variant_url(record, chosen, jpeg), _srcset(record, jpeg), file.url, record['width'], sizes,
+        flatatt(attrs),
+    )
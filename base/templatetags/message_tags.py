@@ -0,0 +1,17 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from base.fragments import render_message_fragment
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def message_fragment(context, message, layout):
+    """
+    Render a chat message for the current viewer through the fragment cache.
+
+        {% message_fragment message 'private' %}
+    """
+    user = context.get('user')
+    return mark_safe(render_message_fragment(message, layout, getattr(user, 'id', None), context.get('request')))
@@ -0,0 +1,19 @@
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    Runs the tests with the plain static files storage: pages are rendered
+    without collectstatic having written the manifest the hashed names
+    come from.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.storage = override_settings(STATICFILES_STORAGE='django.contrib.staticfiles.storage.StaticFilesStorage')
+        self.storage.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.storage.disable()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,58 @@
+from django.test import TestCase
+
+from base.models import Room, User
+from base.tournament import generate_bracket
+
+
+class RoomApiTests(TestCase):
+    def setUp(self):
+        self.host = User.objects.create_user(username='host', email='host@example.com', password='x')
+        self.room = Room.objects.create(host=self.host, name='lobby')
+        self.url = f'/api/rooms/{self.room.id}/'
+
+    def test_room_ids_are_numbers(self):
+        self.assertEqual(self.client.get('/api/rooms/abc/').status_code, 404)
+        self.assertEqual(self.client.get(f'/api/rooms/{self.room.id + 1}/').status_code, 404)
+
+    def test_fields(self):
+        response = self.client.get(self.url, {'fields': 'id,name'})
+        self.assertEqual(response.json(), {'id': self.room.id, 'name': 'lobby'})
+        response = self.client.get(self.url, {'fields': 'name,password'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self.client.get('/api/rooms/', {'fields': 'password'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/rooms/', {'is_expired': 'maybe'}).status_code, 400)
+
+    def test_not_modified(self):
+        response = self.client.get(self.url, {'fields': 'name'})
+        self.assertIn('Last-Modified', response)
+        again = self.client.get(self.url, {'fields': 'name'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.status_code, 304)
+        again = self.client.get(self.url, {'fields': 'name'}, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(again.status_code, 304)
+
+        self.room.name = 'renamed'
+        self.room.save()
+        again = self.client.get(self.url, {'fields': 'name'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.json(), {'name': 'renamed'})
+
+    def test_participants_have_no_last_modified(self):
+        response = self.client.get(self.url, {'fields': 'participants'})
+        self.assertNotIn('Last-Modified', response)
+        self.assertNotIn('Last-Modified', self.client.get('/api/rooms/', {'fields': 'id,participants'}))
+
+        # joining leaves updated alone, only the ETag changes
+        self.room.participants.add(self.host)
+        again = self.client.get(self.url, {'fields': 'participants'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.json(), {'participants': [self.host.id]})
+
+    def test_drawing_the_bracket_changes_the_room(self):
+        guest = User.objects.create_user(username='guest', email='guest@example.com', password='x')
+        self.room.opponent_type = 'Tournament'
+        self.room.save()
+        self.room.participants.set([self.host, guest])
+        response = self.client.get(self.url, {'fields': 'bracket_size'})
+        self.assertEqual(response.json(), {'bracket_size': None})
+
+        generate_bracket(self.room, seed=1)
+        again = self.client.get(self.url, {'fields': 'bracket_size'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(again.json(), {'bracket_size': 2})
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, override_settings
+
+from base.assets import AssetsMiddleware
+
+
+def get(app, path):
+    messages = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': b''}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {'type': 'http', 'method': 'GET', 'path': path, 'headers': [], 'query_string': b''}
+    async_to_sync(app)(scope, receive, send)
+    return messages[0]['status'], b''.join(message.get('body', b'') for message in messages[1:])
+
+
+class StaticAssetCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root)
+        for name in ('app.css', 'app.0123456789ab.css', 'other.ba9876543210.css'):
+            with open(os.path.join(self.root, name), 'w') as file:
+                file.write(f'/* {name} */')
+        settings = override_settings(STATIC_ROOT=self.root, STATIC_URL='/static/')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.middleware = AssetsMiddleware(None)
+
+    def test_only_hashed_names_are_kept(self):
+        self.assertEqual(get(self.middleware, '/static/app.css'), (200, b'/* app.css */'))
+        self.assertEqual(get(self.middleware, '/static/app.0123456789ab.css')[0], 200)
+        self.assertEqual(list(self.middleware.static_assets), ['app.0123456789ab.css'])
+
+        # a new collectstatic replaces the unhashed copy
+        with open(os.path.join(self.root, 'app.css'), 'w') as file:
+            file.write('/* new */')
+        self.assertEqual(get(self.middleware, '/static/app.css'), (200, b'/* new */'))
+
+    @mock.patch('base.assets.STATIC_CACHE_SIZE', 1)
+    def test_least_recently_served_are_dropped(self):
+        get(self.middleware, '/static/app.0123456789ab.css')
+        get(self.middleware, '/static/other.ba9876543210.css')
+        self.assertEqual(list(self.middleware.static_assets), ['other.ba9876543210.css'])
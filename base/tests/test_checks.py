@@ -0,0 +1,52 @@
+import tempfile
+
+from django.core.checks import Tags, run_checks
+from django.test import SimpleTestCase, override_settings
+
+
+LOCAL = {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}
+SHARED = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': tempfile.gettempdir()}
+
+
+class VersionCacheCheckTests(SimpleTestCase):
+    def errors(self):
+        return [error.id for error in run_checks(tags=[Tags.caches])]
+
+    def test_shared_cache_passes(self):
+        self.assertEqual(self.errors(), [])
+
+    def test_process_local_cache_is_refused(self):
+        for backend in ('locmem.LocMemCache', 'dummy.DummyCache'):
+            with self.subTest(backend=backend):
+                caches = {
+                    'default': LOCAL, 'sessions': SHARED,
+                    'versions': {'BACKEND': f'django.core.cache.backends.{backend}'},
+                }
+                with override_settings(CACHES=caches):
+                    self.assertEqual(self.errors(), ['base.E002'])
+
+    def test_missing_alias_is_refused(self):
+        with override_settings(CACHES={'default': LOCAL, 'sessions': SHARED}):
+            self.assertEqual(self.errors(), ['base.E001'])
+
+
+class SessionCacheCheckTests(SimpleTestCase):
+    def errors(self):
+        return [error.id for error in run_checks(tags=[Tags.caches])]
+
+    def test_process_local_cache_is_refused(self):
+        with override_settings(CACHES={'default': LOCAL, 'versions': SHARED, 'sessions': LOCAL}):
+            self.assertEqual(self.errors(), ['base.E004'])
+        with override_settings(SESSION_CACHE_ALIAS='default', CACHES={'default': LOCAL, 'versions': SHARED}):
+            self.assertEqual(self.errors(), ['base.E004'])
+
+    def test_missing_alias_is_refused(self):
+        with override_settings(CACHES={'default': LOCAL, 'versions': SHARED}):
+            self.assertEqual(self.errors(), ['base.E003'])
+
+    def test_sessions_in_the_database_need_no_cache(self):
+        with override_settings(
+            SESSION_ENGINE='django.contrib.sessions.backends.db',
+            CACHES={'default': LOCAL, 'versions': SHARED},
+        ):
+            self.assertEqual(self.errors(), [])
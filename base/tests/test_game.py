@@ -0,0 +1,226 @@
+import asyncio
+import json
+
+from asgiref.sync import async_to_sync
+from types import SimpleNamespace
+
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from django.urls import reverse
+
+from base.consumers import GameConsumer
+from base.game.ai import AIPool
+from base.game.engine import PADDLE_SPEED, PLAYER1, PLAYER2, REWIND_TICKS, PongMatch
+from base.game.netsim import simulate
+from base.game.protocol import SnapshotEncoder
+from base.game.server import GameServer, GameSession
+from base.models import PlayerStats, Room, User
+
+
+def player(user_id):
+    return SimpleNamespace(id=user_id, is_authenticated=True)
+
+
+class GameServerSeatTests(SimpleTestCase):
+    def room(self, opponent_type='vs Player'):
+        return SimpleNamespace(id=1, host_id=10, opponent_type=opponent_type, points=3)
+
+    async def seat(self, server, room, user, participant_ids=frozenset({10, 20, 30})):
+        session, side = await server.join(room, object(), user, participant_ids)
+        return side
+
+    async def test_players_and_spectators(self):
+        server = GameServer()
+        room = self.room()
+        try:
+            self.assertIsNone(await self.seat(server, room, AnonymousUser()))
+            self.assertIsNone(await self.seat(server, room, player(99)))
+            self.assertEqual(await self.seat(server, room, player(20)), PLAYER2)
+            # the seat is taken, other participants watch
+            self.assertIsNone(await self.seat(server, room, player(30)))
+            self.assertEqual(await self.seat(server, room, player(10)), PLAYER1)
+            self.assertTrue(server.sessions[room.id].match.started)
+        finally:
+            await self.stop(server)
+
+    async def test_ai_rooms_seat_only_the_host(self):
+        server = GameServer()
+        room = self.room('AI')
+        try:
+            self.assertIsNone(await self.seat(server, room, player(20)))
+            self.assertEqual(await self.seat(server, room, player(10)), PLAYER1)
+        finally:
+            await self.stop(server)
+
+    async def test_anonymous_user_is_not_the_host_of_a_hostless_room(self):
+        server = GameServer()
+        room = self.room()
+        room.host_id = None
+        try:
+            self.assertIsNone(await self.seat(server, room, AnonymousUser()))
+        finally:
+            await self.stop(server)
+
+    @staticmethod
+    async def stop(server):
+        for session in list(server.sessions.values()):
+            server.close(session)
+            await asyncio.gather(session.task, return_exceptions=True)
+        if server.ai_task is not None:
+            server.ai_task.cancel()
+            await asyncio.gather(server.ai_task, return_exceptions=True)
+
+
+class InputReplayTests(SimpleTestCase):
+    """
+    Late inputs under latency and jitter, see base.game.netsim: each
+    correction is bounded by how late its input was, and once everything
+    has arrived the match is where it would be had every input arrived on
+    time. manage.py bench_netcode reports the same figures.
+    """
+
+    TICKS = 600
+    CONDITIONS = ((1, 0), (3, 2), (6, 5), (REWIND_TICKS - 4, 3), (1, REWIND_TICKS - 2))
+
+    def test_on_time_inputs_need_no_correction(self):
+        simulation = simulate(latency=0, jitter=0, ticks=self.TICKS)
+        self.assertTrue(simulation.corrections)
+        self.assertEqual({correction.late for correction in simulation.corrections}, {0})
+        self.assertEqual({correction.size for correction in simulation.corrections}, {0.0})
+        self.assertEqual(set(simulation.divergence), {0.0})
+
+    def test_late_inputs_replay_to_the_on_time_result(self):
+        on_time = simulate(latency=0, jitter=0, ticks=self.TICKS)
+        for latency, jitter in self.CONDITIONS:
+            with self.subTest(latency=latency, jitter=jitter):
+                simulation = simulate(latency, jitter, ticks=self.TICKS)
+                self.assertEqual(simulation.state, on_time.state)
+                # a paddle can only have moved the other way while its input was late
+                for correction in simulation.corrections:
+                    self.assertLessEqual(correction.paddle, 2 * PADDLE_SPEED * correction.late + 1e-9)
+                self.assertGreater(max(simulation.divergence), 0.0)
+                self.assertEqual(set(simulation.divergence[simulation.last_arrival:]), {0.0})
+
+
+class MalformedInputTests(SimpleTestCase):
+    GARBAGE = ('x', None, [1], {'up': 1}, '1.5', float('nan'), float('inf'))
+
+    def consumer(self, match):
+        consumer = GameConsumer()
+        consumer.side = PLAYER1
+        consumer.session = SimpleNamespace(match=match)
+        consumer.encoder = SnapshotEncoder()
+        return consumer
+
+    def test_garbage_directions_are_dropped(self):
+        match = PongMatch(points_to_win=3, seed=0)
+        match.started = True
+        consumer = self.consumer(match)
+        for seq, direction in enumerate(self.GARBAGE, start=1):
+            with self.subTest(direction=direction):
+                async_to_sync(consumer.receive)(json.dumps({'dir': direction}))
+                async_to_sync(consumer.receive)(json.dumps({'dir': direction, 'tick': match.tick, 'seq': seq}))
+                match.step()
+        self.assertEqual(match.inputs, [0, 0])
+        # a dropped input does not use up its sequence number
+        self.assertEqual(match.acked_seq, [0, 0])
+
+    def test_directions_are_clamped_on_arrival(self):
+        match = PongMatch(seed=0)
+        match.set_input(PLAYER1, 5)
+        match.apply_input(PLAYER2, '-3', match.tick + 1, 1)
+        self.assertEqual(match.scheduled_inputs[1], [(PLAYER1, 1), (PLAYER2, -1)])
+        for direction in self.GARBAGE:
+            with self.subTest(direction=direction), self.assertRaises(ValueError):
+                match.set_input(PLAYER1, direction)
+
+
+class AIPoolTests(SimpleTestCase):
+    def matches(self, count):
+        matches = [PongMatch(points_to_win=3, seed=number) for number in range(count)]
+        for match in matches:
+            match.started = True
+        return matches
+
+    def test_ai_wins_against_an_idle_player(self):
+        pool = AIPool(error=0.0, seed=0)
+        matches = self.matches(20)
+        for match in matches:
+            pool.add(match)
+        for _ in range(20000):
+            pool.think()
+            for match in matches:
+                match.step()
+        self.assertEqual({match.winner for match in matches}, {PLAYER2})
+
+    def test_batch_plays_each_match_as_if_alone(self):
+        # one pool for all matches, with matches leaving and joining, has
+        # to steer exactly like a pool per match
+        shared = AIPool(error=0.0)
+        matches, alone = self.matches(6), self.matches(6)
+        pools = [AIPool(error=0.0) for _ in alone]
+        for match, pool, single in zip(matches, pools, alone):
+            shared.add(match)
+            pool.add(single)
+        for tick in range(900):
+            if tick == 300:
+                shared.remove(matches[1])
+                pools[1].remove(alone[1])
+            if tick == 500:
+                shared.add(matches[1])
+                pools[1].add(alone[1])
+            shared.think()
+            for pool in pools:
+                pool.think()
+            for match, single in zip(matches, alone):
+                match.step()
+                single.step()
+        for match, single in zip(matches, alone):
+            self.assertEqual(match.save_state(), single.save_state())
+
+
+class PongPageTests(TestCase):
+    def setUp(self):
+        self.host = User.objects.create_user(username='host', email='host@example.com', password='x')
+        self.room = Room.objects.create(host=self.host, name='pong', opponent_type='AI')
+        self.client.force_login(self.host)
+
+    def test_page_plays_through_the_game_socket(self):
+        response = self.client.get(reverse('pong', args=[self.room.id]))
+        self.assertContains(response, f'/ws/game/{self.room.id}')
+
+    def test_clients_cannot_post_a_result(self):
+        response = self.client.post(reverse('pong', args=[self.room.id]), {'winner': 'host'})
+        self.assertEqual(response.status_code, 405)
+        self.room.refresh_from_db()
+        self.assertFalse(self.room.is_expired)
+
+
+class RecordResultTests(TransactionTestCase):
+    def setUp(self):
+        self.host, self.guest = (
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='x')
+            for name in ('host', 'guest')
+        )
+        self.room = Room.objects.create(host=self.host, name='match', opponent_type='vs Player')
+        match = PongMatch(points_to_win=3)
+        match.scores, match.winner = [3, 1], PLAYER1
+        self.session = GameSession(self.room.id, self.room.id, match, 'vs Player')
+        self.session.players = [self.host.id, self.guest.id]
+
+    def test_result_is_recorded_and_rated_once(self):
+        server = GameServer()
+        # a second recorder, another worker or a retry, finds the room claimed
+        async_to_sync(server.record_result)(self.session)
+        async_to_sync(server.record_result)(self.session)
+
+        self.room.refresh_from_db()
+        self.assertTrue(self.room.is_expired)
+        self.assertEqual(self.room.won_by_user_id, self.host.id)
+        winner, loser = PlayerStats.objects.get(pk=self.host.id), PlayerStats.objects.get(pk=self.guest.id)
+        self.assertEqual((winner.wins, winner.points_for, loser.losses), (1, 3, 1))
+
+    def test_expired_room_is_not_rated(self):
+        Room.objects.filter(pk=self.room.pk).update(is_expired=True)
+        async_to_sync(GameServer().record_result)(self.session)
+        self.assertFalse(PlayerStats.objects.exists())
@@ -0,0 +1,30 @@
+from django.db.models import Sum
+from django.test import TestCase
+
+from base.leaderboard import rank_of, record_game
+from base.models import PlayerStats, RatingBucket, User
+
+
+class RatingBucketTests(TestCase):
+    def setUp(self):
+        self.players = [
+            User.objects.create_user(username=f'player{number}', email=f'player{number}@example.com', password='x')
+            for number in range(3)
+        ]
+        record_game(self.players[0].id, self.players[1].id)
+        record_game(self.players[0].id, self.players[2].id)
+
+    def assertBucketsCountEveryPlayer(self):
+        counted = RatingBucket.objects.aggregate(players=Sum('players'))['players']
+        self.assertEqual(counted, PlayerStats.objects.count())
+
+    def test_deleted_player_leaves_their_bucket(self):
+        # player 2 lost to a higher rated winner, so lost less rating
+        self.assertEqual(rank_of(self.players[1].id), 3)
+        self.players[0].delete()
+        self.assertBucketsCountEveryPlayer()
+        self.assertEqual(rank_of(self.players[1].id), 2)
+
+        PlayerStats.objects.get(pk=self.players[2].id).delete()
+        self.assertBucketsCountEveryPlayer()
+        self.assertEqual(rank_of(self.players[1].id), 1)
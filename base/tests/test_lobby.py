@@ -0,0 +1,40 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from base.lobby import create_room_chat, lobby_snapshot
+from base.models import OpenLobby, Room, User
+
+
+class OpenLobbyTests(TestCase):
+    def setUp(self):
+        self.host = User.objects.create_user(username='host', email='host@example.com', password='x')
+        self.guest = User.objects.create_user(username='guest', email='guest@example.com', password='x')
+        self.room = Room.objects.create(host=self.host, name='lobby', opponent_type='vs Player')
+        self.room.participants.set([self.host, self.guest])
+        create_room_chat(self.room, [self.host, self.guest])
+
+    def lobby(self):
+        return OpenLobby.objects.get(room=self.room)
+
+    def test_ready_guest_makes_the_lobby_ready(self):
+        self.assertFalse(self.lobby().is_ready)
+        self.client.force_login(self.guest)
+        self.client.post(reverse('room', args=[self.room.id]), {'action': 'ready'})
+        self.assertTrue(self.lobby().is_ready)
+        self.room.refresh_from_db()
+        self.assertEqual(lobby_snapshot(self.room)['room']['opp_ready'], True)
+        self.assertNotIn('host_ready', lobby_snapshot(self.room)['room'])
+
+    def test_leaving_every_room_updates_the_counts(self):
+        other = Room.objects.create(host=self.host, name='other', opponent_type='vs Player')
+        other.participants.add(self.guest)
+        self.guest.participants.clear()
+        self.assertEqual(self.lobby().participant_count, 1)
+        self.assertEqual(OpenLobby.objects.get(room=other).participant_count, 0)
+
+    def test_deleted_host_leaves_the_lobby(self):
+        self.host.delete()
+        lobby = self.lobby()
+        self.assertIsNone(lobby.host_id)
+        self.assertEqual(lobby.host_username, '')
+        self.assertEqual(lobby.participant_count, 1)
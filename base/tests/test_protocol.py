@@ -0,0 +1,111 @@
+import json
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+
+from base.consumers import GameConsumer
+from base.game.engine import PLAYER1, PongMatch
+from base.game.protocol import DELTA, FULL, MAX_UINT32, SCALE, SnapshotDecoder, SnapshotEncoder, _full
+
+
+def expected(snapshot, input_ack=0):
+    """What the decoder returns for a snapshot: positions to the millimetre."""
+    tick, *positions, score1, score2 = snapshot
+    return [tick, *(round(value * SCALE) / SCALE for value in positions), score1, score2, input_ack]
+
+
+class SnapshotProtocolTests(SimpleTestCase):
+    def test_full_frame_size(self):
+        self.assertEqual(_full.size, 21)
+
+    def test_full_round_trip(self):
+        snapshot = [7, 1.2345, -0.5, 1.25, -1.25, 3, 4]
+        frame = SnapshotEncoder().encode(snapshot, input_ack=9)
+        self.assertEqual(frame[0], FULL)
+        self.assertEqual(len(frame), _full.size)
+        self.assertEqual(SnapshotDecoder().decode(frame), expected(snapshot, 9))
+
+    def test_scores_above_255(self):
+        snapshot = [1, 0.0, 0.0, 0.0, 0.0, 300, 65535]
+        frame = SnapshotEncoder().encode(snapshot)
+        self.assertEqual(SnapshotDecoder().decode(frame)[5:7], [300, 65535])
+
+    def test_deltas_against_the_acked_base(self):
+        match = PongMatch(points_to_win=1000, seed=3)
+        match.started = True
+        encoder, decoder = SnapshotEncoder(), SnapshotDecoder()
+        kinds = set()
+        for tick in range(300):
+            match.set_input(0, (tick // 20) % 3 - 1)
+            match.step()
+            snapshot = match.snapshot()
+            frame = encoder.encode(snapshot, input_ack=tick)
+            kinds.add(frame[0])
+            self.assertEqual(decoder.decode(frame), expected(snapshot, tick))
+            # the client acks every other frame, the rest are "lost" acks
+            if tick % 2 == 0:
+                encoder.ack(snapshot[0])
+        self.assertEqual(kinds, {FULL, DELTA})
+
+    def test_delta_survives_lost_frames(self):
+        encoder, decoder = SnapshotEncoder(), SnapshotDecoder()
+        base = [1, 0.0, 0.0, 0.0, 0.0, 0, 0]
+        decoder.decode(encoder.encode(base))
+        encoder.ack(1)
+        encoder.encode([2, 0.1, 0.0, 0.0, 0.0, 0, 0])  # never reaches the client
+        frame = encoder.encode([3, 0.2, 0.1, 0.0, 0.0, 1, 0])
+        self.assertEqual(frame[0], DELTA)
+        self.assertLess(len(frame), _full.size)
+        self.assertEqual(decoder.decode(frame), [3, 0.2, 0.1, 0.0, 0.0, 1, 0, 0])
+
+    def test_full_frame_when_the_base_is_too_old(self):
+        encoder = SnapshotEncoder()
+        encoder.encode([1, 0.0, 0.0, 0.0, 0.0, 0, 0])
+        encoder.ack(1)
+        self.assertEqual(encoder.encode([200, 0.0, 0.0, 0.0, 0.0, 0, 0])[0], FULL)
+
+
+class MalformedFrameTests(SimpleTestCase):
+    FRAMES = (
+        'not json', '[1, 2]', '"dir"', '{"ack": "7"}', '{"ack": [7]}', '{"ack": -1}',
+        '{"dir": 1, "seq": 1}', '{"dir": 1, "tick": "x", "seq": 1}', '{"dir": 1, "tick": 1, "seq": null}',
+        '{"dir": 1, "tick": 1, "seq": -1}', '{"dir": 1, "tick": 1, "seq": 4294967296}',
+        '{"dir": 1, "tick": 1.5, "seq": 1}', '{"dir": 1, "tick": true, "seq": 1}',
+    )
+
+    def setUp(self):
+        self.match = PongMatch(points_to_win=1000, seed=0)
+        self.match.started = True
+        self.consumer = GameConsumer()
+        self.consumer.side = PLAYER1
+        self.consumer.session = SimpleNamespace(match=self.match)
+        self.consumer.encoder = SnapshotEncoder()
+
+    def receive(self, **frame):
+        async_to_sync(self.consumer.receive)(**frame)
+
+    def test_malformed_frames_are_dropped(self):
+        for frame in self.FRAMES:
+            with self.subTest(frame=frame):
+                self.receive(text_data=frame)
+        self.receive(bytes_data=b'\x01')
+        self.assertEqual(self.match.acked_seq, [0, 0])
+        self.assertEqual(self.match.scheduled_inputs, {})
+        self.assertIsNone(self.consumer.encoder.base)
+        # the match and its snapshots go on
+        self.match.step()
+        self.consumer.encoder.encode(self.match.snapshot(), self.match.acked_seq[PLAYER1])
+
+    def test_sequence_numbers_fit_the_input_ack(self):
+        self.receive(text_data=json.dumps({'dir': 1, 'tick': 1, 'seq': MAX_UINT32}))
+        self.assertEqual(self.match.acked_seq[PLAYER1], MAX_UINT32)
+        frame = self.consumer.encoder.encode(self.match.snapshot(), self.match.acked_seq[PLAYER1])
+        self.assertEqual(SnapshotDecoder().decode(frame)[-1], MAX_UINT32)
+
+    def test_sequence_numbers_only_increase(self):
+        self.receive(text_data=json.dumps({'dir': 1, 'tick': 1, 'seq': 5}))
+        self.receive(text_data=json.dumps({'dir': -1, 'tick': 1, 'seq': 5}))
+        self.receive(text_data=json.dumps({'dir': -1, 'tick': 1, 'seq': 4}))
+        self.assertEqual(self.match.acked_seq[PLAYER1], 5)
+        self.assertEqual(self.match.scheduled_inputs[1], [(PLAYER1, 1)])
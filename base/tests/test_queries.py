@@ -0,0 +1,86 @@
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from base.consumers import build_message_event, render_online_count
+from base.models import ChatGroup, GroupMessage, Room, User
+
+
+class PageQueryCountTests(TestCase):
+    """
+    Each page, and each fragment the consumers send, costs the same number
+    of queries whatever the number of messages, members and rooms it shows.
+    The counts are of a cold render: the caches are cleared before every
+    request.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='x')
+        self.public = ChatGroup.objects.create(group_name='public-chat')
+        self.room = Room.objects.create(host=self.user, name='lobby', opponent_type='vs Player')
+        self.room.participants.add(self.user)
+        self.room_chat = ChatGroup.objects.create(group_name='lobby-chat', groupchat_name='lobby-chat', room=self.room)
+        self.private = ChatGroup.objects.create(group_name='private', is_private=True)
+        for group in (self.public, self.room_chat, self.private):
+            group.members.add(self.user)
+        self.user.group_chats.add(self.public, self.private)
+        self.client.force_login(self.user)
+        self.grow(3)
+
+    def grow(self, count):
+        """Add `count` members, rooms and messages (some invitations) to every chat."""
+        start = User.objects.count()
+        for number in range(start, start + count):
+            member = User.objects.create_user(username=f'member{number}', email=f'member{number}@example.com', password='x')
+            room = Room.objects.create(host=member, name=f'room{number}', opponent_type='vs Player')
+            room.participants.add(member)
+            for group in (self.public, self.room_chat, self.private):
+                group.members.add(member)
+                GroupMessage.objects.create(
+                    group=group, author=member, body=f'message {number}',
+                    is_invitation=number % 3 == 0, room=room,
+                )
+
+    def assertBounded(self, url, queries):
+        for _ in range(2):
+            for cache in caches.all():
+                cache.clear()
+            self.client.force_login(self.user)
+            with self.assertNumQueries(queries):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.grow(9)
+
+    def test_home(self):
+        self.assertBounded(reverse('home'), 6)
+
+    def test_room(self):
+        self.assertBounded(reverse('room', args=[self.room.id]), 8)
+
+    def test_chat_group_detail(self):
+        self.assertBounded(reverse('chat_group_detail', args=[self.private.id]), 3)
+
+    def test_chat_history(self):
+        self.assertBounded(reverse('chat-history', args=[self.public.group_name]), 3)
+
+    def assertBoundedCall(self, prepare, call, queries):
+        for _ in range(2):
+            for cache in caches.all():
+                cache.clear()
+            argument = prepare()
+            with self.assertNumQueries(queries):
+                call(argument)
+            self.grow(9)
+
+    def test_build_message_event(self):
+        # as the views send it, with the author and group they already hold
+        self.assertBoundedCall(
+            lambda: GroupMessage.objects.create(group=self.private, author=self.user, body='hello'),
+            build_message_event, 0,
+        )
+
+    def test_render_online_count(self):
+        self.assertBoundedCall(
+            lambda: list(self.public.members.values_list('id', flat=True)),
+            lambda online_user_ids: render_online_count(self.public.group_name, online_user_ids), 3,
+        )
@@ -0,0 +1,184 @@
+"""
+Cross-worker behaviour of the studybud.settings_redis profile.
+
+The "workers" here are not separate Daphne processes: each is a set of
+in-process objects, the channel layer, caches and presence store that a
+worker started with the profile would build, all talking to the same
+fakeredis server instead of a real one. What they share is only what
+passes through that server, as it would be between real workers.
+
+fakeredis comes with requirements-dev.txt.
+"""
+
+import asyncio
+import importlib
+import os
+import time
+from unittest import mock
+
+import fakeredis
+from django.test import SimpleTestCase
+from django.utils.module_loading import import_string
+from fakeredis.aioredis import FakeConnection
+
+from base import fragments, notifications, versions
+from base.presence import RedisPresence
+
+
+WORKERS = 3
+
+
+def load_profile(**environ):
+    with mock.patch.dict(os.environ, environ):
+        from studybud import settings_redis
+        return importlib.reload(settings_redis)
+
+
+class Worker:
+    """What one worker process of the profile holds, built here and pointed at fake servers."""
+
+    def __init__(self, profile, servers):
+        # one fake server per configured host, in order
+        self.servers = dict(zip(profile.REDIS_HOSTS, servers))
+
+        config = profile.CHANNEL_LAYERS['default']
+        hosts = [{'connection_class': FakeConnection, 'server': self.servers[url]} for url in profile.REDIS_HOSTS]
+        self.layer = import_string(config['BACKEND'])(**{**config['CONFIG'], 'hosts': hosts})
+
+        self.caches = {}
+        for alias, cache_config in profile.CACHES.items():
+            options = dict(cache_config['OPTIONS'], CONNECTION_POOL_KWARGS={
+                'connection_class': fakeredis.FakeConnection,
+                'server': self.servers[profile.REDIS_CACHE_URL],
+            })
+            params = {**cache_config, 'OPTIONS': options}
+            self.caches[alias] = import_string(cache_config['BACKEND'])(cache_config['LOCATION'], params)
+
+        self.presence = RedisPresence(**profile.PRESENCE['OPTIONS'])
+        self.presence.client = fakeredis.FakeRedis(server=self.servers[profile.PRESENCE['OPTIONS']['url']])
+
+    def run(self, func, *args):
+        """Call func with this worker's caches in place of the process-wide ones."""
+        with mock.patch.object(versions, 'cache', self.caches['versions']), \
+                mock.patch.object(notifications, 'cache', self.caches['default']), \
+                mock.patch.object(fragments, 'caches', self.caches):
+            return func(*args)
+
+
+class CrossWorkerTests(SimpleTestCase):
+    def workers(self, hosts=1, **environ):
+        profile = load_profile(**environ)
+        servers = [fakeredis.FakeServer() for _ in range(hosts)]
+        return [Worker(profile, servers) for _ in range(WORKERS)]
+
+    async def join_group(self, workers, group):
+        channels = []
+        for worker in workers:
+            channel = await worker.layer.new_channel()
+            await worker.layer.group_add(group, channel)
+            channels.append(channel)
+        # the Pub/Sub layer subscribes in the background
+        await asyncio.sleep(0.05)
+        return channels
+
+    async def flush(self, workers):
+        for worker in workers:
+            await worker.layer.flush()
+
+    async def test_group_send_reaches_every_worker(self):
+        for backend in ('core', 'pubsub'):
+            with self.subTest(backend=backend):
+                workers = self.workers(CHANNEL_LAYER_BACKEND=backend)
+                channels = await self.join_group(workers, 'chatroom-test')
+                try:
+                    await workers[0].layer.group_send('chatroom-test', {'type': 'message_handler', 'html': '<p>hi</p>'})
+                    for worker, channel in zip(workers, channels):
+                        message = await asyncio.wait_for(worker.layer.receive(channel), 2)
+                        self.assertEqual(message['html'], '<p>hi</p>')
+                finally:
+                    await self.flush(workers)
+
+    async def test_groups_sharded_across_hosts(self):
+        workers = self.workers(hosts=2, REDIS_URL='redis://one:6379/0,redis://two:6379/0')
+        layer, servers = workers[0].layer, list(workers[0].servers.values())
+        # enough groups that both hosts hold some
+        groups, shards = [], set()
+        for number in range(1000):
+            group = f'chatroom-{number}'
+            if layer.consistent_hash(group) not in shards or len(groups) < 8:
+                groups.append(group)
+                shards.add(layer.consistent_hash(group))
+            if len(shards) == len(servers) and len(groups) >= 8:
+                break
+        self.assertEqual(len(shards), len(servers))
+
+        channels = {group: await self.join_group(workers, group) for group in groups}
+        try:
+            for number, group in enumerate(groups):
+                await workers[number % WORKERS].layer.group_send(group, {'type': 'message_handler', 'group': group})
+            for group in groups:
+                for worker, channel in zip(workers, channels[group]):
+                    message = await asyncio.wait_for(worker.layer.receive(channel), 2)
+                    self.assertEqual(message['group'], group)
+            # each group lives on the host its name hashes to
+            for group in groups:
+                client = fakeredis.FakeRedis(server=servers[layer.consistent_hash(group)])
+                self.assertTrue(client.exists(layer._group_key(group)))
+        finally:
+            await self.flush(workers)
+
+    async def test_fan_out_throughput(self):
+        workers = self.workers()
+        channels = await self.join_group(workers, 'chatroom-load')
+        count = 200
+
+        async def drain(worker, channel):
+            return [(await worker.layer.receive(channel))['number'] for _ in range(count)]
+
+        try:
+            started = time.perf_counter()
+            receivers = [asyncio.ensure_future(drain(worker, channel)) for worker, channel in zip(workers, channels)]
+            for number in range(count):
+                await workers[number % WORKERS].layer.group_send('chatroom-load', {'type': 'message_handler', 'number': number})
+            received = await asyncio.wait_for(asyncio.gather(*receivers), 30)
+            elapsed = time.perf_counter() - started
+        finally:
+            await self.flush(workers)
+
+        for numbers in received:
+            self.assertEqual(numbers, list(range(count)))
+        # fakeredis runs Lua in process and manages a few hundred a second;
+        # this only catches a delivery path that became pathologically slow
+        self.assertGreater(count / elapsed, 20)
+
+    def test_version_tokens_are_shared(self):
+        first, second = self.workers()[:2]
+        before = second.run(versions.get_versions, 'room:1')
+        first.run(versions.bump_version, 'room:1')
+        after = second.run(versions.get_versions, 'room:1')
+        self.assertNotEqual(before, after)
+        self.assertEqual(after, first.run(versions.get_versions, 'room:1'))
+
+    def test_unread_counters_are_shared(self):
+        first, second = self.workers()[:2]
+        key = notifications.unread_count_cache_key(1)
+        first.run(lambda: notifications.cache.set(key, 2))
+        self.assertEqual(second.run(lambda: notifications.cache.incr(key)), 3)
+        first.run(notifications.invalidate_unread_count, 1)
+        self.assertIsNone(second.run(lambda: notifications.cache.get(key)))
+
+    def test_fragment_invalidation_is_shared(self):
+        first, second = self.workers()[:2]
+        key = fragments.message_fragment_key(7, 'chat', 'other')
+        first.run(lambda: fragments.caches[fragments.FRAGMENT_CACHE].set(key, ('signature', '<p>old</p>')))
+        second.run(fragments.invalidate_message_fragments, 7)
+        self.assertIsNone(first.run(lambda: fragments.caches[fragments.FRAGMENT_CACHE].get(key)))
+
+    def test_presence_is_shared(self):
+        first, second = self.workers()[:2]
+        self.assertTrue(first.presence.join('chatroom-test', 'channel-a', 1))
+        # the same user on another worker is already online
+        self.assertFalse(second.presence.join('chatroom-test', 'channel-b', 1))
+        self.assertEqual(second.presence.online_users('chatroom-test'), {1})
+        self.assertFalse(first.presence.leave('chatroom-test', 'channel-a'))
+        self.assertTrue(second.presence.leave('chatroom-test', 'channel-b'))
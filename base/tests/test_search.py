@@ -0,0 +1,34 @@
+from django.test import TestCase
+from django.urls import reverse
+
+from base.models import ChatGroup, GroupMessage, Room, User
+from base.search import search_room_ids
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='viewer', email='viewer@example.com', password='x')
+        self.client.force_login(self.user)
+        self.public = ChatGroup.objects.create(group_name='public-chat')
+
+    def test_open_lobbies_are_filtered_before_the_limit(self):
+        for number in range(5):
+            Room.objects.create(host=self.user, name=f'finished match {number}', is_expired=True)
+        room = Room.objects.create(host=self.user, name='open match')
+
+        self.assertEqual(len(search_room_ids('match', limit=3)), 3)
+        self.assertEqual(search_room_ids('match', limit=3, open_only=True), [room.id])
+
+        response = self.client.get(reverse('home'), {'q': 'match'})
+        self.assertEqual([lobby.room_id for lobby in response.context['rooms']], [room.id])
+
+    def test_chat_search(self):
+        GroupMessage.objects.create(group=self.public, author=self.user, body='good game')
+        GroupMessage.objects.create(group=self.public, author=self.user, body='rematch?')
+        url = reverse('chat-search', args=[self.public.group_name])
+
+        self.assertContains(self.client.get(reverse('home')), url)
+        response = self.client.get(url, {'q': 'gam'})
+        self.assertContains(response, 'good game')
+        self.assertNotContains(response, 'rematch?')
+        self.assertNotContains(self.client.get(url, {'q': ''}), 'No messages match')
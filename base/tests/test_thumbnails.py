@@ -0,0 +1,77 @@
+import io
+import os
+import shutil
+import tempfile
+from unittest import mock
+
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from base.models import User
+from base.thumbnails import VARIANT_CACHE, _save_variant, generate_variants, get_variants, variant_name
+
+
+def png(color):
+    buffer = io.BytesIO()
+    Image.new('RGB', (400, 300), color).save(buffer, 'PNG')
+    return ContentFile(buffer.getvalue())
+
+
+class VariantFilesTests(TestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        caches[VARIANT_CACHE].clear()
+
+    def files(self):
+        return sorted(
+            os.path.relpath(os.path.join(root, name), self.media)
+            for root, _, names in os.walk(os.path.join(self.media, 'variants')) for name in names
+        )
+
+    def test_a_variant_keeps_its_name(self):
+        name = default_storage.save('red.png', png('red'))
+        record = generate_variants(name)
+        before = self.files()
+        path = variant_name(record['digest'], 80, 'webp')
+        # a second worker writing the same variant
+        _save_variant(default_storage, path, b'same variant')
+        self.assertEqual(self.files(), before)
+
+    def test_cleanup_deletes_unused_variants(self):
+        kept = default_storage.save('red.png', png('red'))
+        User.objects.create_user(username='red', email='red@example.com', password='x', avatar=kept)
+        removed = default_storage.save('blue.png', png('blue'))
+        kept_digest = generate_variants(kept)['digest']
+        removed_digest = generate_variants(removed)['digest']
+        default_storage.delete(removed)
+
+        call_command('cleanup_variants', stdout=io.StringIO())
+        self.assertIn(removed_digest, ''.join(self.files()))
+
+        call_command('cleanup_variants', min_age=0, dry_run=True, stdout=io.StringIO())
+        self.assertIn(removed_digest, ''.join(self.files()))
+
+        caches[VARIANT_CACHE].clear()
+        call_command('cleanup_variants', min_age=0, stdout=io.StringIO())
+        files = self.files()
+        self.assertEqual(len(files), 6)
+        self.assertTrue(all(kept_digest in path for path in files))
+
+    def test_replaced_avatar_is_forgotten(self):
+        old = default_storage.save('red.png', png('red'))
+        user = User.objects.create_user(username='red', email='red@example.com', password='x', avatar=old)
+        generate_variants(old)
+        user.avatar = default_storage.save('blue.png', png('blue'))
+        # only django-cleanup's callback: no background variants of the new one
+        with mock.patch('base.signals.schedule_variants'), self.captureOnCommitCallbacks(execute=True):
+            user.save()
+        self.assertFalse(default_storage.exists(old))
+        self.assertIsNone(get_variants(old)[old])
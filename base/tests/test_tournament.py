@@ -0,0 +1,64 @@
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from base.game.engine import PLAYER2, PongMatch
+from base.game.scheduler import match_outcome
+from base.game.server import GameSession
+from base.models import Match, Room, User
+
+
+def session(*players, scores=(0, 0), joined=False):
+    game = GameSession(('match', 1), 1, PongMatch(points_to_win=3), 'Tournament', seats=[10, 20])
+    game.players = list(players)
+    game.match.scores = list(scores)
+    if joined:
+        game.joined.set()
+    return game
+
+
+class MatchOutcomeTests(SimpleTestCase):
+    def test_double_no_show_is_void(self):
+        self.assertIsNone(match_outcome(session(None, None)))
+
+    def test_no_show_forfeits(self):
+        self.assertEqual(match_outcome(session(None, 20)), (0, 3, 20))
+        self.assertEqual(match_outcome(session(10, None)), (3, 0, 10))
+
+    def test_played_game(self):
+        game = session(10, 20, scores=(1, 3), joined=True)
+        game.match.winner = PLAYER2
+        self.assertEqual(match_outcome(game), (1, 3, 20))
+        # stopped at the time limit: whoever leads
+        self.assertEqual(match_outcome(session(10, 20, scores=(2, 1), joined=True)), (2, 1, 10))
+        self.assertEqual(match_outcome(session(10, 20, scores=(1, 1), joined=True))[2], 10)
+
+
+class TournamentPongPageTests(TestCase):
+    def setUp(self):
+        self.host, self.guest = (
+            User.objects.create_user(username=name, email=f'{name}@example.com', password='x')
+            for name in ('host', 'guest')
+        )
+        self.room = Room.objects.create(host=self.host, name='cup', opponent_type='Tournament')
+        self.url = reverse('pong', args=[self.room.id])
+        self.client.force_login(self.guest)
+
+    def test_players_join_their_match_socket(self):
+        match = Match.objects.create(room=self.room, player1=self.host, player2=self.guest, round='Final')
+        response = self.client.get(self.url)
+        self.assertContains(response, f'/ws/game/match/{match.id}')
+        self.assertNotContains(response, f'/ws/game/{self.room.id}"')
+
+    def test_without_a_match_back_to_the_bracket(self):
+        Match.objects.create(room=self.room, player1=self.host, player2=None, round='Final')
+        self.assertRedirects(
+            self.client.get(self.url), reverse('tournament_view', args=[self.room.id]),
+            fetch_redirect_response=False,
+        )
+
+    def test_clients_cannot_post_a_result(self):
+        match = Match.objects.create(room=self.room, player1=self.host, player2=self.guest, round='Final')
+        response = self.client.post(self.url, {'winner': 'guest'})
+        self.assertEqual(response.status_code, 405)
+        match.refresh_from_db()
+        self.assertFalse(match.is_completed)
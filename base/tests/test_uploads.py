@@ -0,0 +1,159 @@
+import os
+import shutil
+import tempfile
+import tracemalloc
+
+from asgiref.sync import async_to_sync
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+
+from base.management.commands.bench_uploads import StreamedUpload, post_concurrently, post_upload, session_cookie
+from base.models import ChatGroup, GroupMessage, StoredFile, User
+from base.uploads import UPLOAD_OVERHEAD, UploadLimitMiddleware, chat_file_storage
+
+
+@override_settings(CHAT_UPLOAD_MAX_SIZE=1024)
+class UploadLimitMiddlewareTests(SimpleTestCase):
+    def request(self, length, body=b''):
+        called = []
+
+        async def app(scope, receive, send):
+            called.append(await receive())
+
+        async def receive():
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http', 'path': reverse('chat-file-upload', args=['public-chat']),
+            'headers': [(b'content-length', str(length).encode())],
+        }
+        async_to_sync(UploadLimitMiddleware(app))(scope, receive, send)
+        return called, sent
+
+    def test_declared_oversize_is_refused_unread(self):
+        called, sent = self.request(1024 + UPLOAD_OVERHEAD + 1)
+        self.assertEqual(called, [])
+        self.assertEqual(sent[0]['status'], 413)
+
+    def test_body_longer_than_declared_is_dropped(self):
+        called, sent = self.request(10, body=b'x' * (1024 + UPLOAD_OVERHEAD + 1))
+        self.assertEqual(called, [{'type': 'http.disconnect'}])
+
+    def test_within_the_limit(self):
+        called, sent = self.request(10, body=b'x' * 10)
+        self.assertEqual(called[0]['body'], b'x' * 10)
+        self.assertEqual(sent, [])
+
+
+class ChatFileTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        settings = override_settings(MEDIA_ROOT=media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        # no avatar, whose variants a thread would generate past the media root
+        self.user = User.objects.create_user(username='sender', email='sender@example.com', password='x', avatar=None)
+        self.group = ChatGroup.objects.create(group_name='public-chat')
+        self.url = reverse('chat-file-upload', args=[self.group.group_name])
+        self.client.force_login(self.user)
+
+    def upload(self, content, name='notes.txt'):
+        return self.client.post(
+            self.url, {'file': SimpleUploadedFile(name, content)}, HTTP_HX_REQUEST='true',
+        )
+
+    @override_settings(CHAT_UPLOAD_MAX_SIZE=1024)
+    def test_upload_stops_past_the_limit(self):
+        response = self.upload(b'x' * 4096)
+        self.assertEqual(response.status_code, 413)
+        self.assertFalse(GroupMessage.objects.exists())
+
+        self.assertEqual(self.upload(b'x' * 1024).status_code, 200)
+        self.assertEqual(GroupMessage.objects.count(), 1)
+
+    def test_same_content_is_stored_once(self):
+        self.upload(b'same content')
+        self.upload(b'same content', name='copy.TXT')
+        first, second = GroupMessage.objects.order_by('id')
+        # the extension is lowercased as part of the name
+        self.assertEqual(first.file.name, second.file.name)
+        self.assertRegex(first.file.name, r'^files/[0-9a-f]{2}/[0-9a-f]{64}\.txt$')
+        self.assertEqual(StoredFile.objects.get().references, 2)
+
+        self.upload(b'other content')
+        self.assertEqual(StoredFile.objects.count(), 2)
+
+    def test_file_goes_with_its_last_reference(self):
+        self.upload(b'same content')
+        self.upload(b'same content')
+        first, second = GroupMessage.objects.order_by('id')
+        name = first.file.name
+
+        with self.captureOnCommitCallbacks(execute=True):
+            first.delete()
+        self.assertTrue(chat_file_storage().exists(name))
+        self.assertEqual(StoredFile.objects.get(name=name).references, 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            second.delete()
+        self.assertFalse(chat_file_storage().exists(name))
+        self.assertFalse(StoredFile.objects.exists())
+
+    def test_files_without_a_row_are_deleted(self):
+        # stored before reference counting
+        name = chat_file_storage().save('files/old.txt', ContentFile(b'old'))
+        StoredFile.objects.filter(name=name).delete()
+        chat_file_storage().delete(name)
+        self.assertFalse(chat_file_storage().exists(name))
+
+
+class ConcurrentUploadTests(TransactionTestCase):
+    """
+    Uploads streamed through the WSGI handler from threads at once, as by
+    manage.py bench_uploads, which also reports the disk and memory figures.
+    """
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media)
+        settings = override_settings(MEDIA_ROOT=self.media)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        user = User.objects.create_user(username='sender', email='sender@example.com', password='x', avatar=None)
+        self.session = session_cookie(user)
+
+    def files(self):
+        return [name for _, _, names in os.walk(self.media) for name in names]
+
+    def test_identical_uploads_are_stored_once(self):
+        uploads = [
+            (self.session, ChatGroup.objects.create(group_name=f'chat-{number}').group_name, StreamedUpload(256 * 1024))
+            for number in range(8)
+        ]
+        self.assertEqual(post_concurrently(uploads), [200] * 8)
+
+        stored = StoredFile.objects.get()
+        self.assertEqual(stored.references, 8)
+        self.assertEqual(set(GroupMessage.objects.values_list('file', flat=True)), {stored.name})
+        self.assertEqual(len(self.files()), 1)
+
+    def test_large_upload_is_not_held_in_memory(self):
+        group = ChatGroup.objects.create(group_name='chat')
+        size = 8 * 1024 * 1024
+        tracemalloc.start()
+        try:
+            status = post_upload(self.session, group.group_name, StreamedUpload(size))
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        self.assertEqual(status, 200)
+        self.assertEqual(GroupMessage.objects.get().file.size, size)
+        self.assertLess(peak, size / 8)
@@ -0,0 +1,193 @@
+"""
+Resized variants of avatars and chat images.
+
+Originals are kept as uploaded. For every raster image a worker thread
+writes WebP and JPEG copies at each of VARIANT_WIDTHS narrower than the
+original, named after the SHA-256 of the original's content:
+
+    variants/<digest[:2]>/<digest>-<width>.webp
+
+so the same picture uploaded twice shares its variants. What was written
+for a stored file is recorded in the "variants" cache alias under the file
+name, and the tags in base.templatetags.media_tags read only that record:
+picking a variant never touches the disk.
+
+A file with no record yet is served as the original while its variants
+are generated off the request path. Variants already on disk are not
+encoded again, so an emptied cache refills by hashing each original once.
+A variant is only ever stored under its own name: when two workers write
+it at once, the copy that lost the race is dropped.
+
+Since originals share variants, removing an original only forgets its
+record (see base.signals). The files of digests no original uses any more
+are deleted by manage.py cleanup_variants.
+"""
+
+import hashlib
+import io
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.cache import caches
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps
+
+
+VARIANT_CACHE = 'variants'
+# Avatars are shown at up to 40px and chat images at up to 288px, so these
+# cover both at 1x and 2x.
+VARIANT_WIDTHS = (80, 160, 320, 640)
+# (extension, Pillow format, MIME type), the first is preferred
+VARIANT_FORMATS = (
+    ('webp', 'WEBP', 'image/webp'),
+    ('jpg', 'JPEG', 'image/jpeg'),
+)
+QUALITY = 80
+WORKERS = 2
+
+logger = logging.getLogger(__name__)
+
+# Image bytes referenced by rendered pages, served by views.render_stats.
+variant_stats = {'images': 0, 'original_bytes': 0, 'served_bytes': 0, 'generated': 0}
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='variants')
+_pending = set()
+_pending_lock = threading.Lock()
+
+
+def variant_cache_key(name):
+    return f'variants:{name}'
+
+
+def variant_name(digest, width, extension):
+    return f'variants/{digest[:2]}/{digest}-{width}.{extension}'
+
+
+def variant_digest(name):
+    """The digest a variant file name was made from."""
+    return name.rsplit('/', 1)[-1].split('-', 1)[0]
+
+
+def get_variants(*names):
+    """Map each file name to its record, or None while it has none."""
+    records = caches[VARIANT_CACHE].get_many([variant_cache_key(name) for name in names])
+    return {name: records.get(variant_cache_key(name)) for name in names}
+
+
+def forget_variants(name):
+    caches[VARIANT_CACHE].delete(variant_cache_key(name))
+
+
+def schedule_variants(name):
+    """Generate the variants of a stored file in the background, once."""
+    if not name or get_variants(name)[name] is not None:
+        return
+    with _pending_lock:
+        if name in _pending:
+            return
+        _pending.add(name)
+    _executor.submit(_generate, name)
+
+
+def _generate(name):
+    try:
+        generate_variants(name)
+    except Exception:
+        logger.exception('Could not generate the variants of %s', name)
+    finally:
+        with _pending_lock:
+            _pending.discard(name)
+
+
+def _encode(image, image_format):
+    buffer = io.BytesIO()
+    if image_format == 'JPEG':
+        if image.mode in ('RGBA', 'LA', 'P'):
+            image = image.convert('RGBA')
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            background.paste(image, mask=image.getchannel('A'))
+            image = background
+        elif image.mode != 'RGB':
+            image = image.convert('RGB')
+        image.save(buffer, 'JPEG', quality=QUALITY, optimize=True, progressive=True)
+    else:
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA')
+        image.save(buffer, image_format, quality=QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def _save_variant(storage, name, data):
+    # the storage picks another name when the file exists by now; the copy
+    # a concurrent writer saved there is the same variant
+    saved = storage.save(name, ContentFile(data))
+    if saved != name:
+        storage.delete(saved)
+
+
+def generate_variants(name, storage=default_storage):
+    """
+    Write the variants of a stored file and record them. A file that is not
+    a still raster image gets a record without variants.
+    """
+    try:
+        with storage.open(name, 'rb') as file:
+            data = file.read()
+    except OSError:
+        # gone from the storage, links to it are left alone
+        logger.warning('Could not read %s for its variants', name)
+        data = None
+    digest = hashlib.sha256(data).hexdigest() if data is not None else None
+    record = {'digest': digest, 'size': len(data or b''), 'width': None, 'widths': {}}
+
+    try:
+        image = Image.open(io.BytesIO(data))
+        image.load()
+    except (TypeError, OSError, SyntaxError, ValueError, Image.DecompressionBombError):
+        image = None
+    if image is not None and not getattr(image, 'is_animated', False):
+        image = ImageOps.exif_transpose(image)
+        record['width'] = image.width
+        for width in VARIANT_WIDTHS:
+            if width >= image.width:
+                break
+            resized = None
+            sizes = {}
+            for extension, image_format, mime_type in VARIANT_FORMATS:
+                path = variant_name(digest, width, extension)
+                if not storage.exists(path):
+                    if resized is None:
+                        height = max(round(image.height * width / image.width), 1)
+                        resized = image.resize((width, height), Image.LANCZOS)
+                    _save_variant(storage, path, _encode(resized, image_format))
+                    variant_stats['generated'] += 1
+                sizes[extension] = storage.size(path)
+            record['widths'][width] = sizes
+
+    caches[VARIANT_CACHE].set(variant_cache_key(name), record)
+    return record
+
+
+def pick_width(record, width):
+    """The narrowest variant at least width wide, else the widest one."""
+    widths = sorted(record['widths'])
+    if not widths:
+        return None
+    return next((candidate for candidate in widths if candidate >= width), widths[-1])
+
+
+def count_served(record, served_bytes):
+    variant_stats['images'] += 1
+    variant_stats['original_bytes'] += record['size']
+    variant_stats['served_bytes'] += served_bytes
+
+
+def variants_report():
+    original, served = variant_stats['original_bytes'], variant_stats['served_bytes']
+    return {
+        **variant_stats,
+        'saved_ratio': 1 - served / original if original else 0.0,
+        'pending': len(_pending),
+    }
@@ -0,0 +1,385 @@
+"""
+Tournament brackets.
+
+generate_bracket() draws every match of a Tournament room once, when the
+tournament starts, and record_result() moves players along as results come
+in. Matches are addressed by position rather than linked to each other: the
+match at (bracket, round_number, slot) sends its winner to slot // 2 of the
+next round, so finding the next match is one lookup on the
+match_bracket_position constraint.
+
+Formats (Room.tournament_format):
+
+    single  single elimination
+    double  double elimination: the losers of the winners bracket ("W") drop
+            into a losers bracket ("L"), and the two bracket winners meet in
+            one grand final ("F"), without a reset match
+    swiss   log2(bracket size) rounds ("S") pairing players on the same
+            number of wins who have not met yet, each round drawn when the
+            previous one is complete
+
+The field is padded with byes up to the next power of two, the bracket size.
+A bye is a match with a single player: it is completed without a game, and
+its player goes through as soon as they arrive. Byes meet the top seeds and
+never each other, so the first round has no empty match; later empty matches
+(losers bracket slots fed only by byes) are not created at all.
+"""
+
+import random
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import User, Room, Match
+from .leaderboard import record_game
+
+
+WINNERS, LOSERS, FINAL, SWISS = 'W', 'L', 'F', 'S'
+
+BRACKET_ORDER = {WINNERS: 0, LOSERS: 1, FINAL: 2, SWISS: 3}
+
+ELIMINATION_LABELS = {1: 'Final', 2: 'Semifinal', 3: 'Quarterfinal'}
+
+
+def bracket_size(player_count):
+    return 1 << max(player_count - 1, 1).bit_length()
+
+
+def round_count(size):
+    return size.bit_length() - 1
+
+
+def seed_order(size):
+    """Seeds in bracket order, so seed i meets seed size - 1 - i first."""
+    order = [0]
+    while len(order) < size:
+        mirror = len(order) * 2 - 1
+        order = [seed for top in order for seed in (top, mirror - top)]
+    return order
+
+
+def round_label(bracket, round_number, rounds):
+    if bracket == WINNERS:
+        return ELIMINATION_LABELS.get(rounds - round_number + 1, f'Round {round_number}')
+    if bracket == LOSERS:
+        return f'Losers round {round_number}'
+    if bracket == FINAL:
+        return 'Grand final'
+    return f'Round {round_number}'
+
+
+def winner_target(tournament_format, size, bracket, round_number, slot):
+    """(bracket, round_number, slot) and player position the winner moves to."""
+    rounds = round_count(size)
+    if bracket == WINNERS:
+        if round_number < rounds:
+            return (WINNERS, round_number + 1, slot // 2), slot % 2
+        return ((FINAL, 1, 0), 0) if tournament_format == 'double' else None
+    if bracket == LOSERS:
+        if round_number == 2 * (rounds - 1):
+            return (FINAL, 1, 0), 1
+        if round_number % 2:
+            # odd rounds play among the losers bracket, the next one takes
+            # in the losers of the winners bracket
+            return (LOSERS, round_number + 1, slot), 0
+        return (LOSERS, round_number + 1, slot // 2), slot % 2
+    return None
+
+
+def loser_target(tournament_format, size, bracket, round_number, slot):
+    if tournament_format != 'double' or bracket != WINNERS:
+        return None
+    if round_number == 1:
+        return (LOSERS, 1, slot // 2), slot % 2
+    # drop in on the opposite side of the bracket to put off rematches
+    return (LOSERS, 2 * (round_number - 1), (size >> round_number) - 1 - slot), 1
+
+
+def _elimination_matches(room, player_ids, tournament_format, size):
+    rounds = round_count(size)
+    layout = [(WINNERS, r, size >> r) for r in range(1, rounds + 1)]
+    if tournament_format == 'double':
+        layout += [(LOSERS, r, size >> ((r + 3) // 2)) for r in range(1, 2 * rounds - 1)]
+        layout.append((FINAL, 1, 1))
+
+    # seats[key] holds the two player ids, None for a seat still to be filled
+    # and live[key] whether anyone will ever sit there
+    seats, live = {}, {}
+    for bracket, round_number, matches in layout:
+        for slot in range(matches):
+            seats[bracket, round_number, slot] = [None, None]
+            live[bracket, round_number, slot] = [False, False]
+
+    seeded = [player_ids[seed] if seed < len(player_ids) else None for seed in seed_order(size)]
+    for slot in range(size // 2):
+        seats[WINNERS, 1, slot] = seeded[2 * slot:2 * slot + 2]
+        live[WINNERS, 1, slot] = [player is not None for player in seats[WINNERS, 1, slot]]
+
+    created = []
+    for bracket, round_number, matches in layout:
+        for slot in range(matches):
+            key = (bracket, round_number, slot)
+            if not any(live[key]):
+                continue
+
+            is_bye = not all(live[key])
+            winner = next((p for p in seats[key] if p is not None), None) if is_bye else None
+            target = winner_target(tournament_format, size, *key)
+            if target:
+                live[target[0]][target[1]] = True
+                if winner is not None:
+                    seats[target[0]][target[1]] = winner
+            target = loser_target(tournament_format, size, *key)
+            if target and not is_bye:
+                live[target[0]][target[1]] = True
+
+            player1, player2 = seats[key]
+            created.append(Match(
+                room=room,
+                bracket=bracket,
+                round_number=round_number,
+                slot=slot,
+                round=round_label(bracket, round_number, rounds),
+                player1_id=player1,
+                player2_id=player2,
+                is_bye=is_bye,
+                is_final=winner_target(tournament_format, size, *key) is None,
+                is_completed=winner is not None,
+                winner_id=winner,
+            ))
+    return created
+
+
+def _swiss_round(room, round_number, pairs, bye):
+    label = round_label(SWISS, round_number, None)
+    created = [
+        Match(room=room, bracket=SWISS, round_number=round_number, slot=slot,
+              round=label, player1_id=player1, player2_id=player2)
+        for slot, (player1, player2) in enumerate(pairs)
+    ]
+    if bye is not None:
+        created.append(Match(room=room, bracket=SWISS, round_number=round_number, slot=len(pairs),
+                             round=label, player1_id=bye, is_bye=True, is_completed=True, winner_id=bye))
+    return created
+
+
+def generate_bracket(room, seed=None):
+    """
+    Draw the room's bracket unless it already has one. Participants are
+    seeded in a random order. Raises ValueError for fewer than two players.
+    """
+    with transaction.atomic():
+        room = Room.objects.select_for_update().get(pk=room.pk)
+        if room.bracket_size is not None:
+            return room
+
+        player_ids = list(room.participants.values_list('id', flat=True))
+        if len(player_ids) < 2:
+            raise ValueError('A tournament needs at least two players.')
+        random.Random(seed).shuffle(player_ids)
+
+        size = bracket_size(len(player_ids))
+        tournament_format = room.tournament_format
+        if tournament_format == 'double' and size < 4:
+            tournament_format = 'single'  # a losers bracket needs two rounds
+
+        if tournament_format == 'swiss':
+            bye = player_ids.pop() if len(player_ids) % 2 else None
+            matches = _swiss_round(room, 1, list(zip(player_ids[::2], player_ids[1::2])), bye)
+        else:
+            matches = _elimination_matches(room, player_ids, tournament_format, size)
+        Match.objects.bulk_create(matches)
+
+        room.bracket_size = size
+        room.tournament_format = tournament_format
+        # update() skips auto_now, and the API validators follow updated
+        room.updated = timezone.now()
+        Room.objects.filter(pk=room.pk).update(
+            bracket_size=size, tournament_format=tournament_format, updated=room.updated,
+        )
+    return room
+
+
+def _finish(room, winner_id):
+    room.won_by_user_id = winner_id
+    room.is_expired = True
+    room.save()
+
+
+def _seat(room, key, position, player_id):
+    bracket, round_number, slot = key
+    target = Match.objects.select_for_update().filter(
+        room=room, bracket=bracket, round_number=round_number, slot=slot,
+    ).first()
+    if target is None:
+        return
+
+    field = 'player1_id' if position == 0 else 'player2_id'
+    setattr(target, field, player_id)
+    if target.is_bye:
+        # nobody else is coming, go straight through
+        target.winner_id = player_id
+        target.is_completed = True
+        target.save(update_fields=[field, 'winner', 'is_completed'])
+        _advance(room, target, player_id, None)
+    else:
+        target.save(update_fields=[field])
+
+
+def _advance(room, match, winner_id, loser_id):
+    if match.is_final:
+        _finish(room, winner_id)
+        return
+
+    key = (match.bracket, match.round_number, match.slot)
+    target = winner_target(room.tournament_format, room.bracket_size, *key)
+    if target:
+        _seat(room, *target, winner_id)
+    target = loser_target(room.tournament_format, room.bracket_size, *key)
+    if target and loser_id is not None:
+        _seat(room, *target, loser_id)
+
+
+def swiss_standings(matches):
+    """
+    Player ids ranked by wins, then by their opponents' wins (Buchholz),
+    then by round one seat, from the room's Swiss matches.
+    """
+    wins, opponents, seats = {}, {}, {}
+    for match in matches:
+        for player, other in ((match.player1_id, match.player2_id), (match.player2_id, match.player1_id)):
+            if player is None:
+                continue
+            wins.setdefault(player, 0)
+            opponents.setdefault(player, [])
+            if other is not None:
+                opponents[player].append(other)
+            if match.round_number == 1:
+                seats[player] = 2 * match.slot + (player == match.player2_id)
+        if match.winner_id is not None:
+            wins[match.winner_id] += 1
+
+    def rank(player):
+        buchholz = sum(wins[other] for other in opponents[player])
+        return (-wins[player], -buchholz, seats.get(player, 0))
+    return sorted(wins, key=rank), wins, opponents
+
+
+def _next_swiss_round(room, round_number):
+    matches = list(Match.objects.filter(room=room, bracket=SWISS))
+    ranking, wins, opponents = swiss_standings(matches)
+    if round_number > round_count(room.bracket_size):
+        _finish(room, ranking[0])
+        return
+
+    had_bye = {match.player1_id for match in matches if match.is_bye}
+    bye = None
+    if len(ranking) % 2:
+        # the lowest ranked player who has not had one yet
+        bye = next((p for p in reversed(ranking) if p not in had_bye), ranking[-1])
+        ranking.remove(bye)
+
+    pairs = []
+    while ranking:
+        player = ranking.pop(0)
+        played = set(opponents[player])
+        # the closest player on wins not met yet, a rematch if there is none
+        opponent = next((p for p in ranking if p not in played), ranking[0])
+        ranking.remove(opponent)
+        pairs.append((player, opponent))
+    Match.objects.bulk_create(_swiss_round(room, round_number, pairs, bye))
+
+
+def record_result(match, player1_score, player2_score, winner_id=None):
+    """
+    Complete a match and move its players on, all in one transaction.
+    winner_id overrides the scores, for forfeits and time limits. Raises
+    ValueError if the match is not ready to be played, is already completed
+    or has no winner.
+    """
+    with transaction.atomic():
+        # results of one tournament are applied one at a time
+        room = Room.objects.select_for_update().get(pk=match.room_id)
+        match = Match.objects.select_for_update().get(pk=match.pk)
+        if match.is_completed:
+            raise ValueError('This match already has a result.')
+        if match.player1_id is None or match.player2_id is None:
+            raise ValueError('This match is still waiting for its players.')
+        if winner_id is None:
+            if player1_score == player2_score:
+                raise ValueError('A match cannot end in a draw.')
+            winner_id = match.player1_id if player1_score > player2_score else match.player2_id
+        elif winner_id not in (match.player1_id, match.player2_id):
+            raise ValueError('The winner must be one of the players.')
+
+        loser_id = match.player2_id if winner_id == match.player1_id else match.player1_id
+        match.player1_score = player1_score
+        match.player2_score = player2_score
+        match.winner_id = winner_id
+        match.is_completed = True
+        match.save(update_fields=['player1_score', 'player2_score', 'winner', 'is_completed'])
+
+        scores = {match.player1_id: player1_score or 0, match.player2_id: player2_score or 0}
+        record_game(winner_id, loser_id, scores[winner_id], scores[loser_id])
+
+        if match.bracket == SWISS:
+            if not Match.objects.filter(room=room, bracket=SWISS, round_number=match.round_number,
+                                        is_completed=False).exists():
+                _next_swiss_round(room, match.round_number + 1)
+        else:
+            _advance(room, match, winner_id, loser_id)
+    return match
+
+
+def next_match(room, user_id):
+    """The user's match of the room that has both players and no result yet."""
+    return room.matches.filter(
+        Q(player1_id=user_id) | Q(player2_id=user_id),
+        is_completed=False, player1__isnull=False, player2__isnull=False,
+    ).select_related('player1', 'player2').first()
+
+
+def bracket_columns(room):
+    """The room's matches as [(bracket name, [(round label, [matches])])]."""
+    names = dict(Match.BRACKET_CHOICES)
+    brackets = []
+    matches = room.matches.select_related('player1', 'player2', 'winner')
+    for match in sorted(matches, key=lambda m: (BRACKET_ORDER[m.bracket], m.round_number, m.slot)):
+        if not brackets or brackets[-1][0] != names[match.bracket]:
+            brackets.append((names[match.bracket], []))
+        rounds = brackets[-1][1]
+        if not rounds or rounds[-1][0] != match.round:
+            rounds.append((match.round, []))
+        rounds[-1][1].append(match)
+    return brackets
+
+
+def _loser_id(match):
+    return match.player2_id if match.winner_id == match.player1_id else match.player1_id
+
+
+def tournament_podium(room):
+    """First, second and third place of a finished tournament, as users."""
+    if not room.is_expired or room.bracket_size is None:
+        return []
+
+    matches = list(room.matches.all())
+    if room.tournament_format == 'swiss':
+        places = swiss_standings(matches)[0][:3]
+    else:
+        final = next(match for match in matches if match.is_final)
+        places = [final.winner_id, _loser_id(final)]
+        rounds = round_count(room.bracket_size)
+        if room.tournament_format == 'double':
+            # the losers bracket final
+            decider = [m for m in matches if m.bracket == LOSERS and m.round_number == 2 * (rounds - 1)]
+        else:
+            # the semifinal lost to the champion
+            decider = [m for m in matches if m.bracket == WINNERS and m.round_number == rounds - 1
+                       and m.winner_id == final.winner_id]
+        if decider and not decider[0].is_bye:
+            places.append(_loser_id(decider[0]))
+
+    users = User.objects.in_bulk(places)
+    return [users[user_id] for user_id in places if user_id in users]
@@ -0,0 +1,203 @@
+"""
+Storage of chat file uploads.
+
+UploadLimitMiddleware answers an upload whose Content-Length is over
+CHAT_UPLOAD_MAX_SIZE with a 413 before its body is read. Uploads within it
+are streamed to a temporary file in chunks by ChatUploadHandler, which
+hashes them on the way and stops as soon as the file passes the limit.
+
+ContentAddressedStorage then keeps each distinct content once, under its
+SHA-256:
+
+    files/<digest[:2]>/<digest><extension>
+
+A StoredFile row per stored name counts the messages that reference it.
+Saving the same content again only adds a reference, and delete(), which
+django-cleanup calls when a message goes, only removes the file with its
+last reference. Files stored before this have no row and are deleted
+outright, as before.
+"""
+
+import hashlib
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import QueryDict
+from django.urls import reverse
+from django.utils.datastructures import MultiValueDict
+from django.utils.deconstruct import deconstructible
+
+
+# Room for the multipart headers and form fields around the file.
+UPLOAD_OVERHEAD = 64 * 1024
+
+
+def max_upload_size():
+    return getattr(settings, 'CHAT_UPLOAD_MAX_SIZE', 10 * 1024 * 1024)
+
+
+def upload_path_prefix():
+    return reverse('chat-file-upload', args=['-']).rsplit('-', 1)[0]
+
+
+class UploadLimitMiddleware:
+    """
+    ASGI middleware that refuses chat uploads over the limit before Django
+    reads their body. Django's ASGI handler takes in the whole body before
+    any view runs, so the view alone would refuse them too late.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not scope['path'].startswith(upload_path_prefix()):
+            return await self.app(scope, receive, send)
+
+        limit = max_upload_size() + UPLOAD_OVERHEAD
+        length = dict(scope['headers']).get(b'content-length', b'')
+        if length.isdigit() and int(length) > limit:
+            await send({
+                'type': 'http.response.start',
+                'status': 413,
+                'headers': [(b'content-type', b'text/plain; charset=utf-8'), (b'connection', b'close')],
+            })
+            await send({'type': 'http.response.body', 'body': b'File too large'})
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > limit:
+                    # a body longer than announced, drop the request
+                    return {'type': 'http.disconnect'}
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class HashedTemporaryUploadedFile(TemporaryUploadedFile):
+    """A streamed upload that knows the SHA-256 of its content."""
+    sha256 = None
+
+
+class ChatUploadHandler(FileUploadHandler):
+    """
+    Streams uploaded files to disk, hashing them chunk by chunk, and stops
+    the upload once the body grows past the size limit. too_large tells the
+    view which happened.
+    """
+
+    def __init__(self, request=None, max_size=None):
+        super().__init__(request)
+        self.max_size = max_upload_size() if max_size is None else max_size
+        self.too_large = False
+        self.received = 0
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        # a declared length is refused before a byte of the body is read
+        if content_length and content_length > self.max_size + UPLOAD_OVERHEAD:
+            self.too_large = True
+            return QueryDict(encoding=encoding), MultiValueDict()
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = HashedTemporaryUploadedFile(self.file_name, self.content_type, 0, self.charset, self.content_type_extra)
+        self.hash = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > self.max_size:
+            self.too_large = True
+            self.file.close()
+            raise StopUpload(connection_reset=True)
+        self.hash.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.seek(0)
+        self.file.size = file_size
+        self.file.sha256 = self.hash.hexdigest()
+        return self.file
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Stores each content once, named by its SHA-256, with reference counts."""
+
+    def content_name(self, name, content):
+        digest = getattr(content, 'sha256', None)
+        if digest is None:
+            hasher = hashlib.sha256()
+            content.seek(0)
+            for chunk in content.chunks():
+                hasher.update(chunk)
+            digest = hasher.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return f'{os.path.dirname(name)}/{digest[:2]}/{digest}{extension}'.lstrip('/')
+
+    def save(self, name, content, max_length=None):
+        from .models import StoredFile
+
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        with transaction.atomic():
+            if not StoredFile.objects.filter(name=name).update(references=F('references') + 1):
+                try:
+                    with transaction.atomic():
+                        StoredFile.objects.create(name=name, size=content.size)
+                except IntegrityError:
+                    # stored meanwhile by another upload
+                    StoredFile.objects.filter(name=name).update(references=F('references') + 1)
+            if not self.exists(name):
+                self._store(name, content)
+        return name
+
+    def _store(self, name, content):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # concurrent writers of the same content each rename a whole copy
+        # into place, so the file is never seen half written
+        partial = f'{path}.{uuid.uuid4().hex}.part'
+        try:
+            # a streamed upload is already on disk, link it instead of copying
+            os.link(content.temporary_file_path(), partial)
+        except (AttributeError, OSError):
+            content.seek(0)
+            with open(partial, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+        if self.file_permissions_mode is not None:
+            os.chmod(partial, self.file_permissions_mode)
+        os.replace(partial, path)
+
+    def delete(self, name):
+        from .models import StoredFile
+
+        with transaction.atomic():
+            stored = StoredFile.objects.select_for_update().filter(name=name).first()
+            if stored is not None and stored.references > 1:
+                StoredFile.objects.filter(name=name).update(references=F('references') - 1)
+                return
+            if stored is not None:
+                stored.delete()
+            super().delete(name)
+
+
+def chat_file_storage():
+    return _chat_file_storage
+
+
+_chat_file_storage = ContentAddressedStorage()
@@ -16,6 +16,7 @@ urlpatterns = [
     path('profile/<str:pk>/', views.userProfile, name="user-profile"),
     path('update-user/', views.updateUser, name="update-user"),
     path('ai_playnow/', views.ai_playnow, name="ai_playnow"),
+    path('matchmaking/', views.matchmaking, name="matchmaking"),
     path('join_room/', views.join_room, name="join_room"),
 
     # Room Management
@@ -37,6 +38,8 @@ urlpatterns = [
     path('chat/delete/<chatroom_name>/', views.chatroom_delete_view, name="chatroom-delete"),
     path('chat/leave/<chatroom_name>/', views.chatroom_leave_view, name="chatroom-leave"),
     path('chat/fileupload/<chatroom_name>/', views.chat_file_upload, name="chat-file-upload"),
+    path('chat/history/<chatroom_name>/', views.chat_history, name="chat-history"),
+    path('chat/search/<chatroom_name>/', views.chat_search, name="chat-search"),
     path('messages/', views.chat_ui, name="messages"),
     path('messages/<int:id>/', views.chat_group_detail, name='chat_group_detail'),
     path('messages/create_privchat/<str:user_id>/', views.create_privatechat, name='create_privatechat'),
@@ -46,6 +49,7 @@ urlpatterns = [
     # tournament
     path('room/tournament/<str:pk>/', views.tournament_view, name='tournament_view'),
     path('room/<int:pk>/podium/', views.podium_view, name='podium_view'),
+    path('leaderboard/', views.leaderboard, name='leaderboard'),
 
     # friends
     path('add_friend/<str:user_id>/', views.add_friend, name='add_friend'),
@@ -55,5 +59,8 @@ urlpatterns = [
     # notifications
     path('notifications/read/<int:notification_id>/', views.friend_mark_as_read, name='friend_mark_as_read'),
     path('noti_list/', views.noti_list, name="noti_list"),
+
+    # instrumentation
+    path('stats/render/', views.render_stats, name="render_stats"),
 ]
 
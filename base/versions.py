@@ -0,0 +1,84 @@
+"""
+Version tokens for the endpoints htmx polls.
+
+Each polled resource has an opaque version in the "versions" cache alias,
+replaced by bump_version() whenever the resource changes:
+
+    lobby                   the open lobby list
+    room:<id>               a room's flags and participants
+    notifications:<id>      a user's notifications
+
+The receivers in base.signals do the bumping. @polled builds the ETag of a
+response from these tokens and the viewer's id read straight from the
+session, so a poll whose If-None-Match still matches is answered with a 304
+before the view, the ORM or the template engine run.
+
+Every worker must read the tokens another one bumped, so the alias has to
+be a cache the workers share; base.checks refuses process-local backends.
+A token that is missing from the cache is simply started afresh, which
+changes the ETag and costs one full response.
+"""
+
+import time
+
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import caches
+from django.utils.connection import ConnectionProxy
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
+
+
+VERSION_CACHE = 'versions'
+
+cache = ConnectionProxy(caches, VERSION_CACHE)
+
+# Idle tokens expire; a restarted one costs a single full response.
+VERSION_TIMEOUT = 24 * 60 * 60
+
+
+def version_cache_key(resource):
+    return f'version:{resource}'
+
+
+def _new_version():
+    return format(time.time_ns(), 'x')
+
+
+def get_versions(*resources):
+    keys = [version_cache_key(resource) for resource in resources]
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    if missing:
+        cache.set_many(missing, VERSION_TIMEOUT)
+        versions.update(missing)
+    return [versions[key] for key in keys]
+
+
+def bump_version(resource):
+    cache.set(version_cache_key(resource), _new_version(), VERSION_TIMEOUT)
+
+
+def session_user_id(request):
+    # request.user would load the user row
+    return request.session.get(SESSION_KEY)
+
+
+def polled(tag_func):
+    """
+    Answer htmx polls of the decorated view conditionally.
+
+    tag_func(request, *args, **kwargs) returns the parts of the ETag, usually
+    version tokens and the viewer id, or None to answer unconditionally.
+    htmx requests get a partial where plain ones get a page, so the two are
+    tagged apart.
+    """
+    def etag_func(request, *args, **kwargs):
+        parts = tag_func(request, *args, **kwargs)
+        if parts is None:
+            return None
+        kind = 'hx' if request.headers.get('HX-Request') else 'page'
+        return '-'.join(str(part) for part in (kind, *parts))
+
+    def decorator(view):
+        return cache_control(private=True, no_cache=True)(condition(etag_func=etag_func)(view))
+    return decorator
@@ -2,17 +2,35 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.http import HttpResponse, JsonResponse, HttpResponseRedirect
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required
+from django.contrib.admin.views.decorators import staff_member_required
 from django.contrib.auth import authenticate, login, logout
+from django.db import transaction
 from django.db.models import Q
 from django.http import Http404
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_GET
+from django.urls import reverse
 from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from uuid import uuid4
 from django.utils.text import slugify
-import random
+import time
 
-from .models import User, ChatGroup, Room, GroupMessage, Match, Friend, Notification
+from .models import User, ChatGroup, Room, GroupMessage, Match, Friend, Notification, PlayerStats
 from .forms import MyUserCreationForm, ChatmessageCreateForm, RoomForm, UserForm, NewGroupForm, ChatRoomEditForm, MatchScoreForm
+from .consumers import build_message_event, online_count_stats
+from .presence import get_presence
+from .notifications import push_notification, invalidate_unread_count
+from .lobby import send_lobby_event, lobby_snapshot, lobby_context, open_lobbies, create_room_chat
+from .history import message_page
+from .fragments import fragment_report
+from .search import search_room_ids, search_messages
+from .versions import polled, get_versions, session_user_id
+from .tournament import generate_bracket, bracket_columns, tournament_podium, next_match
+from .leaderboard import top_players, rank_of, rating_of
+from .media import describe_upload
+from .thumbnails import variants_report
+from .uploads import ChatUploadHandler
 
 # <!-- /*==============================
 # =>  Authentication Functions
@@ -79,16 +97,12 @@ def home(request, chatroom_name='public-chat'):
     if chat_group.is_private and request.user not in chat_group.members.all():
         raise Http404()
 
-    chat_messages = chat_group.chat_messages.all()[:30]
+    chat_messages, history_cursor = message_page(chat_group)
     form = ChatmessageCreateForm()
     other_user = next((member for member in chat_group.members.all() if member != request.user), None)
     q = request.GET.get('q', '')
-    rooms = Room.objects.filter(
-        Q(name__icontains=q) |
-        Q(description__icontains=q) |
-        Q(points__icontains=q)
-    )
-    room_count = Room.objects.filter(is_expired=False).count()
+    rooms = open_lobbies(search_room_ids(q, open_only=True) if q else None)
+    room_count = open_lobbies().count()
 
     if request.htmx and request.method == 'POST':
         form = ChatmessageCreateForm(request.POST)
@@ -97,10 +111,16 @@ def home(request, chatroom_name='public-chat'):
             message.author = request.user
             message.group = chat_group
             message.save()
-            return render(request, 'chat/partials/chat_message_p.html', {'message': message, 'user': request.user})
+            context = {
+                'message': message,
+                'user': request.user,
+                'online_user_ids': get_presence().online_users(chat_group.group_name),
+            }
+            return render(request, 'chat/partials/chat_message_p.html', context)
 
     context = {
         'chat_messages': chat_messages,
+        'history_cursor': history_cursor,
         'form': form,
         'other_user': other_user,
         'chatroom_name': chatroom_name,
@@ -115,24 +135,29 @@ def home(request, chatroom_name='public-chat'):
     return render(request, 'base/home.html', context)
 
 
+def room_list_tag(request):
+    # hosts see their own AI and vs Player rooms, and the cards show how
+    # old each room is, so the tag also follows the viewer and the minute
+    return (*get_versions('lobby'), session_user_id(request), int(time.time() // 60))
+
+
+@polled(room_list_tag)
 def room_list(request):
-    rooms = Room.objects.filter(is_expired=False)
+    rooms = open_lobbies()
     if request.headers.get('HX-Request'):
         return render(request, 'room/partials/room_list.html', {'rooms': rooms})
     return render(request, 'base/home.html', {'rooms': rooms})
 
 
+def player_list_tag(request, room_id):
+    return (*get_versions(f'room:{room_id}'), session_user_id(request))
+
+
+@polled(player_list_tag)
 def player_list(request, room_id):
     room = get_object_or_404(Room, id=room_id)
-    participants = room.participants.all()
-    other_player = participants[1] if len(participants) > 1 else None
-    context = {
-        'other_player': other_player,
-        'room': room,
-        'participants': participants,
-        'participant': request.user,
-    }
     if request.headers.get('HX-Request'):
+        context = lobby_context(lobby_snapshot(room), request.user.id)
         return render(request, 'room/partials/vsplayer.html', context)
     return render(request, 'base/room.html', {'room': room})
 
@@ -148,6 +173,7 @@ def kick_player(request):
             if player in room.participants.all():
                 room.participants.remove(player)
                 room.save()
+                send_lobby_event(room, kicked_id=player.id)
     return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
 
 
@@ -159,9 +185,19 @@ def leave_room(request):
             user = request.user
             if user in room.participants.all():
                 room.participants.remove(user)
+                send_lobby_event(room)
     return HttpResponseRedirect(request.META.get('HTTP_REFERER', '/'))
 
 
+def kickout_status_tag(request):
+    room_id = request.GET.get('room_id')
+    player_id = request.GET.get('player_id')
+    if not (room_id and player_id and room_id.isdigit() and player_id.isdigit()):
+        return None
+    return (*get_versions(f'room:{room_id}'), player_id)
+
+
+@polled(kickout_status_tag)
 def check_kickout_status(request):
     room_id = request.GET.get('room_id')
     player_id = request.GET.get('player_id')
@@ -183,9 +219,10 @@ def room(request, pk):
 
     if request.user not in room.participants.all():
         room.participants.add(request.user)
+        send_lobby_event(room)
 
     chat_group = get_object_or_404(ChatGroup, room=room)
-    chat_messages = chat_group.chat_messages.all()[:30]
+    chat_messages, history_cursor = message_page(chat_group)
     form = ChatmessageCreateForm()
     other_user = next((member for member in chat_group.members.all() if member != request.user), None)
 
@@ -203,12 +240,18 @@ def room(request, pk):
             message.group = chat_group
             message.room = room
             message.save()
-            return render(request, 'chat/partials/chat_message_p.html', {'message': message, 'user': request.user})
+            context = {
+                'message': message,
+                'user': request.user,
+                'online_user_ids': get_presence().online_users(chat_group.group_name),
+            }
+            return render(request, 'chat/partials/chat_message_p.html', context)
 
     context = {
         'room': room,
         'participants': room.participants.all(),
         'chat_messages': chat_messages,
+        'history_cursor': history_cursor,
         'form': form,
         'other_user': other_user,
         'chatroom_name': room.name,
@@ -223,6 +266,7 @@ def room(request, pk):
         if action == 'leave-room':
             if request.user in room.participants.all():
                 room.participants.remove(request.user)
+                send_lobby_event(room)
                 return redirect('home')
             else:
                 # Handle user not being part of the room
@@ -232,6 +276,7 @@ def room(request, pk):
             if request.user in room.participants.all():
                 room.opp_ready = True
                 room.save()
+                send_lobby_event(room)
                 return render(request, 'base/room.html', context)
             else:
                 messages.error(request, "You are not a participant of this room.")
@@ -250,25 +295,12 @@ def createRoom(request):
             room = form.save(commit=False)
             room.host = request.user
             room.is_2player = (form.cleaned_data['opponent_type'] == 'vs Player')
-            room.save()
-            
-            unique_suffix = uuid4().hex[:6]
-            
-            # Replace spaces with hyphens
-            formatted_name = room.name.replace(' ', '-')
-
-            chat_group = ChatGroup.objects.create(
-                admin=request.user,
-                group_name=f"{formatted_name}-{unique_suffix}",  # Append unique suffix
-                groupchat_name=f"{formatted_name}-{unique_suffix}",  # Append unique suffix
-                room=room
-            )
-
-            # Assign the user to the group after saving
-            chat_group.members.set([request.user])
+            with transaction.atomic():
+                room.save()
+                create_room_chat(room, [request.user])
 
             if request.htmx:
-                rooms = Room.objects.filter(is_expired=False)
+                rooms = open_lobbies()
                 return render(request, 'room/room_list.html', {'rooms': rooms})
             else:
                 return redirect('home')
@@ -309,6 +341,15 @@ def deleteRoom(request, pk):
     return render(request, 'base/delete.html', {'obj': room})
 
 
+@login_required(login_url='login')
+def matchmaking(request):
+    # the queue is joined by the page's socket, see base.matchmaking
+    context = {
+        'rating': rating_of(request.user.id),
+    }
+    return render(request, 'base/matchmaking.html', context)
+
+
 @login_required(login_url='login')
 def ai_playnow(request):
     # Create a new room with the current user and AI as opponents
@@ -339,6 +380,7 @@ def join_room(request):
         # Logic to process the invitation link and retrieve the room
         room = get_object_or_404(Room, invitation_link=invitation_link)
         room.participants.add(request.user)
+        send_lobby_event(room)
         messages.success(request, 'Joining the Room')
         return redirect('room', pk=room.id)
     messages.warning(request, 'Room not Found')
@@ -346,21 +388,34 @@ def join_room(request):
 
 
 @login_required(login_url='login')
+@require_GET
 def pongPage(request, pk):
+    # the game server plays the match and records its result, see base.game
     room = get_object_or_404(Room, id=pk)
-
-    if request.method == 'POST':
-        winner = request.POST.get('winner')
-        if winner:
-            if room.opponent_type in ['AI', 'vs Player', 'Tournament']:
-                room.won_by_user = request.user if winner != 'AI' else None
-                room.won_by_ai = winner == 'AI'
-                room.is_expired = True
-                room.save()
-                return JsonResponse({'status': 'success'})
-        return JsonResponse({'status': 'failed', 'error': 'No winner specified'})
-
-    return render(request, 'base/pong_ai.html', {'room': room})
+    if room.opponent_type == 'Tournament':
+        # every match has its own game, the scheduler records its result
+        match = next_match(room, request.user.id)
+        if match is None:
+            return redirect('tournament_view', pk=room.id)
+        context = {
+            'room': room,
+            'socket_path': f'/ws/game/match/{match.id}',
+            'players': [match.player1.username, match.player2.username],
+            'return_url': reverse('tournament_view', args=[room.id]),
+        }
+        return render(request, 'base/pong_ai.html', context)
+
+    if room.opponent_type == 'AI':
+        opponent = 'AI'
+    else:
+        opponent = room.participants.exclude(id=room.host_id).first()
+        opponent = opponent.username if opponent else 'Player 2'
+    context = {
+        'room': room,
+        'socket_path': f'/ws/game/{room.id}',
+        'players': [room.host.username if room.host else 'Player 1', opponent],
+    }
+    return render(request, 'base/pong_ai.html', context)
 
 # <!-- /*==============================
 # =>  User Profile Functions
@@ -557,18 +612,31 @@ def chatroom_leave_view(request, chatroom_name):
         return redirect('home')
 
 
+@csrf_exempt
 def chat_file_upload(request, chatroom_name):
+    # upload handlers must be in place before the CSRF check reads the body
+    handler = ChatUploadHandler(request)
+    request.upload_handlers = [handler]
+    return _chat_file_upload(request, chatroom_name, handler)
+
+
+@csrf_protect
+def _chat_file_upload(request, chatroom_name, handler):
     chat_group = get_object_or_404(ChatGroup, group_name=chatroom_name)
 
+    if request.method == 'POST' and not request.FILES and handler.too_large:
+        return HttpResponse("File too large", status=413)
+
     if request.htmx and request.FILES:
         file = request.FILES['file']
         message = GroupMessage.objects.create(
             file=file,
             author=request.user,
             group=chat_group,
+            **describe_upload(file),
         )
         channel_layer = get_channel_layer()
-        event = {'type': 'message_handler', 'message_id': message.id}
+        event = build_message_event(message)
         async_to_sync(channel_layer.group_send)(chatroom_name, event)
 
     return HttpResponse()
@@ -592,7 +660,7 @@ def send_invitation_message(sender, recipient, room):
             room = room,
         )
         channel_layer = get_channel_layer()
-        event = {'type': 'message_handler', 'message_id': message.id}
+        event = build_message_event(message)
         async_to_sync(channel_layer.group_send)(group.group_name, event)
     else:
         # Handle the case where no appropriate group is found
@@ -648,6 +716,51 @@ def chat_ui(request):
     return render(request, 'base/private_messages.html', context)
 
 
+HISTORY_TEMPLATES = {
+    'chat': 'chat/partials/chat_history.html',
+    'private': 'private_message/partials/chat_history.html',
+}
+
+
+@login_required(login_url='login')
+def chat_history(request, chatroom_name):
+    # one older page of messages for the scroll-back sentinel, see base.history
+    chat_group = get_object_or_404(ChatGroup, group_name=chatroom_name)
+    if chat_group.is_private and request.user not in chat_group.members.all():
+        raise Http404()
+
+    layout = request.GET.get('layout', 'chat')
+    template = HISTORY_TEMPLATES.get(layout)
+    if template is None:
+        raise Http404()
+
+    try:
+        chat_messages, history_cursor = message_page(chat_group, request.GET.get('before'))
+    except (ValueError, OverflowError):
+        return HttpResponse("Invalid cursor", status=400)
+
+    context = {
+        'chat_group': chat_group,
+        'chat_messages': chat_messages,
+        'history_cursor': history_cursor,
+        'layout': layout,
+    }
+    return render(request, template, context)
+
+
+@login_required(login_url='login')
+def chat_search(request, chatroom_name):
+    chat_group = get_object_or_404(ChatGroup, group_name=chatroom_name)
+    if chat_group.is_private and request.user not in chat_group.members.all():
+        raise Http404()
+
+    context = {
+        'q': request.GET.get('q', ''),
+        'chat_messages': search_messages(request.GET.get('q', ''), chat_group),
+    }
+    return render(request, 'chat/partials/chat_search.html', context)
+
+
 @login_required(login_url='login')
 def chat_group_detail(request, id):
     group = get_object_or_404(ChatGroup, id=id)
@@ -656,7 +769,7 @@ def chat_group_detail(request, id):
     public_chat_groups = all_chat_groups.filter(is_private=False) 
     private_chat_groups = all_chat_groups.filter(is_private=True)
 
-    chat_messages = group.chat_messages.all()[:30]
+    chat_messages, history_cursor = message_page(group)
 
     if request.htmx:
         form = ChatmessageCreateForm(request.POST)
@@ -675,6 +788,7 @@ def chat_group_detail(request, id):
         'selected_group_id': group.id,
         'chatroom_name_ws': group.groupchat_name,
         'chat_messages': chat_messages,
+        'history_cursor': history_cursor,
     }
     
     return render(request, 'base/private_messages.html', context)
@@ -701,66 +815,28 @@ def block_group(request, pk):
 
 @login_required(login_url='login')
 def tournament_view(request, pk):
-    room = Room.objects.get(id=pk)  # Fetch the room object
-    participants = list(room.participants.all())
-    random.shuffle(participants)
-    opp_count = len(participants)
-
-    matches = {
-        'quarterfinals': [],
-        'semifinals': [],
-        'final': None
-    }
+    room = get_object_or_404(Room, id=pk)
+    try:
+        # drawn on the first visit, later visits read it back
+        room = generate_bracket(room)
+    except ValueError as error:
+        messages.error(request, str(error))
+        return redirect('room', pk=room.id)
 
-    if opp_count == 8:
-        # Create Quarterfinals
-        for i in range(0, 8, 2):
-            match = Match(
-                player1=participants[i],
-                player2=participants[i+1],
-                round='Quarterfinal'
-            )
-            match.save()
-            matches['quarterfinals'].append(match)
-
-        # Create Semifinals
-        for _ in range(4):
-            match = Match(round='Semifinal')
-            match.save()
-            matches['semifinals'].append(match)
-
-        # Create Final with empty player1 and player2
-        final_match = Match(
-            round='Final',
-            is_final=True
-            # Do not set player1 and player2 yet
-        )
-        final_match.save()
-        matches['final'] = final_match
-
-    elif opp_count == 4:
-        # Create Semifinals
-        for i in range(0, 4, 2):
-            match = Match(
-                player1=participants[i],
-                player2=participants[i+1],
-                round='Semifinal'
-            )
-            match.save()
-            matches['semifinals'].append(match)
-
-        # Create Final with empty player1 and player2
-        final_match = Match(
-            round='Final',
-            is_final=True
-            # Do not set player1 and player2 yet
-        )
-        # final_match.save()
-        matches['final'] = final_match
+    brackets = bracket_columns(room)
+    # found in the columns already loaded, rather than with .tournament.next_match
+    upcoming = next((
+        match
+        for bracket_name, rounds in brackets
+        for round_label, matches in rounds
+        for match in matches
+        if not match.is_completed and request.user.id in (match.player1_id, match.player2_id)
+        and None not in (match.player1_id, match.player2_id)
+    ), None)
 
     context = {
-        'matches': matches,
-        'opp_count': opp_count,
+        'brackets': brackets,
+        'next_match': upcoming,
         'room': room,
     }
 
@@ -786,52 +862,43 @@ def tournament_view(request, pk):
 
 @login_required(login_url='login')
 def podium_view(request, pk):
-    # Dummy data for testing
-    class DummyPlayer:
-        def __init__(self, username, avatar_url):
-            self.username = username
-            self.avatar_url = avatar_url
-
-    class DummyMatch:
-        def __init__(self, player1, player2, player1_score=None, player2_score=None):
-            self.player1 = player1
-            self.player2 = player2
-            self.player1_score = player1_score or 0
-            self.player2_score = player2_score or 0
-
-    # Create dummy players
-    player1 = DummyPlayer(username="Player One", avatar_url="/static/images/player1.jpg")
-    player2 = DummyPlayer(username="Player Two", avatar_url="/static/images/player2.jpg")
-    player3 = DummyPlayer(username="Player Three", avatar_url="/static/images/player3.jpg")
-    player4 = DummyPlayer(username="Player Four", avatar_url="/static/images/player4.jpg")
-
-    # Create dummy matches
-    matches = [
-        DummyMatch(player1=player1, player2=player2, player1_score=3, player2_score=1),  # First place
-        DummyMatch(player1=player3, player2=player4, player1_score=2, player2_score=2),  # Second place
-        DummyMatch(player1=player2, player2=player3, player1_score=1, player2_score=0)   # Third place
-    ]
-
+    room = get_object_or_404(Room, id=pk)
     context = {
-        'matches': matches,
+        'room': room,
+        'places': tournament_podium(room),
     }
-    
+
     return render(request, 'tournament/podium.html', context)
 
 
+LEADERBOARD_SIZE = 20
+
+
+@login_required(login_url='login')
+def leaderboard(request):
+    context = {
+        'players': top_players(LEADERBOARD_SIZE),
+        'rank': rank_of(request.user.id),
+        'stats': PlayerStats.objects.filter(pk=request.user.id).first(),
+    }
+
+    return render(request, 'base/leaderboard.html', context)
+
+
 # <!-- /*==============================
 # =>  Notification Functions
 # ================================*/ -->
 
 
 def send_notification(user, sender, notification_type, title, message):
-    Notification.objects.create(
+    notification = Notification.objects.create(
         user=user,
         sender=sender,
         type=notification_type,
         title=title,
         message=message
     )
+    push_notification(notification)
 
 
 @login_required(login_url='login')
@@ -846,6 +913,7 @@ def friend_mark_as_read(request, notification_id):
     notification = get_object_or_404(Notification, id=notification_id, user=request.user)
     notification.is_read = True
     notification.save()
+    invalidate_unread_count(request.user.id)
 
     # Redirect to the appropriate view after marking the notification as read
     if notification.type == 'friend_request':
@@ -867,6 +935,14 @@ def friend_mark_as_read(request, notification_id):
     return redirect('notifications')
 
 
+def noti_list_tag(request):
+    user_id = session_user_id(request)
+    if user_id is None:
+        return None
+    return (*get_versions(f'notifications:{user_id}'),)
+
+
+@polled(noti_list_tag)
 def noti_list(request):
     notifications = Notification.objects.filter(user=request.user, is_read=False).order_by('-created_at')
     if request.headers.get('HX-Request'):
@@ -951,3 +1027,13 @@ def cancel_friend_request(request, user_id):
     except Friend.DoesNotExist:
         messages.error(request, "Friend request does not exist.")
     return redirect('user-profile', pk=user_id)
+
+
+@staff_member_required
+def render_stats(request):
+    # fragment cache effectiveness and image bytes of this worker since it started
+    return JsonResponse({
+        'message_fragments': fragment_report(),
+        'online_count': online_count_stats,
+        'image_variants': variants_report(),
+    })
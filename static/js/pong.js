@@ -0,0 +1,153 @@
+/*
+ * Browser side of the server-authoritative Pong game (base/game).
+ *
+ * The server simulates the match and owns its result. This client opens the
+ * game socket, decodes the binary snapshots of base/game/protocol.py and
+ * acknowledges each one, and sends the player's paddle direction tagged
+ * with a sequence number and the tick on screen when it changed. Until the
+ * server acknowledges an input, the player's own paddle is drawn where that
+ * input will have moved it.
+ *
+ *     const game = connectPong('/ws/game/12', {
+ *         onHello(hello) {},       // {side: 0, 1 or null, points}
+ *         onSnapshot(state) {},    // {tick, ball: [x, y], paddles, scores}
+ *         onResult(result) {},     // {winner: 0, 1 or null}
+ *     });
+ *     game.setDirection(1);        // 1 up, -1 down, 0 idle
+ */
+
+const PONG_FULL = 1;
+const PONG_DELTA = 2;
+const PONG_SCALE = 1000;
+const PONG_FIELDS = 7;
+const PONG_HISTORY = 64;
+const PONG_PADDLE_SPEED = 0.1;
+const PONG_PADDLE_LIMIT = 3.0 / 2 - 0.5 / 2;
+
+function readPongVarint(view, offset) {
+    let result = 0, scale = 1, byte;
+    do {
+        byte = view.getUint8(offset++);
+        result += (byte & 0x7f) * scale;
+        scale *= 128;
+    } while (byte & 0x80);
+    // zigzag
+    return [result % 2 ? -(result + 1) / 2 : result / 2, offset];
+}
+
+class PongSnapshotDecoder {
+    constructor() {
+        this.history = new Map();
+    }
+
+    decode(buffer) {
+        const view = new DataView(buffer);
+        const type = view.getUint8(0);
+        const tick = view.getUint32(1, true);
+        let fields;
+        if (type === PONG_FULL) {
+            fields = [
+                view.getInt16(5, true), view.getInt16(7, true),
+                view.getInt16(9, true), view.getInt16(11, true),
+                view.getUint16(13, true), view.getUint16(15, true),
+                view.getUint32(17, true),
+            ];
+        } else if (type === PONG_DELTA) {
+            const age = view.getUint8(5);
+            const mask = view.getUint8(6);
+            fields = this.history.get(tick - age).slice();
+            let offset = 7, diff;
+            for (let index = 0; index < PONG_FIELDS; index++) {
+                if (mask & (1 << index)) {
+                    [diff, offset] = readPongVarint(view, offset);
+                    fields[index] += diff;
+                }
+            }
+        } else {
+            throw new Error('Unknown frame type ' + type);
+        }
+
+        this.history.set(tick, fields);
+        if (this.history.size > PONG_HISTORY) {
+            this.history.delete(Math.min(...this.history.keys()));
+        }
+        return {
+            tick: tick,
+            ball: [fields[0] / PONG_SCALE, fields[1] / PONG_SCALE],
+            paddles: [fields[2] / PONG_SCALE, fields[3] / PONG_SCALE],
+            scores: [fields[4], fields[5]],
+            inputAck: fields[6],
+        };
+    }
+}
+
+function connectPong(path, handlers) {
+    const scheme = window.location.protocol === 'https:' ? 'wss://' : 'ws://';
+    const socket = new WebSocket(scheme + window.location.host + path);
+    socket.binaryType = 'arraybuffer';
+
+    const decoder = new PongSnapshotDecoder();
+    let side = null;
+    let tick = 0;
+    let seq = 0;
+    let direction = 0;
+    // direction the server applied last, and inputs it has not applied yet
+    let ackedDirection = 0;
+    let pending = [];
+
+    function predict(state) {
+        // replay the unacknowledged inputs on top of the server's paddle
+        let y = state.paddles[side];
+        let applied = ackedDirection;
+        for (const input of pending) {
+            const ticks = Math.max(0, state.tick - input.tick + 1);
+            y += (input.direction - applied) * PONG_PADDLE_SPEED * ticks;
+            applied = input.direction;
+        }
+        state.paddles[side] = Math.max(-PONG_PADDLE_LIMIT, Math.min(PONG_PADDLE_LIMIT, y));
+    }
+
+    socket.onmessage = function (event) {
+        if (typeof event.data === 'string') {
+            const message = JSON.parse(event.data);
+            if ('side' in message) {
+                side = message.side;
+                handlers.onHello && handlers.onHello(message);
+            }
+            if ('winner' in message) {
+                handlers.onResult && handlers.onResult(message);
+            }
+            return;
+        }
+
+        const state = decoder.decode(event.data);
+        tick = state.tick;
+        socket.send(JSON.stringify({ack: tick}));
+        if (side !== null) {
+            while (pending.length && pending[0].seq <= state.inputAck) {
+                ackedDirection = pending.shift().direction;
+            }
+            predict(state);
+        }
+        handlers.onSnapshot && handlers.onSnapshot(state);
+    };
+
+    socket.onclose = function () {
+        handlers.onClose && handlers.onClose();
+    };
+
+    return {
+        setDirection(newDirection) {
+            if (side === null || newDirection === direction || socket.readyState !== WebSocket.OPEN) {
+                return;
+            }
+            direction = newDirection;
+            seq += 1;
+            pending.push({seq: seq, tick: tick, direction: direction});
+            socket.send(JSON.stringify({dir: direction, seq: seq, tick: tick}));
+        },
+        close() {
+            socket.close();
+        },
+    };
+}
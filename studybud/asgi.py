@@ -19,9 +19,11 @@ os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'studybud.settings')
 django_asgi_app = get_asgi_application()
 
 from base import routing
+from base.uploads import UploadLimitMiddleware
+from base.assets import AssetsMiddleware
 
 application = ProtocolTypeRouter({
-    "http": django_asgi_app,
+    "http": AssetsMiddleware(UploadLimitMiddleware(django_asgi_app)),
     "websocket": AllowedHostsOriginValidator(
         AuthMiddlewareStack(URLRouter(routing.websocket_urlpatterns))
     ),
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
+import tempfile
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -39,13 +40,16 @@ INSTALLED_APPS = [
     'django.contrib.contenttypes',
     'django.contrib.sessions',
     'django.contrib.messages',
-    'django.contrib.staticfiles',
+    'base.apps.StaticFilesConfig',
     # 'channels',
 
     'base.apps.BaseConfig',
 
     'rest_framework',
     "corsheaders",
+
+    # removes replaced and deleted files, keep it last
+    'django_cleanup.apps.CleanupConfig',
 ]
 
 AUTH_USER_MODEL = 'base.User'
@@ -95,6 +99,79 @@ CHANNEL_LAYERS = {
     },
 }
 
+PRESENCE = {
+    'BACKEND': 'base.presence.LocalPresence',
+    'OPTIONS': {
+        'ttl': 60,
+    },
+}
+
+# Ratings bands of vs Player matchmaking, see base.matchmaking. Use
+# base.matchmaking.RedisQueue to pair players across workers.
+MATCHMAKING = {
+    'BACKEND': 'base.matchmaking.LocalQueue',
+    'OPTIONS': {
+        'base_band': 50,
+        'band_growth': 5,
+        'max_band': 400,
+    },
+}
+
+# Rendered chat message fragments live in their own LRU cache, see
+# base.fragments. Point 'fragments' at a shared backend to share them
+# between workers.
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'message-fragments',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # What base.thumbnails wrote for each avatar and chat image. Entries are
+    # rebuilt from the files on disk when evicted.
+    'variants': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'image-variants',
+        'TIMEOUT': None,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+    # Version tokens of the polled endpoints, see base.versions. Every worker
+    # has to read the same tokens: files are shared by the workers of one
+    # host, settings_redis shares them through Redis.
+    'versions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(Path(tempfile.gettempdir()) / 'studybud-versions'),
+        'TIMEOUT': 24 * 60 * 60,
+    },
+    # Cached sessions, shared like 'versions': a logout on one worker has to
+    # end the session on all of them. Evicted sessions are read from the db.
+    'sessions': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': str(Path(tempfile.gettempdir()) / 'studybud-sessions'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Polled endpoints read the viewer from the session before deciding on a
+# 304, see base.versions, so keep sessions in the cache in front of the db.
+SESSION_ENGINE = 'django.contrib.sessions.backends.cached_db'
+SESSION_CACHE_ALIAS = 'sessions'
+
+# Server-side Pong AI: ticks of reaction delay and aim error (table units)
+PONG_AI = {
+    'reaction_ticks': 6,
+    'error': 0.15,
+}
+
 
 # Database
 # https://docs.djangoproject.com/en/3.2/ref/settings/#databases
@@ -103,6 +180,11 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Tests run on a file too: the shared in-memory database fails
+        # concurrent writers with "table is locked" instead of waiting.
+        'TEST': {
+            'NAME': str(Path(tempfile.gettempdir()) / 'studybud-test.sqlite3'),
+        },
     }
 }
 
@@ -152,7 +234,18 @@ STATICFILES_DIRS = [
 
 MEDIA_ROOT = BASE_DIR / 'static/images'
 
-# STATIC_ROOT =
+# Largest chat attachment accepted, see base.uploads. Bodies that grow past
+# it are cut off while streaming.
+CHAT_UPLOAD_MAX_SIZE = 10 * 1024 * 1024
+
+# collectstatic writes hashed, precompressed copies here and
+# base.assets.AssetsMiddleware serves them, see studybud.asgi. Outside
+# DEBUG, templates need the manifest, so run collectstatic on deploy.
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_STORAGE = 'base.assets.CompressedManifestStaticFilesStorage'
+
+# Tests render pages without a manifest, so they run with the plain storage.
+TEST_RUNNER = 'base.tests.runner.TestRunner'
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
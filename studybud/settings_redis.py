@@ -0,0 +1,97 @@
+"""
+Redis-backed settings profile for running several Daphne workers.
+
+The default settings use the in-memory channel layer, which only delivers
+group messages to sockets connected to the same process. Point
+DJANGO_SETTINGS_MODULE at this module to share the channel layer through
+Redis instead:
+
+    DJANGO_SETTINGS_MODULE=studybud.settings_redis daphne studybud.asgi:application
+
+Environment variables:
+    REDIS_URL             redis:// URL, or a comma separated list of URLs to
+                          shard channels and groups across several servers.
+    CHANNEL_LAYER_BACKEND "core" (default, queued delivery with capacity and
+                          expiry) or "pubsub" (fire-and-forget Pub/Sub).
+    REDIS_CACHE_URL       redis:// URL of the shared cache, the first of
+                          REDIS_URL by default.
+
+Everything the workers must agree on lives in Redis: the channel layer,
+chat presence, and the "default", "fragments", "variants", "versions" and
+"sessions" caches, which hold the unread notification counters, rendered
+message fragments, image variant records, polling version tokens and
+cached sessions.
+"""
+
+import os
+
+from .settings import *
+
+
+REDIS_URL = os.environ.get('REDIS_URL', 'redis://127.0.0.1:6379/0')
+
+REDIS_HOSTS = [url.strip() for url in REDIS_URL.split(',') if url.strip()]
+
+CHANNEL_LAYER_BACKEND = os.environ.get('CHANNEL_LAYER_BACKEND', 'core')
+
+if CHANNEL_LAYER_BACKEND == 'pubsub':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.pubsub.RedisPubSubChannelLayer',
+            'CONFIG': {
+                'hosts': REDIS_HOSTS,
+                'prefix': 'studybud',
+            },
+        },
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels_redis.core.RedisChannelLayer',
+            'CONFIG': {
+                # channels and groups are consistently hashed across hosts
+                'hosts': REDIS_HOSTS,
+                'prefix': 'studybud',
+                # a chat event is useless after a few seconds, drop it
+                # rather than delivering stale messages to a slow socket
+                'expiry': 10,
+                # group membership outlives the longest websocket session
+                'group_expiry': 86400,
+                # per-channel backlog before group_send starts dropping
+                'capacity': 1500,
+            },
+        },
+    }
+
+PRESENCE = {
+    'BACKEND': 'base.presence.RedisPresence',
+    'OPTIONS': {
+        'url': REDIS_HOSTS[0],
+        'ttl': 60,
+    },
+}
+
+REDIS_CACHE_URL = os.environ.get('REDIS_CACHE_URL', REDIS_HOSTS[0])
+
+
+def redis_cache(key_prefix, timeout=300):
+    return {
+        'BACKEND': 'django_redis.cache.RedisCache',
+        'LOCATION': REDIS_CACHE_URL,
+        'KEY_PREFIX': key_prefix,
+        'TIMEOUT': timeout,
+        'OPTIONS': {
+            'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+        },
+    }
+
+
+# Size is bounded by the Redis server's maxmemory and eviction policy
+# (allkeys-lru) rather than by MAX_ENTRIES.
+CACHES = {
+    'default': redis_cache('studybud'),
+    'fragments': redis_cache('studybud:fragments', timeout=24 * 60 * 60),
+    'variants': redis_cache('studybud:variants', timeout=None),
+    'versions': redis_cache('studybud:versions', timeout=24 * 60 * 60),
+    'sessions': redis_cache('studybud:sessions'),
+}